@@ -4,5 +4,6 @@ from .history import api_history
 from .note import api_note
 from .report import api_report
 from .eval import api_eval
+from .job import api_job
 from .experiment import api_experiment
 from .experiment_v2 import api_experiment_v2
@@ -1,18 +1,21 @@
+import asyncio
 import json
 import os
-import pathlib
+import threading
+import time
 import bcrypt
+from datetime import datetime
 
 from fastapi import APIRouter, Form, Request
-from fastapi.responses import JSONResponse, HTMLResponse, RedirectResponse
+from fastapi.responses import JSONResponse, HTMLResponse, RedirectResponse, StreamingResponse, PlainTextResponse
 from tortoise.exceptions import DoesNotExist
-from fastapi.templating import Jinja2Templates
 
 from models import PIM, CDG, PSG, Admin
+from utils import LoopMonitor, SamplingProfiler, Executor, DBPool, memory_usage
+from utils.templates import templates
+from .utils import ExportService, AnalyticsService, KnowledgeStore, ArchiveService
 
 api_admin = APIRouter()
-templates_path = os.path.join(pathlib.Path(__file__).parent.parent, "templates")
-templates = Jinja2Templates(directory=templates_path)
 
 
 @api_admin.get("/")
@@ -41,8 +44,8 @@ async def login(request: Request, name: str = Form(...), password: str = Form(..
     # 登陆成功后保存管理员信息, 只会会限制: 部分网页只有管理员有权限访问; 部分按钮和链接只有登陆管理员才显示
     try:
         admin = await Admin.get(name=name)
-        # 验证密码
-        if bcrypt.checkpw(password.encode(), admin.password.encode()):
+        # 验证密码 (bcrypt 刻意耗时, 放入线程执行, 避免阻塞事件循环)
+        if await Executor.thread(bcrypt.checkpw, password.encode(), admin.password.encode()):
             request.session["admin"] = admin.name
             return RedirectResponse(url="/history/all", status_code=302)  # 转 POST 为 GET
         else:
@@ -65,11 +68,21 @@ async def logout(request: Request):
 
 
 @api_admin.delete("/{uid}")
-async def deleteHistory(uid: str):
+async def deleteHistory(request: Request, uid: str):
     """删除 uid 的历史记录"""
     # 只有管理员有权限删除用户 uid 的历史记录
+    if "admin" not in request.session:
+        return JSONResponse({"status": "error", "message": "无权限"}, status_code=403)
     try:
-        pim = await PIM.filter(uid=uid).delete()
+        pim = await PIM.filter(uid=uid).first().values("created_at", "qa_messages", "unrelated_count")
+        if pim is None:
+            archived = await ArchiveService.row(PIM, uid)  # 已归档: 统计所需字段从冷存储读取
+            if archived is None:
+                raise DoesNotExist(PIM)
+            pim = {**archived, "created_at": datetime.fromisoformat(archived["created_at"])}
+        await PIM.filter(uid=uid).delete()
+        await ArchiveService.delete(uid)
+        await AnalyticsService.sessionDeleted(uid, pim["created_at"], pim["qa_messages"], pim["unrelated_count"])
     except DoesNotExist:
         return JSONResponse(
             {
@@ -92,10 +105,18 @@ async def deleteHistory(uid: str):
 async def showDetail(request: Request, uid: str):
     if "admin" not in request.session:
         return RedirectResponse(url="/admin/login")
+    pim_fields = ("id", "uid", "qa_messages", "diseases", "symptoms", "ieg", "addition", "delta_ieg", "is_related", "unrelated_count")
+    cdg_fields = ("disease_opt", "disease_opt_dict")
     try:
-        pim = await PIM.get(uid=uid).values("id", "uid", "qa_messages", "diseases", "symptoms", "ieg", "addition", "delta_ieg", "is_related",
-                                            "unrelated_count")
-        cdg = await CDG.get(uid=uid).values("disease_opt", "disease_opt_dict")
+        try:
+            pim = await PIM.get(uid=uid).values(*pim_fields)
+            cdg = await CDG.get(uid=uid).values(*cdg_fields)
+        except DoesNotExist:
+            archived = await ArchiveService.session(uid)  # 已归档: 从冷存储读取
+            if archived is None or archived["cdg"] is None:
+                raise
+            pim = {k: archived["pim"][k] for k in pim_fields}
+            cdg = {k: archived["cdg"][k] for k in cdg_fields}
         json_str = json.dumps({"cdg": cdg, "pim": pim}, indent=2, ensure_ascii=False)
 
         # 简单 HTML 页面，展示 JSON
@@ -110,3 +131,172 @@ async def showDetail(request: Request, uid: str):
         return HTMLResponse(content=html_content)
     except DoesNotExist:
         return HTMLResponse(content="<h2>未找到对应数据</h2>", status_code=404)
+
+
+@api_admin.get("/export/{table}")
+async def exportTable(request: Request, table: str, fmt: str = "ndjson", gzip: int = 0):
+    """
+    流式导出整表 (管理员)
+    :param request: 请求对象
+    :param table: 表名 "pim" | "psg" | "cdg" | "eval"
+    :param fmt: 格式 "ndjson" | "csv" | "xlsx"
+    :param gzip: 是否 gzip 压缩
+    :return: 文件下载
+    """
+    if "admin" not in request.session:
+        return RedirectResponse(url="/admin/login")
+    if table not in ExportService.TABLES or fmt not in ExportService.FORMATS:
+        return JSONResponse({"status": "error", "message": "未知表或格式"}, status_code=400)
+
+    media_type = "application/gzip" if gzip else ExportService.FORMATS[fmt][0]
+    filename = ExportService.filename(table, fmt, bool(gzip))
+    return StreamingResponse(
+        ExportService.stream(table, fmt, bool(gzip)),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+
+@api_admin.get("/dashboard")
+async def showDashboard(request: Request, days: int = 30):
+    """管理员看板数据: 每日问诊数 / 收敛轮次 / 疾病分布 / 不相关回答率 / 平均评分 (读取汇总表)"""
+    if "admin" not in request.session:
+        return JSONResponse({"status": "error", "message": "无权限"}, status_code=403)
+
+    return JSONResponse({
+        "status": "success",
+        **await AnalyticsService.dashboard(max(1, min(days, 366)))
+    })
+
+
+@api_admin.get("/loop")
+async def showLoopStalls(request: Request, limit: int = 20):
+    """当前 worker 最近的事件循环阻塞记录 (延迟 + 调用栈)"""
+    if "admin" not in request.session:
+        return JSONResponse({"status": "error", "message": "无权限"}, status_code=403)
+
+    return JSONResponse({
+        "status": "success",
+        "pid": os.getpid(),
+        "stalls": LoopMonitor.recent(max(1, limit)),
+    })
+
+
+@api_admin.get("/executor")
+async def showExecutor(request: Request):
+    """当前 worker 线程池 / 进程池的排队深度与耗时"""
+    if "admin" not in request.session:
+        return JSONResponse({"status": "error", "message": "无权限"}, status_code=403)
+
+    return JSONResponse({
+        "status": "success",
+        "pid": os.getpid(),
+        **Executor.stats(),
+    })
+
+
+@api_admin.get("/db")
+async def showDBPool(request: Request):
+    """当前 worker 数据库连接池: 取连接等待 / 占用中连接数 / 查询耗时 (ms)"""
+    if "admin" not in request.session:
+        return JSONResponse({"status": "error", "message": "无权限"}, status_code=403)
+
+    return JSONResponse({
+        "status": "success",
+        "pid": os.getpid(),
+        **DBPool.stats(),
+    })
+
+
+@api_admin.get("/archive")
+async def showArchive(request: Request):
+    """冷存储: 已归档问诊数与压缩节省的空间 (字节)"""
+    if "admin" not in request.session:
+        return JSONResponse({"status": "error", "message": "无权限"}, status_code=403)
+
+    return JSONResponse({
+        "status": "success",
+        **await ArchiveService.stats(),
+    })
+
+
+@api_admin.get("/memory")
+async def showMemory(request: Request):
+    """当前 worker 的内存占用 (KB) 与已映射的知识库"""
+    if "admin" not in request.session:
+        return JSONResponse({"status": "error", "message": "无权限"}, status_code=403)
+
+    kb = KnowledgeStore.current()
+    return JSONResponse({
+        "status": "success",
+        "pid": os.getpid(),
+        "memory": memory_usage(),
+        "knowledge": None if kb is None else {"version": kb.version, "path": kb.path, **kb.header["counts"]},
+    })
+
+
+@api_admin.get("/knowledge")
+async def showKnowledge(request: Request):
+    """已编译的知识库版本与当前 worker 使用的版本"""
+    if "admin" not in request.session:
+        return JSONResponse({"status": "error", "message": "无权限"}, status_code=403)
+
+    return JSONResponse({
+        "status": "success",
+        "pid": os.getpid(),
+        "active": KnowledgeStore.activeVersion(),
+        "loaded": KnowledgeStore.version(),
+        "versions": KnowledgeStore.versions(),
+    })
+
+
+@api_admin.post("/knowledge/compile")
+async def compileKnowledge(request: Request, activate: int = 1):
+    """从数据库快照生成新版本 (内容未变化则不生成), 各 worker 在 KNOWLEDGE_WATCH_INTERVAL 内切换"""
+    if "admin" not in request.session:
+        return JSONResponse({"status": "error", "message": "无权限"}, status_code=403)
+
+    return JSONResponse({
+        "status": "success",
+        **await KnowledgeStore.compile(activate=bool(activate))
+    })
+
+
+@api_admin.post("/knowledge/activate/{version}")
+async def activateKnowledge(request: Request, version: str):
+    """切换到已有版本 (回滚), 各 worker 在 KNOWLEDGE_WATCH_INTERVAL 内切换"""
+    if "admin" not in request.session:
+        return JSONResponse({"status": "error", "message": "无权限"}, status_code=403)
+    try:
+        active = await asyncio.to_thread(KnowledgeStore.activate, version)
+    except ValueError as e:
+        return JSONResponse({"status": "error", "message": str(e)}, status_code=404)
+
+    return JSONResponse({
+        "status": "success",
+        "active": active,
+    })
+
+
+@api_admin.get("/profile")
+async def profileWorker(request: Request, seconds: float = 10, hz: int = 100, loop_only: int = 0):
+    """
+    对当前 worker 采样分析, 返回 collapsed stack 文件 (flamegraph.pl / speedscope)
+    :param request: 请求对象
+    :param seconds: 采样时长, 最长 PROFILE_MAX_SECONDS
+    :param hz: 采样频率
+    :param loop_only: 只采样事件循环线程
+    :return: 文件下载
+    """
+    if "admin" not in request.session:
+        return JSONResponse({"status": "error", "message": "无权限"}, status_code=403)
+    if SamplingProfiler.busy():
+        return JSONResponse({"status": "error", "message": "该 worker 正在采样"}, status_code=409)
+
+    thread_ids = {threading.get_ident()} if loop_only else None
+    collapsed = await asyncio.to_thread(SamplingProfiler.run, max(seconds, 0.1), hz, thread_ids)
+    if collapsed is None:
+        return JSONResponse({"status": "error", "message": "该 worker 正在采样"}, status_code=409)
+
+    filename = f"profile_{os.getpid()}_{int(time.time())}.collapsed"
+    return PlainTextResponse(collapsed, headers={"Content-Disposition": f'attachment; filename="{filename}"'})
@@ -1,17 +1,16 @@
-import os
-import pathlib
+import asyncio
+import time
 
 from fastapi import APIRouter, Form, Request
 from fastapi.responses import JSONResponse, HTMLResponse, RedirectResponse
 from tortoise.exceptions import DoesNotExist
-from fastapi.templating import Jinja2Templates
 
 from models import PIM, CDG, PSG
-from .utils import PIMService, EntropyCalculator, AIGenerator
+from utils.templates import templates
+from middlewares.logger_middleware import logger
+from .utils import PIMService, EntropyCalculator, AIGenerator, JobService, AnalyticsService, KnowledgeStore, SessionRepository
 
 api_chat = APIRouter()
-templates_path = os.path.join(pathlib.Path(__file__).parent.parent, "templates")
-templates = Jinja2Templates(directory=templates_path)
 
 DELTA_IEG_CONVERGENCE = 2  # 收敛次数
 ROUND_MAX = 12  # 对话次数限制
@@ -19,6 +18,24 @@ ROUND_MIN = 6  # 对话次数限制
 MAX_UNRELATED_RETRIES = 2  # 无关回答最多重复次数
 
 
+async def _timed(stages: dict, name: str, coro):
+    """等待 coro 并记录该阶段耗时 (ms) 到 stages[name]"""
+    start = time.perf_counter()
+    try:
+        return await coro
+    finally:
+        stages[name] = (time.perf_counter() - start) * 1000
+
+
+async def _discardCreated(create_task: asyncio.Future) -> None:
+    """删除预先创建的用户: 创建仍在进行则等待其完成 (不随请求取消), 创建失败则无需删除"""
+    try:
+        pim = await asyncio.shield(create_task)
+    except BaseException:
+        return
+    await pim.delete()
+
+
 @api_chat.get("/")
 async def redirectToNew():
     """重定向至 /chat/new"""
@@ -26,6 +43,7 @@ async def redirectToNew():
 
 
 @api_chat.get("/{uid}")
+@SessionRepository.projected
 async def getChat(request: Request, uid: str, no_sense: int = 0):
     """
     GET 请求, 返回问诊界面
@@ -45,26 +63,26 @@ async def getChat(request: Request, uid: str, no_sense: int = 0):
             }
         )
 
-    # 数据库搜索
-    try:
-        pim = await PIM.get(uid=uid)
-        return templates.TemplateResponse(
-            "chat.html",
-            {
-                "request": request,
-                "messages": pim.qa_messages,
-                "uid": uid,
-                "show": 1,
-            }
-        )
-    except DoesNotExist:
+    # 数据库搜索 (只取对话列)
+    qa_messages = await SessionRepository.dialogue(uid)
+    if qa_messages is None:
         return RedirectResponse(url="/chat/new")
+    return templates.TemplateResponse(
+        "chat.html",
+        {
+            "request": request,
+            "messages": qa_messages,
+            "uid": uid,
+            "show": 1,
+        }
+    )
 
 
 @api_chat.post("/{uid}")
-async def sendChat(uid: str, message: str = Form(...)):
+async def sendChat(request: Request, uid: str, message: str = Form(...)):
     """
     POST 请求, 核心: 异步处理 发送请求 生成问题 获取症状 更新概率 判断结束
+    :param request: 请求对象
     :param uid: 唯一标识符
     :param message: 患者的填写/回答
     :return: JSON 格式返回
@@ -79,46 +97,69 @@ async def sendChat(uid: str, message: str = Form(...)):
                 "redirect_url": "/chat/new?no_sense=1"
             })
 
-        # 2. 第一次问诊记录
-        """PIM01 预测疾病列表"""
-        disease_name_list = await AIGenerator.pim01GeneratePrediction(message)
-        # 2.1 信息不足
-        if len(disease_name_list) == 0:
-            return JSONResponse({
-                "status": "redirect",
-                "redirect_url": "/chat/new?no_sense=1"
-            })
-        # 2.2 搜索数据库
-        disease_prob_dict = await PIMService.precise_search(disease_name_list)  # {'D1': 0.1, ...}
-        disease_name_list = list(disease_prob_dict.keys())
-
-        pim = await PIM.create()  # 创建用户
+        # 2. 第一次问诊记录 (异步 DAG, 关键路径: PIM01 -> 精确搜索 -> IEG -> PIM02)
+        stages = {}
+        start = time.perf_counter()
+
+        """PIM01 预测疾病列表 || 创建用户 || 预热知识索引"""
+        create_task = asyncio.ensure_future(_timed(stages, "create", PIM.create()))
+        try:
+            disease_name_list, _ = await asyncio.gather(
+                _timed(stages, "pim01", AIGenerator.pim01GeneratePrediction(message)),
+                _timed(stages, "warmup", PIMService.warmup()),
+            )
+            pim = await create_task
+        except BaseException:  # PIM01 失败或请求被取消, 删除预先创建的用户
+            await _discardCreated(create_task)
+            raise
         uid = pim.uid  # 获取 uid
 
-        # 添加疾病概率
-        pim.diseases = [disease_prob_dict]
-
-        first_sys_message = {"role": "system", "content": "你好！我是AI医生助手。请您尽可能具体详细地描述一下您的症状。"}
-        user_message = {"role": "user", "content": message}
-        qa_messages = [first_sys_message, user_message]
-
-        # 计算 IEG
-        symptom_IEG = await EntropyCalculator.calculateIEG(disease_prob_dict)
-        pim.ieg = [symptom_IEG]  # 添加 IEG
-
-        symptom_name, _ = EntropyCalculator.max_ieg(symptom_IEG)
-        pim.symptom_opt = symptom_name
-
-        """ PIM02 生成问题"""
-        question = await AIGenerator.pim02GenerateQuestion(disease_name_list, symptom_name, [], qa_messages)
-
-        ai_message = {"role": "system", "content": question}
-        qa_messages.append(ai_message)
-
-        # 添加问诊对话
-        pim.qa_messages = qa_messages
-
-        await pim.save()
+        try:
+            # 2.1 信息不足
+            if len(disease_name_list) == 0:
+                await pim.delete()  # 删除预先创建的用户
+                return JSONResponse({
+                    "status": "redirect",
+                    "redirect_url": "/chat/new?no_sense=1"
+                })
+            # 2.2 搜索数据库
+            disease_prob_dict = await _timed(stages, "search", PIMService.precise_search(disease_name_list))  # {'D1': 0.1, ...}
+            disease_name_list = list(disease_prob_dict.keys())
+
+            first_sys_message = {"role": "system", "content": "你好！我是AI医生助手。请您尽可能具体详细地描述一下您的症状。"}
+            user_message = {"role": "user", "content": message}
+            qa_messages = [first_sys_message, user_message]
+
+            # 添加疾病概率 & 问诊对话 & 知识库版本
+            pim.diseases = [disease_prob_dict]
+            pim.qa_messages = qa_messages
+            pim.knowledge_version = KnowledgeStore.version()
+
+            """计算 IEG || 保存患者描述"""
+            symptom_IEG, _ = await asyncio.gather(
+                _timed(stages, "ieg", EntropyCalculator.calculateIEG(disease_prob_dict)),
+                _timed(stages, "save_user", pim.save(update_fields=["diseases", "qa_messages", "knowledge_version"])),
+            )
+            pim.ieg = [symptom_IEG]  # 添加 IEG
+
+            symptom_name, _ = EntropyCalculator.max_ieg(symptom_IEG)
+            pim.symptom_opt = symptom_name
+
+            """ PIM02 生成问题"""
+            question = await _timed(stages, "pim02", AIGenerator.pim02GenerateQuestion(disease_name_list, symptom_name, [], qa_messages))
+
+            ai_message = {"role": "system", "content": question}
+            pim.qa_messages = qa_messages + [ai_message]  # 新列表, 避免与上一次保存共享同一对象
+
+            await _timed(stages, "save", pim.save(update_fields=["ieg", "symptom_opt", "qa_messages"]))
+        except BaseException:  # 首轮任一步失败或请求被取消, 不留下写了一半的问诊
+            await pim.delete()
+            raise
+        SessionRepository.own(request.session, uid)  # 后台任务接口只对创建者开放
+        await AnalyticsService.sessionStarted(pim.created_at)  # 首轮完整保存后才计入
+
+        total = (time.perf_counter() - start) * 1000
+        logger.info(f"[chat/new] {uid} total={total:.0f}ms " + " ".join(f"{k}={v:.0f}ms" for k, v in stages.items()))
 
         return JSONResponse({
             "status": "redirect",
@@ -142,6 +183,8 @@ async def sendChat(uid: str, message: str = Form(...)):
             "redirect_url": "/chat/new"
         })
 
+    await KnowledgeStore.use(pim.knowledge_version)  # 问诊全程使用创建时的知识库版本
+
     # symptom_name, _ = EntropyCalculator.max_ieg(pim.ieg[-1])
     symptom_name = pim.symptom_opt
 
@@ -158,6 +201,7 @@ async def sendChat(uid: str, message: str = Form(...)):
     """PIM03 判断症状是否发生"""
     pim03 = await AIGenerator.pim03ExtractSymptom(symptom_name, question, message)  # {"is_related": Bool, "symptom": Bool | None}
     symptom_TFN = pim03.get("symptom", None)
+    await AnalyticsService.answerRecorded(pim.created_at, pim03.get("is_related", False))
 
     symbol = 0
     # 若不相关
@@ -222,8 +266,7 @@ async def sendChat(uid: str, message: str = Form(...)):
 
     # origin_disease_prob = await PIMService.precise_search(list(pim.diseases[-1].keys()))
     # disease_prob_dict = await EntropyCalculator.updateDiseaseProb(origin_disease_prob, new_known_symptom_dict, symptom_dict)
-    latest_disease_prob_dict = await PIM.get(uid=uid).values("diseases")
-    latest_disease_prob_dict = latest_disease_prob_dict.get("diseases")[-1]
+    latest_disease_prob_dict = await SessionRepository.posterior(uid)
     disease_prob_dict = await EntropyCalculator.updateDiseaseProbV2(latest_disease_prob_dict, new_known_symptom_dict, symptom_dict)
 
     pim.diseases.append(disease_prob_dict)  # 新疾病概率
@@ -293,6 +336,7 @@ async def sendChat(uid: str, message: str = Form(...)):
 
 
 @api_chat.post("/addition/{uid}")
+@SessionRepository.projected
 async def goToAddition(uid: str, addition: str = Form(...)):
     """
     获取额外信息, 生成 CDG 和 PSG 记录
@@ -300,58 +344,17 @@ async def goToAddition(uid: str, addition: str = Form(...)):
     :param addition: 患者填写的额外信息 (未来可拓展成其他信息)
     :return: JSON 返回
     """
-    """PIM OBJ"""
-    try:
-        pim = await PIM.get(uid=uid)
-    except DoesNotExist:
+    """PIM addition (单列 UPDATE, 不读取整行)"""
+    if not await SessionRepository.setAddition(uid, addition):
         return JSONResponse({
             "status": "redirect",
             "redirect_url": "/chat/new"
         })
 
-    pim.addition = addition
-
-    disease_prob_dict = pim.diseases[-1]
-    qa_messages = pim.qa_messages
-    symptoms_ = pim.symptoms  # {'S': Bool | None}
-    symptoms = {}
-    for k, v in symptoms_.items():
-        if v is True:
-            symptoms[k] = "是"
-        elif v is False:
-            symptoms[k] = "否"
-        else:
-            symptoms[k] = "未知"
-    # {'S': "是" | "否" | "未知"}
-    patient_addition = addition
-
-    # 等待初步报告生成
-    disease_and_reason = await AIGenerator.cdg01GenerateInitial(disease_prob_dict, qa_messages, symptoms, patient_addition)
-    # {"disease": {"疾病1": 0.4, ...}, "reason": "诊断依据和推理过程"}
-    await pim.save()
-
-    """CDG 01 Initial"""
-    disease_opt_dict = disease_and_reason.get("disease", {})
-    disease_opt, _ = EntropyCalculator.max_ieg(disease_opt_dict)
-    reason = disease_and_reason.get("reason", "")
-    try:
-        cdg = await CDG.get(uid=uid)
-        cdg.disease_opt = disease_opt
-        cdg.disease_opt_dict = disease_opt_dict
-        cdg.initial = reason
-        await cdg.save()
-    except DoesNotExist:
-        cdg = await CDG.create(uid=uid, pim=pim, disease_opt=disease_opt, disease_opt_dict=disease_opt_dict, initial=reason)
-
-    """PSG Report ORM create"""
-    try:
-        psg = await PSG.get(uid=uid)
-        psg.disease_opt = disease_opt
-        await psg.save()
-    except DoesNotExist:
-        psg = await PSG.create(uid=uid, pim=pim, disease_opt=disease_opt)
+    # 后台生成初步诊断, 完成后自动并行生成患者报告和 SOAP 病历
+    await JobService.enqueue(uid, "initial", force=True)
 
-    # 然后再返回页面
+    # 直接返回页面, 报告页轮询任务状态
     return JSONResponse({
         "status": "redirect",
         "redirect_url": f"/report/{uid}"
@@ -1,16 +1,12 @@
-import os
-import pathlib
-
 from fastapi import APIRouter, Form, Request
 from fastapi.responses import JSONResponse, HTMLResponse, RedirectResponse
 from tortoise.exceptions import DoesNotExist
-from fastapi.templating import Jinja2Templates
 
-from models import PIM, EVAL
+from models import EVAL
+from utils.templates import templates
+from .utils import AnalyticsService, SessionRepository
 
 api_eval = APIRouter()
-templates_path = os.path.join(pathlib.Path(__file__).parent.parent, "templates")
-templates = Jinja2Templates(directory=templates_path)
 
 
 @api_eval.get("/")
@@ -93,10 +89,10 @@ async def patientEvalHTML(request: Request, uid: str):
 
 
 @api_eval.post("/{mode}/{uid}")
+@SessionRepository.projected
 async def sendEval(request: Request, mode: str, uid: str):
-    try:
-        pim = await PIM.get(uid=uid)
-    except DoesNotExist:
+    pim = await SessionRepository.header(uid)  # 只需外键与创建时间
+    if pim is None:
         return JSONResponse(
             {
                 "status": "redirect",
@@ -119,9 +115,11 @@ async def sendEval(request: Request, mode: str, uid: str):
         await eval.save()
     except DoesNotExist:
         if mode == "doctor":
-            await EVAL.create(uid=uid, doctor_eval=eval_values_list, pim=pim)
+            await EVAL.create(uid=uid, doctor_eval=eval_values_list, pim_id=pim["id"])
         else:
-            await EVAL.create(uid=uid, patient_eval=eval_values_list, pim=pim)
+            await EVAL.create(uid=uid, patient_eval=eval_values_list, pim_id=pim["id"])
+
+    await AnalyticsService.evalSubmitted(uid, pim["created_at"], mode, eval_values_list)
 
     redirect_url = f"/report/{uid}" if mode == "patient" else f"/note/{uid}"
 
@@ -1,16 +1,20 @@
-import os
-import pathlib
+from datetime import datetime, timedelta
+from typing import Tuple
 
 from fastapi import APIRouter, Form, Request
 from fastapi.responses import JSONResponse, HTMLResponse, RedirectResponse
 from tortoise.exceptions import DoesNotExist
-from fastapi.templating import Jinja2Templates
+from tortoise.expressions import Q
+from tortoise.functions import Trim
 
 from models import PIM, CDG, PSG, Admin
+from utils.templates import templates
+from .utils import HTTPCache, ArchiveService
 
 api_history = APIRouter()
-templates_path = os.path.join(pathlib.Path(__file__).parent.parent, "templates")
-templates = Jinja2Templates(directory=templates_path)
+
+HISTORY_PAGE_SIZE = 50  # 每页条数
+HISTORY_PAGE_SIZE_MAX = 500  # 每页最多条数
 
 
 @api_history.get("/")
@@ -20,9 +24,9 @@ async def searchHistory(uid: str):
     try:
         psg = await PSG.get(uid=uid)
     except DoesNotExist:
-        return RedirectResponse(url=f"/")
-    else:
-        return RedirectResponse(url=f"/report/{uid}")
+        if await ArchiveService.row(PSG, uid) is None:  # 已归档: 从冷存储查找
+            return RedirectResponse(url=f"/")
+    return RedirectResponse(url=f"/report/{uid}")
 
 
 @api_history.get("/all")
@@ -39,32 +43,79 @@ async def showHTML(request: Request):
     )
 
 
+@api_history.get("/all/data")
 @api_history.post("/all")
-async def getAllHistory():
-    """admin 管理员查找所有记录"""
-    pims = await PIM.all().order_by("-created_at")
-    uids = [pim.uid for pim in pims]
+async def getAllHistory(
+        request: Request,
+        cursor: str = "",
+        limit: int = HISTORY_PAGE_SIZE,
+        start: str = "",
+        end: str = "",
+        disease: str = ""
+):
+    """
+    admin 管理员分页查找记录 (keyset 分页, 按创建时间倒序), GET 请求支持 ETag / If-None-Match
+    :param request: 请求对象
+    :param cursor: 上一页返回的 next_cursor, 为空则从最新记录开始
+    :param limit: 每页条数
+    :param start: 起始日期 "YYYY-MM-DD" (含)
+    :param end: 结束日期 "YYYY-MM-DD" (含)
+    :param disease: 最可能疾病名 (CDG.disease_opt)
+    :return: {"data": [...], "next_cursor": "..." | None}
+    """
+    if "admin" not in request.session:
+        return JSONResponse({"status": "error", "message": "无权限"}, status_code=403)
 
-    # 所有 PSG/CDG
-    psg_list = await PSG.filter(uid__in=uids)
-    cdg_list = await CDG.filter(uid__in=uids)
+    limit = max(1, min(limit, HISTORY_PAGE_SIZE_MAX))
+    qs = PIM.all()
+    try:
+        if start:
+            qs = qs.filter(created_at__gte=datetime.strptime(start, "%Y-%m-%d"))
+        if end:
+            qs = qs.filter(created_at__lt=datetime.strptime(end, "%Y-%m-%d") + timedelta(days=1))
+        if cursor:
+            cursor_time, cursor_id = _decodeCursor(cursor)
+            qs = qs.filter(Q(created_at__lt=cursor_time) | Q(created_at=cursor_time, id__lt=cursor_id))
+    except ValueError:
+        return JSONResponse({"status": "error", "message": "参数格式错误"}, status_code=400)
+    if disease:
+        qs = qs.filter(cdg__disease_opt=disease)
 
-    # 构建 uid -> psg/cdg 映射字典
-    psg_dict = {psg.uid: psg for psg in psg_list if psg.report and psg.report.strip()}
-    cdg_dict = {cdg.uid: cdg for cdg in cdg_list if cdg.soap and cdg.soap.strip()}
+    # 只取需要的列, 多取一条判断是否还有下一页
+    pims = await qs.order_by("-created_at", "-id").limit(limit + 1).values("id", "uid", "created_at")
+    has_next = len(pims) > limit
+    pims = pims[:limit]
+    uids = [pim["uid"] for pim in pims]
+
+    # 报告/病历是否已生成: 在数据库中判断非空, 不加载正文
+    psg_uids = set(await PSG.filter(uid__in=uids).annotate(text=Trim("report")).exclude(text="").values_list("uid", flat=True))
+    cdg_uids = set(await CDG.filter(uid__in=uids).annotate(text=Trim("soap")).exclude(text="").values_list("uid", flat=True))
 
     all_data = []
     for pim in pims:
-        uid = pim.uid
-        time_str = pim.created_at.strftime("%Y-%m-%d %H:%M:%S")
-
+        uid = pim["uid"]
         all_data.append({
             "uid": uid,
-            "psg": uid in psg_dict,
-            "cdg": uid in cdg_dict,
-            "time": time_str
+            "psg": uid in psg_uids,
+            "cdg": uid in cdg_uids,
+            "time": pim["created_at"].strftime("%Y-%m-%d %H:%M:%S")
         })
 
-    return JSONResponse({
-        "data": all_data
-    })
+    content = {
+        "data": all_data,
+        "next_cursor": _encodeCursor(pims[-1]["created_at"], pims[-1]["id"]) if has_next else None
+    }
+    if request.method == "GET":
+        return HTTPCache.jsonResponse(request, content)  # ETag 由响应体计算
+    return JSONResponse(content)
+
+
+def _encodeCursor(created_at: datetime, pk: int) -> str:
+    """(created_at, id) -> 游标 '2025-01-01T00:00:00+00:00_12'"""
+    return f"{created_at.isoformat()}_{pk}"
+
+
+def _decodeCursor(cursor: str) -> Tuple[datetime, int]:
+    """游标 '2025-01-01T00:00:00+00:00_12' -> (created_at, id)"""
+    time_str, pk = cursor.rsplit("_", 1)
+    return datetime.fromisoformat(time_str), int(pk)
@@ -0,0 +1,91 @@
+from typing import Optional
+
+from fastapi import APIRouter, Request
+from fastapi.responses import JSONResponse
+
+from models import PSG, CDG
+from .utils import JobService, RenderService, SessionRepository
+from .utils.job_service import PENDING, RUNNING
+
+api_job = APIRouter()
+
+RESULT_FIELDS = {
+    "report": (PSG, "report"),
+    "soap": (CDG, "soap"),
+    "initial": (CDG, "initial"),
+}
+
+
+async def _authorize(request: Request, uid: str) -> Optional[JSONResponse]:
+    """只有创建问诊的浏览器会话或管理员可操作, 问诊不存在返回 404; 通过返回 None"""
+    if not SessionRepository.owns(request.session, uid):
+        return JSONResponse({"status": "error", "uid": uid, "message": "无权限"}, status_code=403)
+    if not await SessionRepository.exists(uid):
+        return JSONResponse({"status": "error", "uid": uid, "message": "问诊不存在"}, status_code=404)
+    return None
+
+
+@api_job.post('/{uid}/{kind}')
+async def enqueueJob(request: Request, uid: str, kind: str, force: int = 0):
+    """入队生成任务 (initial | report | soap), 同一 uid 同类任务去重"""
+    denied = await _authorize(request, uid)
+    if denied is not None:
+        return denied
+    try:
+        job = await JobService.enqueue(uid, kind, force=bool(force))
+    except ValueError as e:
+        return JSONResponse({"status": "error", "message": str(e)}, status_code=400)
+
+    return JSONResponse({
+        "status": "success",
+        "uid": uid,
+        **JobService.toDict(job)
+    })
+
+
+@api_job.get('/{uid}/{kind}')
+async def jobStatus(request: Request, uid: str, kind: str):
+    """查询任务状态, 供前端轮询"""
+    denied = await _authorize(request, uid)
+    if denied is not None:
+        return denied
+    job = await JobService.state(uid, kind)
+    if job is None:
+        return JSONResponse({
+            "status": "error",
+            "uid": uid,
+            "message": "任务不存在"
+        }, status_code=404)
+
+    return JSONResponse({
+        "status": "success",
+        "uid": uid,
+        **JobService.toDict(job)
+    })
+
+
+@api_job.get('/{uid}/{kind}/result')
+async def jobResult(request: Request, uid: str, kind: str):
+    """获取任务结果 (渲染后的 HTML)"""
+    if kind not in RESULT_FIELDS:
+        return JSONResponse({"status": "error", "message": f"未知任务类型: {kind}"}, status_code=400)
+    denied = await _authorize(request, uid)
+    if denied is not None:
+        return denied
+
+    model, field = RESULT_FIELDS[kind]
+    html = await RenderService.html(model, uid, field) or ""
+
+    if not html.strip():
+        job = await JobService.state(uid, kind)
+        return JSONResponse({
+            "status": "pending" if job is not None and job.status in (PENDING, RUNNING) else "error",
+            "uid": uid,
+            "result": ""
+        })
+
+    return JSONResponse({
+        "status": "success",
+        "uid": uid,
+        "result": html
+    })
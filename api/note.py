@@ -1,19 +1,12 @@
-import asyncio
-import os
-import pathlib
-import markdown
-
 from fastapi import APIRouter, Form, Request
 from fastapi.responses import JSONResponse, HTMLResponse, RedirectResponse
 from tortoise.exceptions import DoesNotExist
-from fastapi.templating import Jinja2Templates
 
-from models import PIM, CDG
-from .utils import AIGenerator, PIMService, EntropyCalculator
+from models import CDG
+from utils.templates import templates
+from .utils import GenerateService, JobService, RenderService, HTTPCache
 
 api_note = APIRouter()
-templates_path = os.path.join(pathlib.Path(__file__).parent.parent, "templates")
-templates = Jinja2Templates(directory=templates_path)
 
 
 @api_note.get('/')
@@ -27,16 +20,10 @@ async def showHTML(request: Request, uid: str):
     """获取 uid 患者的临床记录"""
     if "admin" not in request.session:
         return RedirectResponse(url="/admin/login")
-    try:
-        cdg = await CDG.get(uid=uid)
-    except DoesNotExist:
+    initial_html = await RenderService.html(CDG, uid, "initial")
+    if initial_html is None or len(initial_html.strip()) == 0:
         return RedirectResponse(url=f'/chat/{uid}')
 
-    initial = cdg.initial
-    if initial is None or len(initial.strip()) == 0:
-        return RedirectResponse(url=f'/chat/{uid}')
-
-    initial_html = markdown.markdown(initial, extensions=['extra'])
     return templates.TemplateResponse(
         "note.html",
         {
@@ -48,19 +35,53 @@ async def showHTML(request: Request, uid: str):
     )
 
 
+@api_note.get('/{uid}/content')
+async def getNoteContent(request: Request, uid: str):
+    """获取 uid 患者的 SOAP 病历 (只读, 支持 ETag / If-None-Match)"""
+    content_hash = await RenderService.storedHash(CDG, uid, "soap")
+    if content_hash:
+        etag = HTTPCache.etag("note", uid, content_hash)
+        if HTTPCache.notModified(request, etag):  # 未变化, 不读取正文
+            return HTTPCache.notModifiedResponse(etag)
+
+    result = await RenderService.htmlWithHash(CDG, uid, "soap")
+    if result is None:
+        return HTTPCache.noStore({
+            "status": "redirect",
+            "redirect_url": f"/chat/{uid}"
+        })
+    content_hash, note_html = result
+    if not note_html.strip() and await JobService.isPending(uid, ["initial", "soap"]):  # 后台生成中
+        return HTTPCache.noStore({
+            "status": "pending",
+            "uid": uid,
+            "note": ""
+        })
+
+    return HTTPCache.jsonResponse(request, {
+        "status": "success",
+        "uid": uid,
+        "note": note_html
+    }, etag=HTTPCache.etag("note", uid, content_hash))
+
+
 @api_note.put('/{uid}')
 async def getNote(uid: str):
     """获取 uid 患者的 SOAP 病历"""
-    try:
-        cdg = await CDG.get(uid=uid)
-    except DoesNotExist:
+    note_html = await RenderService.html(CDG, uid, "soap")  # 缓存的 HTML, 不存在为 None
+    if not note_html or not note_html.strip():
+        if await JobService.isPending(uid, ["initial", "soap"]):  # 后台生成中
+            return JSONResponse({
+                "status": "pending",
+                "uid": uid,
+                "note": ""
+            })
+    if note_html is None:
         return JSONResponse({
             "status": "redirect",
             "redirect_url": f"/chat/{uid}"
         })
 
-    note_html = markdown.markdown(cdg.soap, extensions=['extra', 'markdown.extensions.tables'])
-
     return JSONResponse({
         "status": "success",
         "uid": uid,
@@ -70,46 +91,16 @@ async def getNote(uid: str):
 
 @api_note.post('/{uid}')
 async def generateSOAP(uid: str):
-    """生成 uid 患者的 SOAP 临床记录"""
+    """生成 uid 患者的 SOAP 临床记录 (同步等待, 前端默认使用 /job/{uid}/soap 后台生成)"""
     try:
-        pim = await PIM.get(uid=uid)
-        cdg = await CDG.get(uid=uid)
+        note = await GenerateService.soap(uid)
     except DoesNotExist:
         return JSONResponse({
             "status": "redirect",
             "redirect_url": f"/chat/{uid}"
         })
 
-    disease_prob_dict = pim.diseases[-1]
-    # disease_prob_dict = PIMService.top_k_items(disease_prob_dict, 5)
-
-    disease_opt_dict = cdg.disease_opt_dict
-
-    initial_note = cdg.initial
-    qa_messages = pim.qa_messages
-    symptoms_ = pim.symptoms  # {'S': Bool | None}
-    symptoms = {}
-    for k, v in symptoms_.items():
-        if v is True:
-            symptoms[k] = "是"
-        elif v is False:
-            symptoms[k] = "否"
-        else:
-            symptoms[k] = "未知"
-    # {'S': "是" | "否" | "未知"}
-    patient_addition = pim.addition
-    disease_name_list = list(disease_opt_dict.keys())
-    knowledge_addition_list = await PIMService.knowledge_query(disease_name_list)
-
-    table_str = await PIMService.tableStr(disease_name_list, symptoms_)
-
-    note = await AIGenerator.cdg02GenerateSOAP(disease_prob_dict, disease_opt_dict, initial_note, qa_messages, symptoms, patient_addition,
-                                               knowledge_addition_list, table_str)
-    note_html = markdown.markdown(note, extensions=['extra', 'markdown.extensions.tables'])
-
-    # 数据库保存
-    cdg.soap = note
-    await cdg.save()
+    _, note_html = await RenderService.render(note)  # 生成时已渲染, 命中缓存
 
     return JSONResponse({
         "status": "success",
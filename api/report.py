@@ -1,19 +1,12 @@
-import asyncio
-import os
-import pathlib
-import markdown
-
 from fastapi import APIRouter, Form, Request
 from fastapi.responses import JSONResponse, HTMLResponse, RedirectResponse
 from tortoise.exceptions import DoesNotExist
-from fastapi.templating import Jinja2Templates
 
-from models import PIM, PSG, MedicalKnowledge
-from .utils import AIGenerator
+from models import PSG
+from utils.templates import templates
+from .utils import GenerateService, JobService, RenderService, HTTPCache
 
 api_report = APIRouter()
-templates_path = os.path.join(pathlib.Path(__file__).parent.parent, "templates")
-templates = Jinja2Templates(directory=templates_path)
 
 
 @api_report.get('/')
@@ -53,13 +46,48 @@ async def showHTML(request: Request, uid: str):
     )
 
 
+@api_report.get('/{uid}/content')
+async def getReportContent(request: Request, uid: str):
+    """获取 uid 患者的报告 (只读, 支持 ETag / If-None-Match)"""
+    content_hash = await RenderService.storedHash(PSG, uid, "report")
+    if content_hash:
+        etag = HTTPCache.etag("report", uid, content_hash)
+        if HTTPCache.notModified(request, etag):  # 未变化, 不读取正文
+            return HTTPCache.notModifiedResponse(etag)
+
+    result = await RenderService.htmlWithHash(PSG, uid, "report")
+    if result is None:
+        return HTTPCache.noStore({
+            "status": "redirect",
+            "redirect_url": f"/chat/{uid}"
+        })
+    content_hash, report_html = result
+    if not report_html.strip() and await JobService.isPending(uid, ["initial", "report"]):  # 后台生成中
+        return HTTPCache.noStore({
+            "status": "pending",
+            "uid": uid,
+            "report": ""
+        })
+
+    return HTTPCache.jsonResponse(request, {
+        "status": "success",
+        "uid": uid,
+        "report": report_html
+    }, etag=HTTPCache.etag("report", uid, content_hash))
+
+
 @api_report.put('/{uid}')
 async def getReport(uid: str):
     """获取 uid 患者的报告"""
-    try:
-        psg = await PSG.get(uid=uid)
-        report_html = markdown.markdown(psg.report, extensions=['extra', 'markdown.extensions.tables'])
-    except DoesNotExist:
+    report_html = await RenderService.html(PSG, uid, "report")  # 缓存的 HTML, 不存在为 None
+    if not report_html or not report_html.strip():
+        if await JobService.isPending(uid, ["initial", "report"]):  # 后台生成中
+            return JSONResponse({
+                "status": "pending",
+                "uid": uid,
+                "report": ""
+            })
+    if report_html is None:
         return JSONResponse({
             "status": "redirect",
             "redirect_url": f"/chat/{uid}"
@@ -74,50 +102,25 @@ async def getReport(uid: str):
 
 @api_report.post('/{uid}')
 async def generateReport(uid: str):
-    """生成 uid 患者的报告"""
+    """生成 uid 患者的报告 (同步等待, 前端默认使用 /job/{uid}/report 后台生成)"""
     try:
-        pim = await PIM.get(uid=uid)
-        psg = await PSG.get(uid=uid)
+        # 生成报告并保存到数据库
+        report = await GenerateService.report(uid)
     except DoesNotExist:
         return JSONResponse({
             "status": "redirect",
             "redirect_url": f"/chat/{uid}"
         })
-
-    disease_name = psg.disease_opt
-    qa_messages = pim.qa_messages
-    symptoms_ = pim.symptoms  # {'S': Bool | None}
-    symptoms = {}
-    for k, v in symptoms_.items():
-        if v is True:
-            symptoms[k] = "是"
-        elif v is False:
-            symptoms[k] = "否"
-        else:
-            symptoms[k] = "未知"
-    # {'S': "是" | "否" | "未知"}
-    patient_addition = pim.addition
-    try:
-        knowledge_addition = await MedicalKnowledge.get(name=disease_name).values()
-    except DoesNotExist:
-        knowledge_addition = []
-
-    try:
-        # 生成报告
-        report = await AIGenerator.psg01GenerateReport(disease_name, qa_messages, symptoms, patient_addition, knowledge_addition)
-        # 保存生成的报告到数据库
-        psg.report = report
-        report_html = markdown.markdown(report, extensions=['extra', 'markdown.extensions.tables'])
-        await psg.save()
-        return JSONResponse({
-            "status": "success",
-            "uid": uid,
-            "report": report_html,  # html
-        })
-
     except Exception as e:
         return JSONResponse({
             "status": "error",
             "uid": uid,
             "report": "网络卡顿或系统繁忙，请稍后重试！"
         })
+
+    _, report_html = await RenderService.render(report)  # 生成时已渲染, 命中缓存
+    return JSONResponse({
+        "status": "success",
+        "uid": uid,
+        "report": report_html,  # html
+    })
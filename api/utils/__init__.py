@@ -1,5 +1,18 @@
+from .reference_snapshot import ReferenceSnapshot
+from .knowledge_store import KnowledgeStore
+from .knowledge_loader import KnowledgeLoader
+from .knowledge_snippet import KnowledgeSnippet
 from .entropy_calculator import EntropyCalculator
 from .pim_service import PIMService
 from .ai_integration import AIGenerator
+from .session_repository import SessionRepository
+from .archive_service import ArchiveService
+from .render_service import RenderService
+from .http_cache import HTTPCache
+from .generate_service import GenerateService
+from .replay_service import ReplayService
+from .job_service import JobService
+from .export_service import ExportService
+from .analytics_service import AnalyticsService
 from .experiment_agent import VirtualPatient
 from .experiment_service import ExperimentService
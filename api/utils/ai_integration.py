@@ -13,16 +13,36 @@ from http import HTTPStatus
 import settings
 from settings import API_KEY, PIM_01_APP_ID, PIM_02_APP_ID, PIM_03_APP_ID, PSG_APP_ID, CDG_01_APP_ID, CDG_02_APP_ID, PIM_02_APP_ID_PLUS, \
     EXPERIMENT_01_APP_ID, EXPERIMENT_02_APP_ID, EXPERIMENT_03_APP_ID
+from middlewares.trace_middleware import span
 
 
 class AIGenerator:
+    # 追踪 span 名 {app_id: name}
+    APP_NAMES = {
+        PIM_01_APP_ID: "llm.pim01",
+        PIM_02_APP_ID: "llm.pim02",
+        PIM_02_APP_ID_PLUS: "llm.pim02plus",
+        PIM_03_APP_ID: "llm.pim03",
+        PSG_APP_ID: "llm.psg01",
+        CDG_01_APP_ID: "llm.cdg01",
+        CDG_02_APP_ID: "llm.cdg02",
+        EXPERIMENT_01_APP_ID: "llm.experiment01",
+        EXPERIMENT_02_APP_ID: "llm.experiment02",
+        EXPERIMENT_03_APP_ID: "llm.experiment03",
+    }
+
     @classmethod
     async def _call_application(cls, messages, app_id):
-        response = Application.call(
-            api_key=API_KEY,
-            app_id=app_id,
-            messages=messages
-        )
+        # Application.call 为同步阻塞请求, 放入线程执行, 避免阻塞事件循环 (否则 asyncio.gather 无法真正并发)
+        with span(cls.APP_NAMES.get(app_id, "llm"), app_id=app_id) as s:
+            response = await asyncio.to_thread(
+                Application.call,
+                api_key=API_KEY,
+                app_id=app_id,
+                messages=messages
+            )
+            if s is not None:
+                s.attributes["status_code"] = getattr(response, "status_code", None)
         return response
 
     # ================== I/O & web request, need async ==================
@@ -186,7 +206,7 @@ class AIGenerator:
             qa_messages: List[Dict[str, str]],
             symptoms: Dict[str, bool | None | str],
             patient_addition: str,
-            knowledge_addition: Dict[str, List[str] | str],
+            knowledge_addition: str,
     ) -> str:
         """
         PSG 患者报告
@@ -194,7 +214,7 @@ class AIGenerator:
         :param qa_messages: 问诊对话内容 [{'role': 'system', 'content': '...'}, {'role': 'user', 'content': '...'}, ...]
         :param symptoms: 是否出现某些症状的字典 {'S1': True, 'S2': False, 'S3': None}
         :param patient_addition: 患者补充的其他信息 "..."
-        :param knowledge_addition: 有关疾病的补充信息 {'name': 'D1', 'desc': '...', 'category': ['...', ...], ...}
+        :param knowledge_addition: 有关疾病的补充信息 (KnowledgeSnippet 片段) "【D1】\n- 病征：..."
         :return: 患者报告 "..."
         """
         # 用户信息
@@ -288,7 +308,7 @@ class AIGenerator:
             qa_messages: List[Dict[str, str]],
             symptoms: Dict[str, bool | None | str],
             patient_addition: str,
-            knowledge_addition_list: List[Dict[str, str | List[str]]],
+            knowledge_addition_list: str,
             table_str: str = ""
     ) -> str:
         """
@@ -299,7 +319,7 @@ class AIGenerator:
         :param qa_messages: 问诊对话内容 [{'role': 'system', 'content': '...'}, {'role': 'user', 'content': '...'}, ...]
         :param symptoms: 是否出现某些症状的字典 {'S1': True, 'S2': False, 'S3': None}
         :param patient_addition: 患者补充的其他信息 "..."
-        :param knowledge_addition_list: top-k 疾病专业知识 [{'name': 'D1', 'desc': '...', 'category': ['...', ...], ...}, ...]
+        :param knowledge_addition_list: top-k 疾病专业知识 (KnowledgeSnippet 片段) "【D1】\n- 病征：...\n\n【D2】..."
         :param table_str: 症状表格 markdown 格式 |table|table|
         :return: SOAP 病历内容 markdown 格式 "..."
         """
@@ -0,0 +1,267 @@
+from collections import defaultdict
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from typing import Dict, List, Optional, Type
+
+from tortoise import timezone
+from tortoise.expressions import F
+from tortoise.functions import Sum
+from tortoise.models import Model
+from tortoise.transactions import in_transaction
+
+from models import PIM, CDG, EVAL, StatDaily, StatDisease, StatRounds, StatSession
+from middlewares.logger_middleware import logger, tz
+
+DASHBOARD_DAYS = 30  # 看板展示最近天数
+DASHBOARD_TOP_DISEASES = 20  # 看板展示疾病数
+BACKFILL_CHUNK_SIZE = 500
+
+
+class AnalyticsService:
+    """管理员看板统计: 问诊/评分发生时增量更新汇总表, 看板只读汇总表"""
+
+    # ================== I/O, need async ==================
+    @classmethod
+    async def sessionStarted(cls, created_at: datetime) -> None:
+        """新建问诊"""
+        await cls._safe(cls._incr(StatDaily, {"date": cls._day(created_at)}, sessions=1))
+
+    @classmethod
+    async def answerRecorded(cls, created_at: datetime, is_related: bool) -> None:
+        """患者回答一次 (PIM03 判断后)"""
+        await cls._safe(cls._incr(StatDaily, {"date": cls._day(created_at)}, answers=1, unrelated=0 if is_related else 1))
+
+    @classmethod
+    async def sessionFinished(cls, uid: str, created_at: datetime, qa_messages: List[Dict], disease_opt: str) -> None:
+        """问诊完成 (初步诊断生成后), 重新生成时先扣除旧贡献"""
+        await cls._safe(cls._sessionFinished(uid, created_at, qa_messages, disease_opt))
+
+    @classmethod
+    async def evalSubmitted(cls, uid: str, created_at: datetime, mode: str, eval_values_list: List[str]) -> None:
+        """提交评分, 重新评分时先扣除旧贡献"""
+        await cls._safe(cls._evalSubmitted(uid, created_at, mode, eval_values_list))
+
+    @classmethod
+    async def sessionDeleted(cls, uid: str, created_at: datetime, qa_messages: List[Dict], unrelated_count: int) -> None:
+        """删除问诊 (管理员), 扣除其全部贡献; 回答次数与不相关次数按 backfill 的方式近似"""
+        await cls._safe(cls._sessionDeleted(uid, created_at, qa_messages, unrelated_count))
+
+    @classmethod
+    async def dashboard(cls, days: int = DASHBOARD_DAYS) -> Dict:
+        """读取汇总表, 与问诊总量无关"""
+        since = cls._day(timezone.now()) - timedelta(days=days - 1)
+        daily = await StatDaily.filter(date__gte=since).order_by("date").values()
+        rounds = await StatRounds.filter(count__gt=0).order_by("rounds").values_list("rounds", "count")
+        diseases = await StatDisease.filter(count__gt=0).order_by("-count").limit(DASHBOARD_TOP_DISEASES).values_list("disease", "count")
+        total = await StatDaily.annotate(
+            sessions=Sum("sessions"), finished=Sum("finished"), rounds_sum=Sum("rounds_sum"),
+            answers=Sum("answers"), unrelated=Sum("unrelated"),
+            patient_eval_sum=Sum("patient_eval_sum"), patient_eval_count=Sum("patient_eval_count"),
+            doctor_eval_sum=Sum("doctor_eval_sum"), doctor_eval_count=Sum("doctor_eval_count"),
+        ).first().values(
+            "sessions", "finished", "rounds_sum", "answers", "unrelated",
+            "patient_eval_sum", "patient_eval_count", "doctor_eval_sum", "doctor_eval_count"
+        )
+        total = {k: v or 0 for k, v in (total or {}).items()}
+
+        return {
+            "daily": [
+                {
+                    "date": d["date"].isoformat(),
+                    "sessions": d["sessions"],
+                    "finished": d["finished"],
+                    "avg_rounds": cls._ratio(d["rounds_sum"], d["finished"]),
+                    "unrelated_rate": cls._ratio(d["unrelated"], d["answers"]),
+                }
+                for d in daily
+            ],
+            "rounds": dict(rounds),
+            "diseases": dict(diseases),
+            "total": {
+                "sessions": total.get("sessions", 0),
+                "finished": total.get("finished", 0),
+                "avg_rounds": cls._ratio(total.get("rounds_sum", 0), total.get("finished", 0)),
+                "unrelated_rate": cls._ratio(total.get("unrelated", 0), total.get("answers", 0)),
+                "patient_eval": cls._ratio(total.get("patient_eval_sum", 0), total.get("patient_eval_count", 0)),
+                "doctor_eval": cls._ratio(total.get("doctor_eval_sum", 0), total.get("doctor_eval_count", 0)),
+            }
+        }
+
+    @classmethod
+    async def backfill(cls) -> int:
+        """
+        根据现有 PIM / CDG / EVAL 重建汇总表 (单个事务内删除并重建)
+        历史不相关回答无法从对话中还原 (不相关回答会被覆盖), 以每个问诊当前的 unrelated_count 近似
+        :return: 处理的问诊数
+        """
+        async with in_transaction("default"):  # 重建期间看板仍读到旧汇总, 失败则回滚
+            for model in (StatDaily, StatDisease, StatRounds, StatSession):
+                await model.all().delete()
+
+            daily = defaultdict(lambda: defaultdict(float))
+            diseases = defaultdict(int)
+            rounds = defaultdict(int)
+            n = 0
+            last_id = 0
+            while True:
+                pims = await PIM.filter(id__gt=last_id).order_by("id").limit(BACKFILL_CHUNK_SIZE).values(
+                    "id", "uid", "created_at", "qa_messages", "unrelated_count")
+                if not pims:
+                    break
+                last_id = pims[-1]["id"]
+                uids = [pim["uid"] for pim in pims]
+                cdg_dict = dict(await CDG.filter(uid__in=uids).values_list("uid", "disease_opt"))
+                eval_dict = {e["uid"]: e for e in await EVAL.filter(uid__in=uids).values("uid", "patient_eval", "doctor_eval")}
+
+                sessions = []
+                for pim in pims:
+                    uid = pim["uid"]
+                    day = cls._day(pim["created_at"])
+                    d = daily[day]
+                    d["sessions"] += 1
+                    d["answers"] += cls._answers(pim["qa_messages"])
+                    d["unrelated"] += pim["unrelated_count"]
+
+                    session = StatSession(uid=uid, date=day)
+                    disease_opt = cdg_dict.get(uid, "")
+                    if disease_opt:
+                        session.finished = True
+                        session.rounds = cls._rounds(pim["qa_messages"])
+                        session.disease_opt = disease_opt
+                        d["finished"] += 1
+                        d["rounds_sum"] += session.rounds
+                        rounds[session.rounds] += 1
+                        diseases[disease_opt] += 1
+
+                    _eval = eval_dict.get(uid)
+                    if _eval is not None:
+                        session.patient_score = cls._score(_eval["patient_eval"])
+                        session.doctor_score = cls._score(_eval["doctor_eval"])
+                        for mode in ("patient", "doctor"):
+                            score = getattr(session, f"{mode}_score")
+                            if score is not None:
+                                d[f"{mode}_eval_sum"] += score
+                                d[f"{mode}_eval_count"] += 1
+                    sessions.append(session)
+                await StatSession.bulk_create(sessions)
+                n += len(pims)
+
+            await StatDaily.bulk_create([
+                StatDaily(date=day, **{k: v if k in ("patient_eval_sum", "doctor_eval_sum") else int(v) for k, v in counters.items()})
+                for day, counters in daily.items()
+            ])
+            await StatDisease.bulk_create([StatDisease(disease=k, count=v) for k, v in diseases.items()])
+            await StatRounds.bulk_create([StatRounds(rounds=k, count=v) for k, v in rounds.items()])
+        return n
+
+    @classmethod
+    async def _sessionFinished(cls, uid: str, created_at: datetime, qa_messages: List[Dict], disease_opt: str) -> None:
+        async with in_transaction("default"):
+            session = await cls._session(uid, created_at)
+            await cls._retractFinished(session)
+
+            session.finished = True
+            session.rounds = cls._rounds(qa_messages)
+            session.disease_opt = disease_opt
+            await cls._incr(StatDaily, {"date": session.date}, finished=1, rounds_sum=session.rounds)
+            await cls._incr(StatRounds, {"rounds": session.rounds}, count=1)
+            if disease_opt:
+                await cls._incr(StatDisease, {"disease": disease_opt}, count=1)
+            await session.save()
+
+    @classmethod
+    async def _evalSubmitted(cls, uid: str, created_at: datetime, mode: str, eval_values_list: List[str]) -> None:
+        field = "doctor" if mode == "doctor" else "patient"
+        async with in_transaction("default"):
+            session = await cls._session(uid, created_at)
+            await cls._retractEval(session, field)
+
+            score = cls._score(eval_values_list)
+            if score is not None:
+                await cls._incr(StatDaily, {"date": session.date}, **{f"{field}_eval_sum": score, f"{field}_eval_count": 1})
+            setattr(session, f"{field}_score", score)
+            await session.save()
+
+    @classmethod
+    async def _sessionDeleted(cls, uid: str, created_at: datetime, qa_messages: List[Dict], unrelated_count: int) -> None:
+        async with in_transaction("default"):
+            await cls._incr(StatDaily, {"date": cls._day(created_at)},
+                            sessions=-1, answers=-cls._answers(qa_messages), unrelated=-unrelated_count)
+            session = await StatSession.select_for_update().get_or_none(uid=uid)
+            if session is None:  # 尚未完成且未评分
+                return
+            await cls._retractFinished(session)
+            for field in ("patient", "doctor"):
+                await cls._retractEval(session, field)
+            await session.delete()
+
+    @classmethod
+    async def _retractFinished(cls, session: StatSession) -> None:
+        """扣除问诊完成的旧贡献"""
+        if not session.finished:
+            return
+        await cls._incr(StatDaily, {"date": session.date}, finished=-1, rounds_sum=-session.rounds)
+        await cls._incr(StatRounds, {"rounds": session.rounds}, count=-1)
+        if session.disease_opt:
+            await cls._incr(StatDisease, {"disease": session.disease_opt}, count=-1)
+
+    @classmethod
+    async def _retractEval(cls, session: StatSession, field: str) -> None:
+        """扣除评分的旧贡献, field: "patient" | "doctor" """
+        old_score = getattr(session, f"{field}_score")
+        if old_score is not None:
+            await cls._incr(StatDaily, {"date": session.date}, **{f"{field}_eval_sum": -old_score, f"{field}_eval_count": -1})
+
+    @classmethod
+    async def _session(cls, uid: str, created_at: datetime) -> StatSession:
+        """问诊的贡献记录 (须在事务中调用), 加行锁: 同一问诊并发重新生成 / 评分时依次扣除旧贡献"""
+        await StatSession.get_or_create(uid=uid, defaults={"date": cls._day(created_at)})
+        return await StatSession.select_for_update().get(uid=uid)
+
+    @classmethod
+    async def _incr(cls, model: Type[Model], key: Dict, **deltas) -> None:
+        """原子增量更新 key 对应的汇总行, 不存在则创建 (并发首次写入时由唯一键保证只创建一行, 增量均不丢失)"""
+        updates = {k: F(k) + v for k, v in deltas.items()}
+        async with in_transaction("default"):
+            await model.get_or_create(**key)
+            await model.filter(**key).update(**updates)
+
+    @classmethod
+    async def _safe(cls, coro) -> None:
+        """统计失败不影响主流程"""
+        try:
+            await coro
+        except Exception as e:
+            logger.error(f"[analytics] {repr(e)}")
+
+    # ================== not I/O, not need async ==================
+    @classmethod
+    def _day(cls, dt: datetime) -> date:
+        """按应用本地时区 (settings.TIMEZONE) 取日期, 实时计数 / backfill / 看板一致; naive 时间视为 UTC (created_at 以 UTC 存储)"""
+        if timezone.is_naive(dt):
+            dt = dt.replace(tzinfo=dt_timezone.utc)
+        return dt.astimezone(tz).date()
+
+    @classmethod
+    def _rounds(cls, qa_messages: List[Dict]) -> int:
+        """对话轮次, 与问诊结束条件一致"""
+        return len(qa_messages) // 2
+
+    @classmethod
+    def _answers(cls, qa_messages: List[Dict]) -> int:
+        """患者回答次数 (不含初次描述)"""
+        return max(sum(1 for m in qa_messages if m.get("role") == "user") - 1, 0)
+
+    @classmethod
+    def _score(cls, eval_values_list: List[str]) -> Optional[float]:
+        """问卷平均分, 最后两项为文字评价"""
+        scores = []
+        for v in eval_values_list[:-2]:
+            try:
+                scores.append(float(v))
+            except (TypeError, ValueError):
+                continue
+        return sum(scores) / len(scores) if scores else None
+
+    @classmethod
+    def _ratio(cls, a: float, b: float) -> Optional[float]:
+        return round(a / b, 4) if b else None
@@ -0,0 +1,170 @@
+import gzip
+import json
+from collections import OrderedDict
+from datetime import timedelta
+from typing import Dict, List, Optional, Tuple, Type
+
+from tortoise import timezone
+from tortoise.functions import Count, Sum
+from tortoise.models import Model
+from tortoise.transactions import in_transaction
+
+from models import PIM, PSG, CDG, EVAL, Job, Archive
+from settings import ARCHIVE_AFTER_DAYS, ARCHIVE_BATCH_SIZE, ARCHIVE_CODEC, ARCHIVE_ZSTD_LEVEL, ARCHIVE_GZIP_LEVEL
+from middlewares.logger_middleware import logger
+from utils import Executor
+
+try:
+    import zstandard
+except ImportError:  # 可选依赖, 未安装则使用 gzip
+    zstandard = None
+
+ARCHIVE_CACHE_SIZE = 64  # 进程内 LRU 缓存的已解压问诊数
+
+
+class ArchiveService:
+    """冷存储: 超过保留期的问诊整体压缩写入 Archive 并从原表删除, 报告 / 病历 / 详情读取时透明回退到归档"""
+    TABLES = {
+        "pim": PIM,
+        "psg": PSG,
+        "cdg": CDG,
+        "eval": EVAL,
+    }
+
+    _cache: "OrderedDict[str, Dict]" = OrderedDict()  # {uid: 解压后的 payload}
+
+    # ================== I/O, need async ==================
+    @classmethod
+    async def archive(cls, days: int = ARCHIVE_AFTER_DAYS, batch_size: int = ARCHIVE_BATCH_SIZE, dry_run: bool = False) -> Dict:
+        """
+        归档创建超过 days 天的问诊 (有进行中后台任务的跳过), 每批一个事务
+        :param days: 保留天数
+        :param batch_size: 每批问诊数
+        :param dry_run: 只压缩统计, 不写入不删除
+        :return: {'sessions': 120, 'raw_size': ..., 'stored_size': ...}
+        """
+        from .job_service import PENDING, RUNNING
+
+        cutoff = timezone.now() - timedelta(days=days)
+        total = {"sessions": 0, "raw_size": 0, "stored_size": 0}
+        last_id = 0
+        while True:
+            pims = await PIM.filter(id__gt=last_id, created_at__lt=cutoff).order_by("id").limit(batch_size).values()
+            if not pims:
+                break
+            last_id = pims[-1]["id"]
+            uids = [pim["uid"] for pim in pims]
+            busy = set(await Job.filter(uid__in=uids, status__in=[PENDING, RUNNING]).values_list("uid", flat=True))
+            pims = [pim for pim in pims if pim["uid"] not in busy]
+            uids = [pim["uid"] for pim in pims]
+            if not uids:
+                continue
+
+            related = {}
+            for table in ("psg", "cdg", "eval"):
+                rows = await cls.TABLES[table].filter(uid__in=uids).values()
+                related[table] = {row["uid"]: row for row in rows}
+            payloads = [
+                {"pim": pim, **{table: related[table].get(pim["uid"]) for table in ("psg", "cdg", "eval")}}
+                for pim in pims
+            ]
+            packed = await Executor.thread(cls.packAll, payloads)  # zlib / zstd 压缩释放 GIL
+
+            archives = [
+                Archive(uid=payload["pim"]["uid"], disease_opt=(payload["cdg"] or {}).get("disease_opt", ""),
+                        codec=codec, payload=blob, raw_size=raw_size, stored_size=len(blob),
+                        created_at=payload["pim"]["created_at"])
+                for payload, (codec, blob, raw_size) in zip(payloads, packed)
+            ]
+            total["sessions"] += len(archives)
+            total["raw_size"] += sum(a.raw_size for a in archives)
+            total["stored_size"] += sum(a.stored_size for a in archives)
+            if dry_run:
+                continue
+
+            async with in_transaction("default") as conn:  # DB_READ 时有多个连接, 须指定
+                await Archive.bulk_create(archives, using_db=conn)
+                for table in ("eval", "psg", "cdg"):
+                    await cls.TABLES[table].filter(uid__in=uids).using_db(conn).delete()
+                await Job.filter(uid__in=uids).using_db(conn).delete()
+                await PIM.filter(uid__in=uids).using_db(conn).delete()
+            logger.info(f"[archive] {len(uids)} sessions up to pim.id={last_id}")
+        return total
+
+    @classmethod
+    async def session(cls, uid: str) -> Optional[Dict]:
+        """
+        已归档问诊的完整内容 {'pim': {...}, 'psg': {...} | None, ...}, 未归档返回 None
+        缓存只省去解压; 命中时仍确认归档行存在, 其他 worker 删除后立即不可读
+        """
+        if uid in cls._cache:
+            if not await Archive.filter(uid=uid).exists():
+                cls._cache.pop(uid, None)
+                return None
+            cls._cache.move_to_end(uid)
+            return cls._cache[uid]
+        row = await Archive.filter(uid=uid).first().values("codec", "payload")
+        if row is None:
+            return None
+        payload = await Executor.thread(cls.unpack, row["codec"], row["payload"])
+        cls._cache[uid] = payload
+        while len(cls._cache) > ARCHIVE_CACHE_SIZE:
+            cls._cache.popitem(last=False)
+        return payload
+
+    @classmethod
+    async def row(cls, model: Type[Model], uid: str) -> Optional[Dict]:
+        """已归档问诊中 model 对应的整行 (同 model.values()), 未归档或无该记录返回 None"""
+        payload = await cls.session(uid)
+        return None if payload is None else payload.get(model._meta.db_table)
+
+    @classmethod
+    async def stats(cls) -> Dict:
+        """归档数量与节省空间 (原始 JSON 字节数 vs 压缩后字节数)"""
+        row = await Archive.annotate(
+            sessions=Count("id"), raw_size=Sum("raw_size"), stored_size=Sum("stored_size")
+        ).first().values("sessions", "raw_size", "stored_size")
+        row = {k: v or 0 for k, v in (row or {}).items()}
+        raw_size, stored_size = row.get("raw_size", 0), row.get("stored_size", 0)
+        return {
+            "sessions": row.get("sessions", 0),
+            "raw_size": raw_size,
+            "stored_size": stored_size,
+            "saved_size": raw_size - stored_size,
+            "ratio": round(raw_size / stored_size, 2) if stored_size else None,
+        }
+
+    @classmethod
+    async def delete(cls, uid: str) -> int:
+        cls._cache.pop(uid, None)
+        return await Archive.filter(uid=uid).delete()
+
+    # ================== not I/O, not need async ==================
+    @classmethod
+    def packAll(cls, payloads: List[Dict]) -> List[Tuple[str, bytes, int]]:
+        return [cls.pack(payload) for payload in payloads]
+
+    @classmethod
+    def pack(cls, payload: Dict) -> Tuple[str, bytes, int]:
+        """序列化并压缩, 返回 (codec, blob, 原始字节数)"""
+        raw = json.dumps(payload, ensure_ascii=False, separators=(",", ":"), default=cls._default).encode("utf-8")
+        if ARCHIVE_CODEC == "zstd" and zstandard is not None:
+            return "zstd", zstandard.ZstdCompressor(level=ARCHIVE_ZSTD_LEVEL).compress(raw), len(raw)
+        return "gzip", gzip.compress(raw, compresslevel=ARCHIVE_GZIP_LEVEL), len(raw)
+
+    @classmethod
+    def unpack(cls, codec: str, blob: bytes) -> Dict:
+        if codec == "zstd":
+            if zstandard is None:
+                raise RuntimeError("归档使用 zstd 压缩, 需安装 zstandard")
+            raw = zstandard.ZstdDecompressor().decompress(blob)
+        else:
+            raw = gzip.decompress(blob)
+        return json.loads(raw)
+
+    @staticmethod
+    def _default(value):
+        """datetime / date -> ISO 字符串"""
+        if hasattr(value, "isoformat"):
+            return value.isoformat()
+        return str(value)
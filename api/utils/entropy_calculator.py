@@ -7,7 +7,10 @@ import numpy as np
 import pandas as pd
 from typing import Dict, List, Tuple, Any, Union, Optional
 
-from models import DiseaseProb, MedicalKnowledge, SymptomProb
+from middlewares.trace_middleware import traced
+from settings import OFFLOAD_MIN_CELLS
+from utils import Executor
+from .knowledge_loader import KnowledgeLoader
 
 
 class EntropyCalculator:
@@ -17,6 +20,7 @@ class EntropyCalculator:
     # ======================= I/O 操作 异步 =======================
 
     @classmethod
+    @traced("ieg")
     async def calculateIEG(
             cls,
             disease_prob_dict: Dict[str, float],
@@ -28,13 +32,143 @@ class EntropyCalculator:
         :param known_symptom_dict: 已获得的症状字典 {'S1': True, 'S2': False, 'S3': None}
         :return: {'S5': 0.1332, 'S4': 0.1132, ...}
         """
+        # Step 2: 获取 Disease & Symptom 的信息
+        _, symptom_prob_dict, sd_relation = await cls.SDInfo(disease_prob_dict, known_symptom_dict)
+
+        # Step 3 ~ 7: 矩阵计算, 规模较大时移出事件循环 (NumPy 释放 GIL, 使用线程池)
+        return await Executor.offload(
+            cls._IEG, disease_prob_dict, symptom_prob_dict, sd_relation,
+            size=len(disease_prob_dict) * len(symptom_prob_dict), threshold=OFFLOAD_MIN_CELLS
+        )
+
+    @classmethod
+    @traced("bayes")
+    async def updateDiseaseProb(
+            cls,
+            disease_prob_dict: Dict[str, float],
+            new_known_symptom_dict: Optional[Dict[str, bool | None]] = None,
+            known_symptom_dict: Optional[Dict[str, bool | None]] = None,
+    ):
+        """
+        更新疾病概率
+        :param disease_prob_dict: 当前疾病概率 (待更新) {'D1': 0.1, 'D2': 0.4, ...}
+        :param new_known_symptom_dict: 最新获取的症状信息 {'S6': True | False | None}
+        :param known_symptom_dict: 当前疾病概率 (待更新) {'S1': True, 'S2': False, 'S3': None}
+        :return: 最新的疾病概率 {'D1': 0.1, 'D2': 0.4, ...}
+        """
+        # flag = list(new_known_symptom_dict.values())[0]
+        # 最简单情况, 若为 None 则不更新
+        # if flag is None:
+        #     return disease_prob_dict
+
+        # Step 2: 获取 Disease & Symptom 的信息
+        _, symptom_prob_dict, sd_relation = await cls.SDInfo(disease_prob_dict)
+
+        # Step 3 ~ 7: 矩阵计算, 规模较大时移出事件循环
+        return await Executor.offload(
+            cls._posterior, disease_prob_dict, symptom_prob_dict, sd_relation, new_known_symptom_dict, known_symptom_dict,
+            size=len(disease_prob_dict) * len(symptom_prob_dict), threshold=OFFLOAD_MIN_CELLS
+        )
+
+    @classmethod
+    @traced("bayes")
+    async def updateDiseaseProbV2(
+            cls,
+            disease_prob_dict: Dict[str, float],
+            new_known_symptom_dict: Optional[Dict[str, bool | None]],
+            known_symptom_dict: Optional[Dict[str, bool | None]] = None,
+    ):
+        """
+        更新疾病概率
+        :param disease_prob_dict: 当前疾病概率 (待更新) {'D1': 0.1, 'D2': 0.4, ...}
+        :param new_known_symptom_dict: 最新获取的症状信息 {'S6': True | False | None}
+        :param known_symptom_dict: 当前疾病概率 (待更新) {'S1': True, 'S2': False, 'S3': None}
+        :return: 最新的疾病概率 {'D1': 0.1, 'D2': 0.4, ...}
+        """
+        if list(new_known_symptom_dict.values())[0] is None:
+            return disease_prob_dict
+        # Step 2: 获取 Disease & Symptom 的信息
+        _, symptom_prob_dict, sd_relation = await EntropyCalculator.SDInfo(disease_prob_dict, known_symptom_dict)
+
+        # Step 3 ~ 7: 矩阵计算, 规模较大时移出事件循环
+        return await Executor.offload(
+            cls._posteriorV2, disease_prob_dict, symptom_prob_dict, sd_relation, new_known_symptom_dict,
+            size=len(disease_prob_dict) * len(symptom_prob_dict), threshold=OFFLOAD_MIN_CELLS
+        )
+
+    @classmethod
+    @traced("knowledge")
+    async def SDInfo(
+            cls,
+            diseases: Union[List[str], Dict[str, float]],
+            known_symptom_dict: Optional[Dict[str, bool | None]] = None,
+    ) -> Tuple[Dict[str, float] | None, Dict[str, float], Dict[str, List[str]]]:
+        """
+        根据疾病信息合并全部症状, 返回 "疾病-症状" 信息 (未归一化)
+        :param diseases: 疾病信息 ['D1', 'D2', ...] 或者 {'D1': 0.1, 'D2': 0.4, ...}
+        :param known_symptom_dict: 已获取的症状 {'S1': True, 'S2': False, 'S3': None}
+        :return ({'D1': 0.1, 'D2': 0.4, ...}, {'S1': 0.43, 'S2': 0.01, ...}, {'D1': ['S1', ...], ...})
+        """
+        # part 1: 疾病概率
+        # diseases_prob_dict = await cls.getDiseaseProbDict(diseases)
+
+        # part 2: 疾病-症状关系表 & 症状概率
+        symptom_prob_dict, sd_relation = await cls.getSymptomProbDict_SDRelation(diseases, known_symptom_dict)
+
+        return None, symptom_prob_dict, sd_relation
+
+    @classmethod
+    async def getSymptomProbDict_SDRelation(
+            cls,
+            diseases: Union[List[str], Dict[str, float]],
+            known_symptom_dict: Optional[Dict[str, bool | None]] = None,
+    ) -> Tuple[Dict[str, float], Dict[str, List[str]]]:
+        """获取疾病对应的所有症状 & 症状概率字典"""
+        if known_symptom_dict is None:
+            known_symptom_dict = {}
+        known_symptom_list = set(known_symptom_dict.keys())
+
+        # step 1: 疾病-症状关系表 (经 KnowledgeLoader, 同一请求内合并查询并缓存)
+        disease_name_list = list(diseases.keys()) if isinstance(diseases, dict) else diseases
+        symptom_of_one_disease_dict = await KnowledgeLoader.symptomsOf(disease_name_list)
+        # {'D1': ['S1', ...], ...}
+        sd_relation = {}
+        for _disease_name, _symptom_list in symptom_of_one_disease_dict.items():
+            _symptom_list = [_symptom for _symptom in _symptom_list if _symptom not in known_symptom_list]
+            sd_relation[_disease_name] = _symptom_list
+
+        # step 2: 获取所有症状
+        symptom_set = set()
+        for _, __symptom_list in sd_relation.items():
+            for __symptom in __symptom_list:
+                symptom_set.add(__symptom)
+        symptom_list = list(symptom_set)
+
+        # step 3: 症状概率
+        symptom_prob_dict = await KnowledgeLoader.symptomProb(symptom_list)
+
+        return symptom_prob_dict, sd_relation
+
+    # ======================= 无 I/O 操作 无异步 =======================
+    @classmethod
+    def max_ieg(cls, symptom_IEG: Dict[str, float]) -> Tuple[str, float]:
+        """字典值最大的键 & 值"""
+        k_max = max(symptom_IEG, key=symptom_IEG.get)
+        v_max = symptom_IEG[k_max]
+        return k_max, v_max
+
+    @classmethod
+    def _IEG(
+            cls,
+            disease_prob_dict: Dict[str, float],
+            symptom_prob_dict: Dict[str, float],
+            sd_relation: Dict[str, List[str]],
+    ) -> Dict[str, float | numpy.float16]:
+        """calculateIEG 的计算部分 (Step 1, 3 ~ 7), 无 I/O, 可在线程池执行"""
         # Step 1: H0
         disease_prob_list = list(disease_prob_dict.values())
         H0 = cls._H(disease_prob_list)
 
-        # Step 2: 获取 Disease & Symptom 的信息
-        _, symptom_prob_dict, sd_relation = await cls.SDInfo(disease_prob_dict, known_symptom_dict)
-
         # Step 3: 获取 Symptom-Disease Matrix
         disease_name_list = list(disease_prob_dict.keys())
         symptom_name_list = list(symptom_prob_dict.keys())
@@ -82,30 +216,18 @@ class EntropyCalculator:
         return symptom_IEG
 
     @classmethod
-    async def updateDiseaseProb(
+    def _posterior(
             cls,
             disease_prob_dict: Dict[str, float],
-            new_known_symptom_dict: Optional[Dict[str, bool | None]] = None,
-            known_symptom_dict: Optional[Dict[str, bool | None]] = None,
-    ):
-        """
-        更新疾病概率
-        :param disease_prob_dict: 当前疾病概率 (待更新) {'D1': 0.1, 'D2': 0.4, ...}
-        :param new_known_symptom_dict: 最新获取的症状信息 {'S6': True | False | None}
-        :param known_symptom_dict: 当前疾病概率 (待更新) {'S1': True, 'S2': False, 'S3': None}
-        :return: 最新的疾病概率 {'D1': 0.1, 'D2': 0.4, ...}
-        """
-        # flag = list(new_known_symptom_dict.values())[0]
-        # 最简单情况, 若为 None 则不更新
-        # if flag is None:
-        #     return disease_prob_dict
-
+            symptom_prob_dict: Dict[str, float],
+            sd_relation: Dict[str, List[str]],
+            new_known_symptom_dict: Optional[Dict[str, bool | None]],
+            known_symptom_dict: Optional[Dict[str, bool | None]],
+    ) -> Dict[str, float]:
+        """updateDiseaseProb 的计算部分 (Step 1, 3 ~ 7), 无 I/O, 可在线程池执行"""
         # Step 1: old 疾病概率
         disease_prob_list = list(disease_prob_dict.values())
 
-        # Step 2: 获取 Disease & Symptom 的信息
-        _, symptom_prob_dict, sd_relation = await cls.SDInfo(disease_prob_dict)
-
         # Step 3: 获取 Symptom-Disease Matrix
         disease_name_list = list(disease_prob_dict.keys())
         symptom_name_list = list(symptom_prob_dict.keys())
@@ -188,27 +310,17 @@ class EntropyCalculator:
         return cls._temperature_scaling(updated_disease_prob, temperature=5.0)
 
     @classmethod
-    async def updateDiseaseProbV2(
+    def _posteriorV2(
             cls,
             disease_prob_dict: Dict[str, float],
-            new_known_symptom_dict: Optional[Dict[str, bool | None]],
-            known_symptom_dict: Optional[Dict[str, bool | None]] = None,
-    ):
-        """
-        更新疾病概率
-        :param disease_prob_dict: 当前疾病概率 (待更新) {'D1': 0.1, 'D2': 0.4, ...}
-        :param new_known_symptom_dict: 最新获取的症状信息 {'S6': True | False | None}
-        :param known_symptom_dict: 当前疾病概率 (待更新) {'S1': True, 'S2': False, 'S3': None}
-        :return: 最新的疾病概率 {'D1': 0.1, 'D2': 0.4, ...}
-        """
-        if list(new_known_symptom_dict.values())[0] is None:
-            return disease_prob_dict
+            symptom_prob_dict: Dict[str, float],
+            sd_relation: Dict[str, List[str]],
+            new_known_symptom_dict: Dict[str, bool | None],
+    ) -> Dict[str, float]:
+        """updateDiseaseProbV2 的计算部分 (Step 1, 3 ~ 7), 无 I/O, 可在线程池执行"""
         # Step 1: old 疾病概率
         disease_prob_list = list(disease_prob_dict.values())
 
-        # Step 2: 获取 Disease & Symptom 的信息
-        _, symptom_prob_dict, sd_relation = await EntropyCalculator.SDInfo(disease_prob_dict, known_symptom_dict)
-
         # Step 3: 获取 Symptom-Disease Matrix
         disease_name_list = list(disease_prob_dict.keys())
         symptom_name_list = list(symptom_prob_dict.keys())
@@ -288,74 +400,7 @@ class EntropyCalculator:
         return EntropyCalculator._temperature_scaling(updated_disease_prob, temperature=5.0)
 
     @classmethod
-    async def SDInfo(
-            cls,
-            diseases: Union[List[str], Dict[str, float]],
-            known_symptom_dict: Optional[Dict[str, bool | None]] = None,
-    ) -> Tuple[Dict[str, float] | None, Dict[str, float], Dict[str, List[str]]]:
-        """
-        根据疾病信息合并全部症状, 返回 "疾病-症状" 信息 (未归一化)
-        :param diseases: 疾病信息 ['D1', 'D2', ...] 或者 {'D1': 0.1, 'D2': 0.4, ...}
-        :param known_symptom_dict: 已获取的症状 {'S1': True, 'S2': False, 'S3': None}
-        :return ({'D1': 0.1, 'D2': 0.4, ...}, {'S1': 0.43, 'S2': 0.01, ...}, {'D1': ['S1', ...], ...})
-        """
-        # part 1: 疾病概率
-        # diseases_prob_dict = await cls.getDiseaseProbDict(diseases)
-
-        # part 2: 疾病-症状关系表 & 症状概率
-        symptom_prob_dict, sd_relation = await cls.getSymptomProbDict_SDRelation(diseases, known_symptom_dict)
-
-        return None, symptom_prob_dict, sd_relation
-
-    @classmethod
-    async def getSymptomProbDict_SDRelation(
-            cls,
-            diseases: Union[List[str], Dict[str, float]],
-            known_symptom_dict: Optional[Dict[str, bool | None]] = None,
-    ) -> Tuple[Dict[str, float], Dict[str, List[str]]]:
-        """获取疾病对应的所有症状 & 症状概率字典"""
-        if known_symptom_dict is None:
-            known_symptom_dict = {}
-        known_symptom_list = list(known_symptom_dict.keys())
-
-        # step 1: 疾病-症状关系表
-        sd_relation = {}
-        disease_name_list = list(diseases.keys()) if isinstance(diseases, dict) else diseases
-        symptom_of_one_disease_dict = await MedicalKnowledge.filter(name__in=disease_name_list).values("name", "symptom")
-        # [{'name': 'xxx', 'symptom': []}, {'name': 'xxx', 'symptom': []}, ...]
-        for item in symptom_of_one_disease_dict:
-            _disease_name = item.get("name")
-            _symptom_list = item.get("symptom")
-            _symptom_list = [_symptom for _symptom in _symptom_list if _symptom not in known_symptom_list]
-            sd_relation[_disease_name] = _symptom_list
-
-        # step 2: 获取所有症状
-        symptom_set = set()
-        for _, __symptom_list in sd_relation.items():
-            for __symptom in __symptom_list:
-                symptom_set.add(__symptom)
-        symptom_list = list(symptom_set)
-
-        # step 3: 症状概率
-        symptom_prob_dict_list = await SymptomProb.filter(symptom__in=symptom_list).values("symptom", "probability")
-        # [{'symptom': 'xxx', 'probability': 0.3}, {'symptom': 'xxx', 'probability': 0.3}, ...]
-        symptom_prob_dict = {}
-        for item in symptom_prob_dict_list:
-            _symptom_name = item.get("symptom")
-            _symptom_prob = item.get("probability")
-            symptom_prob_dict[_symptom_name] = _symptom_prob
-
-        return symptom_prob_dict, sd_relation
-
-    # ======================= 无 I/O 操作 无异步 =======================
-    @classmethod
-    def max_ieg(cls, symptom_IEG: Dict[str, float]) -> Tuple[str, float]:
-        """字典值最大的键 & 值"""
-        k_max = max(symptom_IEG, key=symptom_IEG.get)
-        v_max = symptom_IEG[k_max]
-        return k_max, v_max
-
-    @classmethod
+    @traced("sd_matrix")
     def SDMatrix(
             cls,
             disease_name_list: List[str],
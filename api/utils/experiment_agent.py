@@ -0,0 +1,71 @@
+from typing import Dict, List, Optional
+
+from models import ExperimentData
+from .ai_integration import AIGenerator
+
+
+class VirtualPatient:
+    """
+    虚拟患者: 依据 ExperimentData 的真实症状回答系统提问的症状
+    症状名与真实症状完全一致时直接回答; 否则由 EXPERIMENT01 判断, 一次请求同时回答 prefetch 中的症状并缓存
+    """
+
+    def __init__(self, data: ExperimentData, limiter=None):
+        """
+        :param data: 测试病例
+        :param limiter: 限速器 (需提供 async acquire()), None 不限速
+        """
+        self.data = data
+        self.limiter = limiter
+        self.real = {k: self.toBool(v) for k, v in (data.symptom or {}).items()}  # {'S1': True | False | None}
+        self.answers: Dict[str, Optional[bool]] = {}  # 已回答的症状
+        self.llm_calls = 0
+
+    @property
+    def desc(self) -> str:
+        """患者主诉"""
+        return self.data.self_report or self.data.description
+
+    # ================== I/O, need async ==================
+    async def answer(self, symptom_name: str, prefetch: Optional[List[str]] = None) -> Optional[bool]:
+        """
+        回答症状是否发生
+        :param symptom_name: 被提问的症状
+        :param prefetch: 接下来可能被提问的症状, 与本次合并为一次 LLM 请求
+        :return: True | False | None (不清楚)
+        """
+        if symptom_name in self.answers:
+            return self.answers[symptom_name]
+        if symptom_name in self.real:
+            self.answers[symptom_name] = self.real[symptom_name]
+            return self.answers[symptom_name]
+        if not self.real:  # 无真实症状可参照
+            self.answers[symptom_name] = None
+            return None
+
+        required = [symptom_name] + [s for s in (prefetch or []) if s != symptom_name and s not in self.answers and s not in self.real]
+        if self.limiter is not None:
+            await self.limiter.acquire()
+        self.llm_calls += 1
+        result = await AIGenerator.experiment01ExtractSymptom(self.desc, self.data.symptom, required)
+        for s in required:
+            self.answers[s] = self.toBool(result.get(s))
+        return self.answers[symptom_name]
+
+    # ================== not I/O, not need async ==================
+    @classmethod
+    def toBool(cls, value) -> Optional[bool]:
+        """True / "是" -> True, False / "否" -> False, 其他 -> None"""
+        if value is True or value == "是":
+            return True
+        if value is False or value == "否":
+            return False
+        return None
+
+    @classmethod
+    def toText(cls, value: Optional[bool]) -> str:
+        if value is True:
+            return "是"
+        if value is False:
+            return "否"
+        return "尚不清楚"
@@ -0,0 +1,253 @@
+import asyncio
+import json
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+
+from models import ExperimentData, ExperimentPIM, ExperimentOnlyAI
+from settings import EXPERIMENT_CONCURRENCY, EXPERIMENT_RATE, EXPERIMENT_FLUSH_SIZE, EXPERIMENT_PREFETCH, \
+    EXPERIMENT_ROUND_MAX, EXPERIMENT_ROUND_MIN, EXPERIMENT_CHECKPOINT_DIR
+from middlewares.logger_middleware import logger
+from .ai_integration import AIGenerator
+from .entropy_calculator import EntropyCalculator
+from .experiment_agent import VirtualPatient
+from .knowledge_loader import KnowledgeLoader
+from .knowledge_store import KnowledgeStore
+from .pim_service import PIMService
+
+
+class _RateLimiter:
+    """令牌桶: 平均每秒 rate 个, 允许 rate 个突发"""
+
+    def __init__(self, rate: float):
+        self.rate = rate
+        self.tokens = rate
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class ExperimentService:
+    """
+    离线模拟问诊评测: 对 ExperimentData 中的病例运行 (并发受限 + LLM 限速)
+    - "pim": 虚拟患者走真实的 IEG 选症状 / 贝叶斯更新流程, 结果写入 ExperimentPIM
+    - "ai": 只由 LLM 根据真实症状排序疾病, 结果写入 ExperimentOnlyAI
+    每例完成后追加写入检查点文件, 结果批量写入; 已写入的病例重跑时跳过
+    """
+    MODELS = {
+        "pim": ExperimentPIM,
+        "ai": ExperimentOnlyAI,
+    }
+
+    # ================== I/O, need async ==================
+    @classmethod
+    async def run(
+            cls,
+            mode: str = "pim",
+            concurrency: int = EXPERIMENT_CONCURRENCY,
+            rate: float = EXPERIMENT_RATE,
+            flush_size: int = EXPERIMENT_FLUSH_SIZE,
+            limit: Optional[int] = None,
+            uids: Optional[List[str]] = None,
+    ) -> Dict:
+        """
+        运行尚未完成的病例
+        :param mode: "pim" | "ai"
+        :param concurrency: 同时进行的病例数
+        :param rate: 每秒最多 LLM 请求数, 0 不限制
+        :param flush_size: 批量写入条数
+        :param limit: 最多运行的病例数
+        :param uids: 只运行指定病例
+        :return: {'recovered': 3, 'done': 120, 'failed': 2, 'skipped': 4880, 'llm_calls': 700, 'seconds': 600.0}
+        """
+        model = cls.MODELS[mode]
+        checkpoint = os.path.join(EXPERIMENT_CHECKPOINT_DIR, f"{mode}.jsonl")
+        recovered = await cls._recover(model, checkpoint)
+
+        finished = set(await model.all().values_list("uid", flat=True))
+        query = ExperimentData.all().order_by("id")
+        if uids:
+            query = query.filter(uid__in=uids)
+        selected = await query
+        cases = [data for data in selected if data.uid not in finished]
+        skipped = len(selected) - len(cases)
+        if limit is not None:
+            cases = cases[:limit]
+
+        await KnowledgeStore.warmup()
+        limiter = _RateLimiter(rate) if rate else None
+        queue: asyncio.Queue = asyncio.Queue()
+        for data in cases:
+            queue.put_nowait(data)
+
+        stats = {"recovered": recovered, "done": 0, "failed": 0, "skipped": skipped, "llm_calls": 0}
+        buffer: List[Dict] = []
+        start = time.perf_counter()
+        os.makedirs(EXPERIMENT_CHECKPOINT_DIR, exist_ok=True)
+
+        with open(checkpoint, "a", encoding="utf-8") as f:
+            async def worker():
+                while True:
+                    try:
+                        data = queue.get_nowait()
+                    except asyncio.QueueEmpty:
+                        return
+                    token = KnowledgeLoader.begin()  # 每例独立的知识查询缓存
+                    try:
+                        row, llm_calls = await (cls.consult(data, limiter) if mode == "pim" else cls.aiOnly(data, limiter))
+                    except Exception as e:
+                        stats["failed"] += 1
+                        logger.error(f"[experiment] {mode} {data.uid} failed: {e!r}")
+                        continue
+                    finally:
+                        KnowledgeLoader.end(token)
+
+                    line = json.dumps(row, ensure_ascii=False)
+                    f.write(line + "\n")
+                    f.flush()
+                    buffer.append(json.loads(line))  # 与检查点一致, 同时把 numpy 标量转为 float
+                    stats["done"] += 1
+                    stats["llm_calls"] += llm_calls
+                    if len(buffer) >= flush_size:
+                        rows = buffer[:]
+                        buffer.clear()
+                        await cls._insert(model, rows)
+                    if stats["done"] % 50 == 0:
+                        elapsed = time.perf_counter() - start
+                        eta = elapsed / stats["done"] * (len(cases) - stats["done"] - stats["failed"])
+                        logger.info(f"[experiment] {mode} {stats['done']}/{len(cases)} "
+                                    f"elapsed={elapsed:.0f}s eta={eta:.0f}s llm_calls={stats['llm_calls']}")
+
+            await asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
+            if buffer:
+                await cls._insert(model, buffer)
+
+        if stats["failed"] == 0:
+            os.remove(checkpoint)  # 全部已入库; 有失败时保留, 下次运行先补写
+        stats["seconds"] = round(time.perf_counter() - start, 1)
+        return stats
+
+    @classmethod
+    async def consult(cls, data: ExperimentData, limiter: Optional[_RateLimiter] = None) -> Tuple[Dict, int]:
+        """
+        模拟一次问诊 (与 api/chat.py 的 sendChat 相同的选症状 / 更新 / 结束条件, 不生成自然语言问题)
+        :param data: 测试病例
+        :param limiter: LLM 限速器
+        :return: (ExperimentPIM 字段字典, LLM 请求次数)
+        """
+        patient = VirtualPatient(data, limiter)
+        row = {"uid": data.uid, "diagnosis": data.diagnosis, "self_report": patient.desc}
+
+        """PIM01 预测疾病列表 -> 精确搜索"""
+        if limiter is not None:
+            await limiter.acquire()
+        disease_name_list = await AIGenerator.pim01GeneratePrediction(patient.desc)
+        disease_prob_dict = await PIMService.precise_search(disease_name_list or [])
+        if not disease_prob_dict:
+            return {**row, "diseases": [], "diseases_with_ai": []}, 1
+
+        symptom_dict = {}  # {'S1': True, ...}
+        diseases = [disease_prob_dict]
+        symptom_IEG = await EntropyCalculator.calculateIEG(disease_prob_dict)
+        ieg = [symptom_IEG]
+        delta_ieg = []
+        dialogue = []
+
+        for round_ in range(1, EXPERIMENT_ROUND_MAX + 1):
+            if not symptom_IEG:
+                break
+            symptom_name, _ = EntropyCalculator.max_ieg(symptom_IEG)
+            prefetch = sorted(symptom_IEG, key=symptom_IEG.get, reverse=True)[:EXPERIMENT_PREFETCH]
+            symptom_TFN = await patient.answer(symptom_name, prefetch)
+            dialogue += [{"doctor": symptom_name}, {"patient": patient.toText(symptom_TFN)}]
+
+            disease_prob_dict = await EntropyCalculator.updateDiseaseProbV2(disease_prob_dict, {symptom_name: symptom_TFN}, symptom_dict)
+            symptom_dict[symptom_name] = symptom_TFN
+            diseases.append(disease_prob_dict)
+
+            symptom_IEG = await EntropyCalculator.calculateIEG(disease_prob_dict, symptom_dict)
+            ieg.append(symptom_IEG)
+            if symptom_IEG and ieg[-2]:
+                _, v1 = EntropyCalculator.max_ieg(ieg[-2])
+                _, v2 = EntropyCalculator.max_ieg(ieg[-1])
+                delta_ieg.append(abs((v1 - v2) / v1) if v1 else 0.0)
+
+            """结束条件"""
+            if len(symptom_dict) >= len(ieg[0]):  # 症状询问完毕
+                break
+            if round_ >= EXPERIMENT_ROUND_MIN and PIMService.isConvergence(delta_ieg):
+                break
+
+        """EXPERIMENT02 结合主诉与症状选出最可能疾病"""
+        llm_calls = 1 + patient.llm_calls
+        diseases_with_ai = disease_prob_dict
+        if symptom_dict:
+            if limiter is not None:
+                await limiter.acquire()
+            diseases_with_ai = await AIGenerator.experiment02SelectDisease(patient.desc, symptom_dict, disease_prob_dict)
+            llm_calls += 1
+
+        return {
+            **row,
+            "dialogue": dialogue,
+            "diseases": diseases,
+            "symptoms": symptom_dict,
+            "ieg": ieg,
+            "symptom_opt": EntropyCalculator.max_ieg(symptom_IEG)[0] if symptom_IEG else "",  # 下一个待问症状
+            "delta_ieg": delta_ieg,
+            "diseases_with_ai": sorted(diseases_with_ai, key=diseases_with_ai.get, reverse=True),
+        }, llm_calls
+
+    @classmethod
+    async def aiOnly(cls, data: ExperimentData, limiter: Optional[_RateLimiter] = None) -> Tuple[Dict, int]:
+        """
+        只用 LLM: 候选疾病 (PIM01 + 精确搜索, 与 consult 相同) 按真实症状排序
+        :return: (ExperimentOnlyAI 字段字典, LLM 请求次数)
+        """
+        desc = data.self_report or data.description
+        row = {"uid": data.uid, "diagnosis": data.diagnosis, "self_report": desc, "symptoms": data.symptom}
+        if limiter is not None:
+            await limiter.acquire()
+        disease_name_list = await AIGenerator.pim01GeneratePrediction(desc)
+        disease_name_list = list((await PIMService.precise_search(disease_name_list or [])).keys())
+        if not disease_name_list or not data.symptom:
+            return {**row, "diseases_pred": disease_name_list}, 1
+
+        if limiter is not None:
+            await limiter.acquire()
+        diseases_pred = await AIGenerator.experiment03PredictDiseaseOnly(data.symptom, disease_name_list)
+        return {**row, "diseases_pred": diseases_pred}, 2
+
+    @classmethod
+    async def _insert(cls, model, rows: List[Dict]) -> None:
+        await model.bulk_create([model(**row) for row in rows], ignore_conflicts=True)
+
+    @classmethod
+    async def _recover(cls, model, checkpoint: str) -> int:
+        """把上次运行已完成但未入库的病例 (检查点文件中) 补写入库"""
+        if not os.path.exists(checkpoint):
+            return 0
+        rows = {}
+        with open(checkpoint, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    row = json.loads(line)
+                except json.JSONDecodeError:  # 崩溃时写了一半的最后一行
+                    continue
+                rows[row["uid"]] = row
+        finished = set(await model.filter(uid__in=list(rows)).values_list("uid", flat=True))
+        missing = [row for uid, row in rows.items() if uid not in finished]
+        for i in range(0, len(missing), EXPERIMENT_FLUSH_SIZE):
+            await cls._insert(model, missing[i:i + EXPERIMENT_FLUSH_SIZE])
+        os.remove(checkpoint)
+        return len(missing)
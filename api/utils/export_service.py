@@ -0,0 +1,165 @@
+import asyncio
+import csv
+import io
+import json
+import os
+import tempfile
+import zlib
+from datetime import datetime
+from typing import AsyncIterator, Dict, List
+
+from openpyxl import Workbook
+from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
+
+from models import PIM, PSG, CDG, EVAL
+
+EXPORT_CHUNK_SIZE = 500  # 每次从数据库读取的行数
+XLSX_CELL_MAX = 32767  # Excel 单元格最大字符数
+
+
+class ExportService:
+    """按 id keyset 分页流式导出问诊数据, 内存占用与表大小无关"""
+    TABLES = {
+        "pim": PIM,
+        "psg": PSG,
+        "cdg": CDG,
+        "eval": EVAL,
+    }
+    FORMATS = {
+        "ndjson": ("application/x-ndjson", "ndjson"),
+        "csv": ("text/csv; charset=utf-8", "csv"),
+        "xlsx": ("application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", "xlsx"),
+    }
+
+    # ================== I/O, need async ==================
+    @classmethod
+    async def iterRows(cls, table: str, chunk_size: int = EXPORT_CHUNK_SIZE) -> AsyncIterator[List[Dict]]:
+        """
+        keyset 分页读取整表
+        :param table: 表名 "pim" | "psg" | "cdg" | "eval"
+        :param chunk_size: 每页行数
+        :return: 异步迭代 [{'id': 1, ...}, ...]
+        """
+        model = cls.TABLES[table]
+        last_id = 0
+        while True:
+            rows = await model.filter(id__gt=last_id).order_by("id").limit(chunk_size).values()
+            if not rows:
+                return
+            yield rows
+            last_id = rows[-1]["id"]
+
+    @classmethod
+    async def stream(cls, table: str, fmt: str = "ndjson", gzip: bool = False,
+                     chunk_size: int = EXPORT_CHUNK_SIZE) -> AsyncIterator[bytes]:
+        """
+        流式导出
+        :param table: 表名 "pim" | "psg" | "cdg" | "eval"
+        :param fmt: 格式 "ndjson" | "csv" | "xlsx"
+        :param gzip: 是否 gzip 压缩
+        :param chunk_size: 每页行数
+        :return: 异步迭代 bytes
+        """
+        if table not in cls.TABLES:
+            raise ValueError(f"未知表: {table}")
+        if fmt not in cls.FORMATS:
+            raise ValueError(f"未知格式: {fmt}")
+
+        if fmt == "ndjson":
+            chunks = cls._ndjson(table, chunk_size)
+        elif fmt == "csv":
+            chunks = cls._csv(table, chunk_size)
+        else:
+            chunks = cls._xlsx(table, chunk_size)
+
+        if not gzip:
+            async for chunk in chunks:
+                yield chunk
+            return
+
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31: gzip 格式
+        async for chunk in chunks:
+            data = compressor.compress(chunk)
+            if data:
+                yield data
+        yield compressor.flush()
+
+    @classmethod
+    async def _ndjson(cls, table: str, chunk_size: int) -> AsyncIterator[bytes]:
+        async for rows in cls.iterRows(table, chunk_size):
+            lines = [json.dumps(row, ensure_ascii=False, default=cls._jsonDefault) for row in rows]
+            yield ("\n".join(lines) + "\n").encode("utf-8")
+
+    @classmethod
+    async def _csv(cls, table: str, chunk_size: int) -> AsyncIterator[bytes]:
+        header = None
+        yield "\ufeff".encode("utf-8")  # BOM, Excel 正确识别中文
+        async for rows in cls.iterRows(table, chunk_size):
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            if header is None:
+                header = list(rows[0].keys())
+                writer.writerow(header)
+            for row in rows:
+                writer.writerow([cls._cell(row[k]) for k in header])
+            yield buffer.getvalue().encode("utf-8")
+
+    @classmethod
+    async def _xlsx(cls, table: str, chunk_size: int) -> AsyncIterator[bytes]:
+        """openpyxl write-only 模式: 行写入临时文件, 保存后分块读出"""
+        wb = Workbook(write_only=True)
+        ws = wb.create_sheet(table)
+        header = None
+        async for rows in cls.iterRows(table, chunk_size):
+            if header is None:
+                header = list(rows[0].keys())
+                ws.append(header)
+            values = [[cls._xlsxCell(row[k]) for k in header] for row in rows]
+            await asyncio.to_thread(cls._appendRows, ws, values)
+
+        fd, path = tempfile.mkstemp(suffix=".xlsx")
+        os.close(fd)
+        try:
+            await asyncio.to_thread(wb.save, path)
+            with open(path, "rb") as f:
+                while True:
+                    data = await asyncio.to_thread(f.read, 64 * 1024)
+                    if not data:
+                        break
+                    yield data
+        finally:
+            os.remove(path)
+
+    # ================== not I/O, not need async ==================
+    @classmethod
+    def filename(cls, table: str, fmt: str, gzip: bool = False) -> str:
+        """导出文件名 pim_20250101.csv(.gz)"""
+        name = f"{table}_{datetime.now().strftime('%Y%m%d')}.{cls.FORMATS[fmt][1]}"
+        return name + ".gz" if gzip else name
+
+    @classmethod
+    def _appendRows(cls, ws, values: List[List]) -> None:
+        for value in values:
+            ws.append(value)
+
+    @classmethod
+    def _cell(cls, value):
+        """JSON 列转字符串, 时间转 ISO 格式"""
+        if isinstance(value, (dict, list)):
+            return json.dumps(value, ensure_ascii=False)
+        if isinstance(value, datetime):
+            return value.isoformat()
+        return value
+
+    @classmethod
+    def _xlsxCell(cls, value):
+        value = cls._cell(value)
+        if isinstance(value, str):
+            value = ILLEGAL_CHARACTERS_RE.sub("", value)[:XLSX_CELL_MAX]
+        return value
+
+    @classmethod
+    def _jsonDefault(cls, value):
+        if isinstance(value, datetime):
+            return value.isoformat()
+        return str(value)
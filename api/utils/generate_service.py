@@ -0,0 +1,133 @@
+from typing import Dict
+
+from models import PIM, PSG, CDG
+from tortoise.exceptions import DoesNotExist
+
+from .ai_integration import AIGenerator
+from .analytics_service import AnalyticsService
+from .entropy_calculator import EntropyCalculator
+from .knowledge_snippet import KnowledgeSnippet
+from .knowledge_store import KnowledgeStore
+from .pim_service import PIMService
+from .render_service import RenderService
+from .session_repository import SessionRepository
+
+
+class GenerateService:
+    """长耗时的 LLM 生成任务 (初步诊断 / 患者报告 / SOAP 病历), 供路由与后台任务共用"""
+
+    # ================== I/O, need async ==================
+    @classmethod
+    @SessionRepository.projected
+    async def initial(cls, uid: str) -> Dict[str, float]:
+        """
+        生成初步诊断, 写入 CDG.initial, 并创建/更新 PSG 记录
+        :param uid: 唯一标识符
+        :return: 最可能疾病字典 {'D1': 0.3, ...}
+        """
+        pim = await SessionRepository.project(uid, "initial")
+        if pim is None:
+            raise DoesNotExist(PIM)
+        await KnowledgeStore.use(pim["knowledge_version"])  # 与问诊使用同一版本知识
+
+        disease_prob_dict = pim["diseases"][-1]
+        symptoms = cls.symptomsText(pim["symptoms"])  # {'S': "是" | "否" | "未知"}
+
+        disease_and_reason = await AIGenerator.cdg01GenerateInitial(disease_prob_dict, pim["qa_messages"], symptoms, pim["addition"])
+        # {"disease": {"疾病1": 0.4, ...}, "reason": "诊断依据和推理过程"}
+
+        """CDG 01 Initial"""
+        disease_opt_dict = disease_and_reason.get("disease", {})
+        disease_opt, _ = EntropyCalculator.max_ieg(disease_opt_dict)
+        reason = disease_and_reason.get("reason", "")
+        try:
+            cdg = await CDG.get(uid=uid)
+        except DoesNotExist:
+            cdg = CDG(uid=uid, pim_id=pim["id"])
+        cdg.disease_opt = disease_opt
+        cdg.disease_opt_dict = disease_opt_dict
+        await RenderService.assign(cdg, "initial", reason)
+        await cdg.save()
+        await AnalyticsService.sessionFinished(uid, pim["created_at"], pim["qa_messages"], disease_opt)
+
+        """PSG Report ORM create"""
+        try:
+            psg = await PSG.get(uid=uid)
+            psg.disease_opt = disease_opt
+            await psg.save()
+        except DoesNotExist:
+            await PSG.create(uid=uid, pim_id=pim["id"], disease_opt=disease_opt)
+
+        return disease_opt_dict
+
+    @classmethod
+    @SessionRepository.projected
+    async def report(cls, uid: str) -> str:
+        """
+        生成患者报告并保存到 PSG.report
+        :param uid: 唯一标识符
+        :return: 患者报告 markdown "..."
+        """
+        pim = await SessionRepository.project(uid, "report")
+        if pim is None:
+            raise DoesNotExist(PIM)
+        psg = await PSG.get(uid=uid)
+        await KnowledgeStore.use(pim["knowledge_version"])
+
+        disease_name = psg.disease_opt
+        symptoms = cls.symptomsText(pim["symptoms"])
+        knowledge_addition = await KnowledgeSnippet.snippets([disease_name], "report")
+
+        report = await AIGenerator.psg01GenerateReport(disease_name, pim["qa_messages"], symptoms, pim["addition"], knowledge_addition)
+
+        # 保存生成的报告到数据库
+        await RenderService.assign(psg, "report", report)
+        await psg.save()
+        return report
+
+    @classmethod
+    @SessionRepository.projected
+    async def soap(cls, uid: str) -> str:
+        """
+        生成 SOAP 病历并保存到 CDG.soap
+        :param uid: 唯一标识符
+        :return: SOAP 病历 markdown "..."
+        """
+        pim = await SessionRepository.project(uid, "soap")
+        if pim is None:
+            raise DoesNotExist(PIM)
+        cdg = await CDG.get(uid=uid)
+        await KnowledgeStore.use(pim["knowledge_version"])
+
+        disease_prob_dict = pim["diseases"][-1]
+        # disease_prob_dict = PIMService.top_k_items(disease_prob_dict, 5)
+        disease_opt_dict = cdg.disease_opt_dict
+
+        symptoms_ = pim["symptoms"]  # {'S': Bool | None}
+        symptoms = cls.symptomsText(symptoms_)
+        disease_name_list = list(disease_opt_dict.keys())
+        knowledge_addition_list = await KnowledgeSnippet.snippets(disease_name_list, "soap")
+
+        table_str = await PIMService.tableStr(disease_name_list, symptoms_)
+
+        note = await AIGenerator.cdg02GenerateSOAP(disease_prob_dict, disease_opt_dict, cdg.initial, pim["qa_messages"], symptoms, pim["addition"],
+                                                   knowledge_addition_list, table_str)
+
+        # 数据库保存
+        await RenderService.assign(cdg, "soap", note)
+        await cdg.save()
+        return note
+
+    # ================== not I/O, not need async ==================
+    @classmethod
+    def symptomsText(cls, symptoms: Dict[str, bool | None]) -> Dict[str, str]:
+        """{'S': Bool | None} -> {'S': "是" | "否" | "未知"}"""
+        symptoms_text = {}
+        for k, v in symptoms.items():
+            if v is True:
+                symptoms_text[k] = "是"
+            elif v is False:
+                symptoms_text[k] = "否"
+            else:
+                symptoms_text[k] = "未知"
+        return symptoms_text
@@ -0,0 +1,65 @@
+import hashlib
+from typing import Dict, Optional
+
+from fastapi import Request
+from fastapi.responses import JSONResponse, Response
+
+CACHE_CONTROL = "private, no-cache"  # 浏览器可缓存, 但每次用 If-None-Match 校验
+CACHE_CONTROL_NO_STORE = "no-store"  # 生成中等临时状态不缓存
+ETAG_ENCODINGS = ("gzip", "br")  # 压缩响应的 ETag 后缀 (见 middlewares/compress_middleware.py)
+
+
+class HTTPCache:
+    """强 ETag + If-None-Match 条件请求"""
+
+    @classmethod
+    def etag(cls, *parts: str) -> str:
+        """由内容哈希 / 行版本生成强 ETag"""
+        digest = hashlib.sha256("|".join(parts).encode("utf-8")).hexdigest()[:32]
+        return f'"{digest}"'
+
+    @classmethod
+    def notModified(cls, request: Request, etag: str) -> bool:
+        """If-None-Match 是否命中 etag"""
+        if_none_match = request.headers.get("if-none-match")
+        if not if_none_match:
+            return False
+        if if_none_match.strip() == "*":
+            return True
+        candidates = [cls.identity(tag.strip()) for tag in if_none_match.split(",")]
+        return etag in candidates
+
+    @classmethod
+    def identity(cls, etag: str) -> str:
+        """去掉压缩中间件追加的编码后缀: '"abc-gzip"' -> '"abc"'"""
+        for encoding in ETAG_ENCODINGS:
+            suffix = f'-{encoding}"'
+            if etag.endswith(suffix):
+                return etag[:-len(suffix)] + '"'
+        return etag
+
+    @classmethod
+    def notModifiedResponse(cls, etag: str) -> Response:
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": CACHE_CONTROL})
+
+    @classmethod
+    def jsonResponse(cls, request: Request, content: Dict, etag: Optional[str] = None) -> Response:
+        """
+        带 ETag 的 JSON 响应, etag 为 None 时按响应体计算
+        :param request: 请求对象
+        :param content: JSON 内容
+        :param etag: 强 ETag
+        :return: 200 JSONResponse 或 304
+        """
+        response = JSONResponse(content)
+        if etag is None:
+            etag = cls.etag(hashlib.sha256(response.body).hexdigest())
+        if cls.notModified(request, etag):
+            return cls.notModifiedResponse(etag)
+        response.headers["ETag"] = etag
+        response.headers["Cache-Control"] = CACHE_CONTROL
+        return response
+
+    @classmethod
+    def noStore(cls, content: Dict) -> Response:
+        return JSONResponse(content, headers={"Cache-Control": CACHE_CONTROL_NO_STORE})
@@ -0,0 +1,180 @@
+import asyncio
+from datetime import timedelta
+from typing import Dict, List, Optional
+
+from tortoise import timezone
+from tortoise.exceptions import IntegrityError
+from tortoise.expressions import F, Q
+
+from models import Job
+from middlewares.logger_middleware import logger
+from .generate_service import GenerateService
+from .knowledge_loader import KnowledgeLoader
+from .knowledge_store import KnowledgeStore
+
+PENDING = "pending"
+RUNNING = "running"
+SUCCESS = "success"
+FAILED = "failed"
+
+POLL_INTERVAL = 1.0  # worker 空闲时轮询间隔 (秒)
+STALE_SECONDS = 300  # running 超过该时间未刷新 locked_at 视为 worker 崩溃, 可被重新领取
+HEARTBEAT_SECONDS = 60  # 执行期间刷新 locked_at 的间隔, 须远小于 STALE_SECONDS
+RETRY_BACKOFF = 5  # 重试退避基数 (秒), 第 n 次失败后等待 n * RETRY_BACKOFF
+
+
+class JobService:
+    """数据库队列: 入队 / 领取 / 执行 / 重试, 可在 FastAPI 进程内运行, 也可 `python -m worker` 独立运行"""
+    HANDLERS = {
+        "initial": GenerateService.initial,
+        "report": GenerateService.report,
+        "soap": GenerateService.soap,
+    }
+    FOLLOW_UPS = {
+        "initial": ["report", "soap"],  # 初步诊断完成后并行生成患者报告和 SOAP 病历
+    }
+
+    _wakeup: Optional[asyncio.Event] = None  # 进程内唤醒 worker
+    _workers: List[asyncio.Task] = []
+
+    # ================== I/O, need async ==================
+    @classmethod
+    async def enqueue(cls, uid: str, kind: str, force: bool = False) -> Job:
+        """
+        入队, 同一 uid 同一类型的任务去重
+        :param uid: 唯一标识符
+        :param kind: 任务类型 "initial" | "report" | "soap"
+        :param force: 已完成的任务是否重新执行 (重新生成)
+        :return: Job
+        """
+        if kind not in cls.HANDLERS:
+            raise ValueError(f"未知任务类型: {kind}")
+        try:
+            job, created = await Job.get_or_create(uid=uid, kind=kind)
+        except IntegrityError:  # 并发入队, 已由其他请求创建
+            job, created = await Job.get(uid=uid, kind=kind), False
+
+        if not created:
+            # 状态条件放在 UPDATE 中: 与其他入队 / worker 领取并发时, 已被领取 (running) 的任务不会被重置
+            resettable = [SUCCESS, FAILED] if force else [FAILED]
+            n = await Job.filter(id=job.id, status__in=resettable).update(
+                status=PENDING, attempts=0, error="", run_at=timezone.now(), locked_at=None)
+            if n:
+                await job.refresh_from_db()
+
+        cls._notify()
+        return job
+
+    @classmethod
+    async def state(cls, uid: str, kind: str) -> Optional[Job]:
+        """任务状态, 不存在返回 None"""
+        return await Job.get_or_none(uid=uid, kind=kind)
+
+    @classmethod
+    async def isPending(cls, uid: str, kinds: List[str]) -> bool:
+        """kinds 中是否有尚未完成 (pending / running) 的任务"""
+        return await Job.filter(uid=uid, kind__in=kinds, status__in=[PENDING, RUNNING]).exists()
+
+    @classmethod
+    async def claim(cls) -> Optional[Job]:
+        """领取一个可执行任务 (乐观锁, 多 worker / 多进程安全)"""
+        now = timezone.now()
+        claimable = Q(status=PENDING, run_at__lte=now) | Q(status=RUNNING, locked_at__lt=now - timedelta(seconds=STALE_SECONDS))
+        job_ids = await Job.filter(claimable).order_by("run_at").limit(10).values_list("id", flat=True)
+        for job_id in job_ids:
+            n = await Job.filter(claimable, id=job_id).update(status=RUNNING, locked_at=now, attempts=F("attempts") + 1)
+            if n == 1:
+                return await Job.get(id=job_id)
+        return None
+
+    @classmethod
+    async def run(cls, job: Job) -> None:
+        """执行任务, 失败则按退避重试, 成功后触发后续任务"""
+        token = KnowledgeLoader.begin()  # 每个任务独立的知识查询缓存
+        pin = KnowledgeStore.begin()  # 任务固定的知识库版本不延续到同一 worker 的后续任务
+        heartbeat = asyncio.create_task(cls._heartbeat(job.id))  # LLM 生成可能超过 STALE_SECONDS
+        try:
+            await cls.HANDLERS[job.kind](job.uid)
+        except Exception as e:
+            if job.attempts < job.max_attempts:
+                run_at = timezone.now() + timedelta(seconds=RETRY_BACKOFF * job.attempts)
+                await Job.filter(id=job.id).update(status=PENDING, error=repr(e), run_at=run_at, locked_at=None)
+            else:
+                await Job.filter(id=job.id).update(status=FAILED, error=repr(e), locked_at=None)
+            logger.error(f"[job] {job.kind}/{job.uid} attempt {job.attempts}: {repr(e)}")
+            return
+        finally:
+            heartbeat.cancel()
+            KnowledgeStore.end(pin)
+            KnowledgeLoader.end(token)
+
+        await Job.filter(id=job.id).update(status=SUCCESS, error="", locked_at=None)
+        for kind in cls.FOLLOW_UPS.get(job.kind, []):
+            await cls.enqueue(job.uid, kind, force=True)
+
+    @classmethod
+    async def _heartbeat(cls, job_id: int) -> None:
+        """执行期间定期刷新 locked_at, 避免仍在执行的任务被当作 worker 崩溃而被重复领取"""
+        while True:
+            await asyncio.sleep(HEARTBEAT_SECONDS)
+            try:
+                await Job.filter(id=job_id, status=RUNNING).update(locked_at=timezone.now())
+            except Exception as e:
+                logger.error(f"[job] heartbeat {job_id}: {repr(e)}")
+
+    @classmethod
+    async def work(cls, stop: asyncio.Event, poll_interval: float = POLL_INTERVAL) -> None:
+        """worker 主循环: 领取并执行任务, 直到 stop 被设置"""
+        while not stop.is_set():
+            try:
+                job = await cls.claim()
+            except Exception as e:
+                logger.error(f"[job] claim: {repr(e)}")
+                job = None
+            if job is not None:
+                await cls.run(job)
+                continue
+            # 空闲: 等待进程内唤醒或轮询超时
+            wakeup = cls._wakeupEvent()
+            try:
+                await asyncio.wait_for(wakeup.wait(), timeout=poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            wakeup.clear()
+
+    @classmethod
+    def start(cls, concurrency: int = 2) -> asyncio.Event:
+        """在当前事件循环中启动 concurrency 个 worker (FastAPI startup 时调用), 返回 stop 事件"""
+        stop = asyncio.Event()
+        cls._workers = [asyncio.create_task(cls.work(stop)) for _ in range(concurrency)]
+        return stop
+
+    @classmethod
+    async def stop(cls, stop: asyncio.Event) -> None:
+        """停止进程内 worker (FastAPI shutdown 时调用)"""
+        stop.set()
+        cls._notify()
+        await asyncio.gather(*cls._workers, return_exceptions=True)
+        cls._workers = []
+
+    # ================== not I/O, not need async ==================
+    @classmethod
+    def _wakeupEvent(cls) -> asyncio.Event:
+        if cls._wakeup is None:
+            cls._wakeup = asyncio.Event()
+        return cls._wakeup
+
+    @classmethod
+    def _notify(cls) -> None:
+        """唤醒同进程内空闲的 worker (其他进程靠轮询)"""
+        if cls._wakeup is not None:
+            cls._wakeup.set()
+
+    @classmethod
+    def toDict(cls, job: Job) -> Dict:
+        return {
+            "kind": job.kind,
+            "state": job.status,
+            "attempts": job.attempts,
+            "error": job.error,
+        }
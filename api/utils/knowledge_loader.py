@@ -0,0 +1,149 @@
+import asyncio
+import contextvars
+from typing import Any, Dict, Hashable, Iterable, List, Optional
+
+from models import DiseaseProb, SymptomProb, MedicalKnowledge
+from .knowledge_store import KnowledgeStore
+
+MISSING = object()  # 已查询但不存在
+
+
+class LoaderScope:
+    """一次请求 (或一个后台任务) 的查询缓存与待合并的查询"""
+
+    def __init__(self):
+        self.cache: Dict[str, Dict[Hashable, Any]] = {table: {} for table in KnowledgeLoader.TABLES}
+        self.pending: Dict[str, Dict[Hashable, asyncio.Future]] = {table: {} for table in KnowledgeLoader.TABLES}
+        self.tasks = set()  # 进行中的合并查询 (保持引用)
+        self.queries = 0  # 实际执行的查询次数
+
+
+class KnowledgeLoader:
+    """
+    DataLoader: 同一轮事件循环内对同一张表的查询合并为一次 IN 查询, 结果在请求内缓存
+    已加载编译知识库 (KnowledgeStore) 时, 概率与疾病-症状关系直接从知识库读取, 不查询数据库
+    """
+    # {table: (model, 键字段, 值字段 | None 为整行)}
+    TABLES = {
+        "knowledge": (MedicalKnowledge, "name", None),
+        "disease_prob": (DiseaseProb, "disease", "probability"),
+        "symptom_prob": (SymptomProb, "symptom", "probability"),
+    }
+
+    _scope: contextvars.ContextVar[Optional[LoaderScope]] = contextvars.ContextVar("knowledge_loader", default=None)
+
+    # ================== I/O, need async ==================
+    @classmethod
+    async def knowledge(cls, disease_name_list: List[str]) -> List[Dict]:
+        """MedicalKnowledge 整行, 按 disease_name_list 顺序, 跳过不存在的疾病"""
+        rows = await cls.load("knowledge", disease_name_list)
+        return [rows[d] for d in dict.fromkeys(disease_name_list) if d in rows]
+
+    @classmethod
+    async def diseaseProb(cls, disease_name_list: List[str]) -> Dict[str, float]:
+        """{疾病: DiseaseProb 概率}, 跳过不存在的疾病"""
+        kb = KnowledgeStore.current()
+        if kb is not None:
+            return dict(kb.diseaseProb(disease_name_list))
+        return await cls.load("disease_prob", disease_name_list)
+
+    @classmethod
+    async def symptomProb(cls, symptom_list: Iterable[str]) -> Dict[str, float]:
+        """{症状: SymptomProb 概率}, 跳过不存在的症状"""
+        kb = KnowledgeStore.current()
+        if kb is not None:
+            result = {}
+            for s in symptom_list:
+                p = kb.symptomProb(s)
+                if p is not None:
+                    result[s] = p
+            return result
+        return await cls.load("symptom_prob", list(symptom_list))
+
+    @classmethod
+    async def symptomsOf(cls, disease_name_list: List[str]) -> Dict[str, List[str]]:
+        """{疾病: MedicalKnowledge.symptom}, 跳过无知识库记录的疾病"""
+        kb = KnowledgeStore.current()
+        if kb is not None:
+            result = {}
+            for d in disease_name_list:
+                symptoms = kb.symptomsOf(d)
+                if symptoms is not None:
+                    result[d] = symptoms
+            return result
+        rows = await cls.load("knowledge", disease_name_list)
+        return {d: row["symptom"] or [] for d, row in rows.items()}
+
+    @classmethod
+    async def load(cls, table: str, keys: List[Hashable]) -> Dict[Hashable, Any]:
+        """
+        批量读取, 与同一轮事件循环中其他调用合并为一次查询
+        :param table: "knowledge" | "disease_prob" | "symptom_prob"
+        :param keys: 键列表
+        :return: {键: 值}, 不存在的键不返回
+        """
+        scope = cls._scope.get() or LoaderScope()  # 无请求作用域时仅在本次调用内合并
+        cache = scope.cache[table]
+        pending = scope.pending[table]
+        loop = asyncio.get_running_loop()
+
+        futures = []
+        for key in dict.fromkeys(keys):
+            if key in cache:
+                continue
+            future = pending.get(key)
+            if future is None:
+                if not pending:  # 本轮第一个键: 下一轮执行查询
+                    task = loop.create_task(cls._dispatch(scope, table))
+                    scope.tasks.add(task)
+                    task.add_done_callback(scope.tasks.discard)
+                future = pending[key] = loop.create_future()
+            futures.append(future)
+        if futures:
+            await asyncio.gather(*futures)
+
+        result = {}
+        for key in keys:
+            value = cache.get(key, MISSING)
+            if value is not MISSING:
+                result[key] = value
+        return result
+
+    @classmethod
+    async def _dispatch(cls, scope: LoaderScope, table: str) -> None:
+        batch = scope.pending[table]
+        scope.pending[table] = {}  # 查询期间的新键进入下一批
+        model, key_field, value_field = cls.TABLES[table]
+        keys = list(batch.keys())
+        try:
+            scope.queries += 1
+            # 重名记录以最后一条为准
+            if value_field is None:
+                rows = await model.filter(**{f"{key_field}__in": keys}).order_by("id").values()
+                found = {row[key_field]: row for row in rows}
+            else:
+                rows = await model.filter(**{f"{key_field}__in": keys}).order_by("id").values_list(key_field, value_field)
+                found = dict(rows)
+        except Exception as e:
+            for future in batch.values():
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        cache = scope.cache[table]
+        for key, future in batch.items():
+            cache[key] = found.get(key, MISSING)
+            if not future.done():
+                future.set_result(None)
+
+    # ================== not I/O, not need async ==================
+    @classmethod
+    def begin(cls) -> contextvars.Token:
+        """开始新的请求作用域, 返回 token 供 end 恢复"""
+        return cls._scope.set(LoaderScope())
+
+    @classmethod
+    def end(cls, token: contextvars.Token) -> Optional[LoaderScope]:
+        scope = cls._scope.get()
+        cls._scope.reset(token)
+        return scope
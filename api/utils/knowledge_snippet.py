@@ -0,0 +1,100 @@
+from collections import OrderedDict
+from typing import Dict, List, Tuple
+
+from settings import SNIPPET_FIELDS, SNIPPET_MAX_CHARS, SNIPPET_MAX_ITEMS
+from .knowledge_loader import KnowledgeLoader
+from .knowledge_store import KnowledgeStore
+
+SNIPPET_CACHE_SIZE = 2048  # 进程内 LRU 缓存条数
+
+# MedicalKnowledge 字段 -> 提示词中的名称
+FIELD_LABELS = {
+    "category": "所属科室",
+    "cure_department": "治疗科室",
+    "symptom": "病征",
+    "accompany": "并发症",
+    "check": "检测项目",
+    "cure_way": "治疗方法",
+    "common_drug": "常用药",
+    "recommend_drug": "推荐药物",
+    "prevent": "预防方式",
+    "do_eat": "推荐饮食",
+    "not_eat": "忌口",
+}
+
+
+class KnowledgeSnippet:
+    """
+    疾病知识 -> 提示词片段: 按用途投影字段, 列表截断, 整段受字符预算限制
+    以 (知识库版本, 用途, 疾病) 为键缓存, 切换版本后自然失效 (版本号包含片段列的哈希, 见 KnowledgeStore.build)
+    未加载编译知识库时不跨请求缓存, 知识表的修改立即生效
+    """
+    _cache: "OrderedDict[Tuple[str, str, str], str]" = OrderedDict()  # {(version, purpose, disease): snippet}
+
+    # ================== I/O, need async ==================
+    @classmethod
+    async def snippets(cls, disease_name_list: List[str], purpose: str) -> str:
+        """
+        多个疾病的提示词片段, 按 disease_name_list 顺序, 跳过无知识库记录的疾病
+        :param disease_name_list: 疾病名列表
+        :param purpose: SNIPPET_FIELDS 中的用途 "report" | "soap"
+        :return: "【D1】\n- 病征：S1、S2\n..."
+        """
+        version = KnowledgeStore.version()  # 未加载编译知识库时为 ""
+        result = {}
+        missing = []
+        for d in dict.fromkeys(disease_name_list):
+            key = (version, purpose, d)
+            if version and key in cls._cache:
+                cls._cache.move_to_end(key)
+                result[d] = cls._cache[key]
+            else:
+                missing.append(d)
+
+        if missing:
+            for row in await KnowledgeLoader.knowledge(missing):
+                snippet = cls.format(row, purpose)
+                if version:
+                    cls._put((version, purpose, row["name"]), snippet)
+                result[row["name"]] = snippet
+
+        return "\n\n".join(result[d] for d in dict.fromkeys(disease_name_list) if d in result)
+
+    # ================== not I/O, not need async ==================
+    @classmethod
+    def format(cls, row: Dict, purpose: str) -> str:
+        """
+        单个疾病的片段: 字段按 SNIPPET_FIELDS[purpose] 的顺序 (即优先级) 输出, 超出预算时截断并省略后续字段
+        :param row: MedicalKnowledge 整行
+        :param purpose: 用途
+        :return: 片段文本
+        """
+        lines = [f"【{row['name']}】"]
+        used = len(lines[0])
+        for field in SNIPPET_FIELDS[purpose]:
+            value = row.get(field)
+            if not value:
+                continue
+            if isinstance(value, list):
+                text = "、".join(str(v) for v in value[:SNIPPET_MAX_ITEMS])
+                if len(value) > SNIPPET_MAX_ITEMS:
+                    text += "等"
+            else:
+                text = " ".join(str(value).split())  # 合并空白与换行
+            line = f"- {FIELD_LABELS.get(field, field)}：{text}"
+
+            remaining = SNIPPET_MAX_CHARS - used - 1  # 1 为换行
+            if len(line) > remaining:
+                if remaining > 16:  # 剩余空间过小时整行省略
+                    lines.append(line[:remaining - 1] + "…")
+                break
+            lines.append(line)
+            used += len(line) + 1
+        return "\n".join(lines)
+
+    @classmethod
+    def _put(cls, key: Tuple[str, str, str], snippet: str) -> None:
+        cls._cache[key] = snippet
+        cls._cache.move_to_end(key)
+        while len(cls._cache) > SNIPPET_CACHE_SIZE:
+            cls._cache.popitem(last=False)
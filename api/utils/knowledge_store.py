@@ -0,0 +1,464 @@
+import asyncio
+import contextvars
+import hashlib
+import json
+import mmap
+import os
+import struct
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from tortoise import connections
+
+from models import DiseaseProb, SymptomProb, MedicalKnowledge, RelationDiseaseSymptom
+from settings import KNOWLEDGE_DIR, KNOWLEDGE_WATCH_INTERVAL, KNOWLEDGE_KEEP_LOADED, DB_READ, SNIPPET_FIELDS
+from middlewares.logger_middleware import logger
+from .reference_snapshot import ReferenceSnapshot
+
+MAGIC = b"AIMGDKB\x02"
+ALIGN = 64  # 数组按 64 字节对齐
+CURRENT_FILE = "CURRENT"  # 内容为当前版本号, 原子替换即切换版本
+SUFFIX = ".kb"
+
+# 二进制布局: MAGIC | u64 头长度 | JSON 头 | 对齐后的数组 (小端)
+# JSON 头 {"version": ..., "checksum": sha256(数组区), "content_checksum": sha256(提示词片段列), "arrays": {name: [offset, dtype, length]}, "counts": {...}}
+# 版本号后缀取自两者合并的哈希: 只改用药 / 饮食等片段列也会生成新版本, KnowledgeSnippet 的缓存随之失效
+ARRAYS = (
+    ("disease_prob", "<f8"),  # 疾病概率 (DiseaseProb), 缺失为 NaN
+    ("disease_prob_norm", "<f8"),  # 归一化 P(D), 缺失为 0
+    ("symptom_prob", "<f8"),  # 症状概率 (SymptomProb), 缺失为 NaN
+    ("symptom_prob_norm", "<f8"),  # 归一化 P(S), 缺失为 0
+    ("has_knowledge", "u1"),  # 疾病是否有 MedicalKnowledge 记录
+    ("indptr", "<i4"),  # CSR (MedicalKnowledge.symptom): 疾病 i 的症状为 indices[indptr[i]:indptr[i + 1]]
+    ("indices", "<i4"),
+    ("sym_indptr", "<i4"),  # CSC: 症状 j 的疾病为 sym_indices[sym_indptr[j]:sym_indptr[j + 1]]
+    ("sym_indices", "<i4"),
+    ("has_relation", "u1"),  # 疾病是否有 RelationDiseaseSymptom 记录
+    ("rel_indptr", "<i4"),  # CSR (RelationDiseaseSymptom.symptom_list)
+    ("rel_indices", "<i4"),
+    ("disease_offsets", "<i8"),  # 词表: 疾病名 i 为 disease_names[offsets[i]:offsets[i + 1]] (utf-8)
+    ("disease_names", "u1"),
+    ("symptom_offsets", "<i8"),
+    ("symptom_names", "u1"),
+)
+
+
+class KnowledgeBase:
+    """
+    一个版本的只读知识库: 数组直接引用 mmap (零拷贝, 各 worker 共享页缓存)
+    词表解码为 Python 字典, preload_app 时在 master 中构建, fork 后共享
+    """
+
+    def __init__(self, path: str, verify: bool = True):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mm[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"知识库文件格式错误: {path}")
+        (header_len,) = struct.unpack_from("<Q", self._mm, len(MAGIC))
+        start = len(MAGIC) + 8
+        self.header = json.loads(self._mm[start:start + header_len])
+        self.version: str = self.header["version"]
+        if verify and KnowledgeStore.checksum(memoryview(self._mm)[self.header["data_offset"]:]) != self.header["checksum"]:
+            raise ValueError(f"知识库校验失败: {path}")
+
+        arrays = {}
+        for name, (offset, dtype, length) in self.header["arrays"].items():
+            arrays[name] = np.frombuffer(self._mm, dtype=dtype, count=length, offset=offset)
+        self.disease_prob = arrays["disease_prob"]
+        self.disease_prob_norm = arrays["disease_prob_norm"]
+        self.symptom_prob = arrays["symptom_prob"]
+        self.symptom_prob_norm = arrays["symptom_prob_norm"]
+        self.has_knowledge = arrays["has_knowledge"]
+        self.indptr = arrays["indptr"]
+        self.indices = arrays["indices"]
+        self.sym_indptr = arrays["sym_indptr"]
+        self.sym_indices = arrays["sym_indices"]
+        self.has_relation = arrays["has_relation"]
+        self.rel_indptr = arrays["rel_indptr"]
+        self.rel_indices = arrays["rel_indices"]
+
+        self.diseases = self._decode(arrays["disease_offsets"], arrays["disease_names"])
+        self.symptoms = self._decode(arrays["symptom_offsets"], arrays["symptom_names"])
+        self.disease_index = {d: i for i, d in enumerate(self.diseases)}
+        self.symptom_index = {s: i for i, s in enumerate(self.symptoms)}
+
+    def diseaseProb(self, disease_name_list: List[str]) -> List[Tuple[str, float]]:
+        """[(疾病, 概率), ...], 跳过 DiseaseProb 中不存在的疾病"""
+        result = []
+        for d in disease_name_list:
+            i = self.disease_index.get(d)
+            if i is not None and not np.isnan(self.disease_prob[i]):
+                result.append((d, float(self.disease_prob[i])))
+        return result
+
+    def symptomProb(self, symptom: str) -> Optional[float]:
+        i = self.symptom_index.get(symptom)
+        if i is None or np.isnan(self.symptom_prob[i]):
+            return None
+        return float(self.symptom_prob[i])
+
+    def symptomsOf(self, disease: str) -> Optional[List[str]]:
+        """疾病的症状列表 (MedicalKnowledge.symptom 原顺序), 无知识库记录返回 None"""
+        i = self.disease_index.get(disease)
+        if i is None or not self.has_knowledge[i]:
+            return None
+        return [self.symptoms[j] for j in self.indices[self.indptr[i]:self.indptr[i + 1]]]
+
+    def diseasesOf(self, symptom: str) -> List[str]:
+        """具有该症状的疾病 (MedicalKnowledge)"""
+        j = self.symptom_index.get(symptom)
+        if j is None:
+            return []
+        return [self.diseases[i] for i in self.sym_indices[self.sym_indptr[j]:self.sym_indptr[j + 1]]]
+
+    def relationOf(self, disease: str) -> Optional[List[str]]:
+        """RelationDiseaseSymptom.symptom_list, 无记录返回 None"""
+        i = self.disease_index.get(disease)
+        if i is None or not self.has_relation[i]:
+            return None
+        return [self.symptoms[j] for j in self.rel_indices[self.rel_indptr[i]:self.rel_indptr[i + 1]]]
+
+    @staticmethod
+    def _decode(offsets: np.ndarray, blob: np.ndarray) -> List[str]:
+        data = blob.tobytes()
+        return [data[offsets[i]:offsets[i + 1]].decode("utf-8") for i in range(len(offsets) - 1)]
+
+
+class KnowledgeStore:
+    """
+    只读知识表 (DiseaseProb / SymptomProb / MedicalKnowledge.symptom / RelationDiseaseSymptom) 编译为带版本与校验和的内存映射文件
+    KNOWLEDGE_DIR/<version>.kb 为各版本, KNOWLEDGE_DIR/CURRENT 指向当前版本; 各 worker 监视 CURRENT 并原子切换引用, 请求无需加锁
+    问诊记录所用版本 (PIM.knowledge_version), 后续请求通过 use() 固定到该版本 (仍在内存或磁盘中时)
+    """
+    _kb: Optional[KnowledgeBase] = None  # 当前版本
+    _loaded: "OrderedDict[str, KnowledgeBase]" = OrderedDict()  # 最近使用的版本 {version: KnowledgeBase}
+    _pinned: contextvars.ContextVar[Optional[KnowledgeBase]] = contextvars.ContextVar("knowledge", default=None)
+    _watcher: Optional[asyncio.Task] = None
+
+    # ================== I/O, need async ==================
+    @classmethod
+    async def warmup(cls) -> KnowledgeBase:
+        """按 CURRENT 加载当前版本 (尚无版本时从数据库编译), 并确保本 worker 的 CURRENT 监视已启动"""
+        cls.start()
+        await ReferenceSnapshot.refresh()
+        if cls.activeVersion() is None:
+            await cls.compile()
+        await asyncio.to_thread(cls.reload)  # master 中 open 的版本可能已被切换
+        return cls._kb
+
+    @classmethod
+    async def compile(cls, activate: bool = True) -> Dict:
+        """
+        快照只读知识表, 写入新版本文件 (内容与当前版本相同则不生成)
+        :param activate: 是否切换为当前版本
+        :return: {'version': '20250101120000-3fa2c1d9', 'changed': True, 'counts': {...}}
+        """
+        default = connections.get("default")  # 读主库, 不经只读路由 (快照可能落后)
+        disease_rows = await DiseaseProb.all().using_db(default).order_by("id").values_list("disease", "probability")
+        symptom_rows = await SymptomProb.all().using_db(default).order_by("id").values_list("symptom", "probability")
+        knowledge_rows = await MedicalKnowledge.all().using_db(default).order_by("id").values_list("name", "symptom")
+        relation_rows = await RelationDiseaseSymptom.all().using_db(default).order_by("id").values_list("disease", "symptom_list")
+        snippet_fields = sorted({field for fields in SNIPPET_FIELDS.values() for field in fields})
+        content_rows = await MedicalKnowledge.all().using_db(default).order_by("id").values_list("name", *snippet_fields)
+        result = await asyncio.to_thread(cls.build, disease_rows, symptom_rows, knowledge_rows, relation_rows, activate, content_rows)
+        if DB_READ == "snapshot":  # 片段列从快照读取, 快照每次重建
+            result["snapshot"] = await ReferenceSnapshot.build()
+        return result
+
+    @classmethod
+    async def use(cls, version: str) -> KnowledgeBase:
+        """
+        本次请求 (contextvars) 固定使用指定版本, 用于问诊全程使用同一版本知识
+        版本文件已删除或为空时使用当前版本; 在长期运行的任务 (后台 worker) 中调用时须置于 begin / end 之间
+        """
+        kb = cls._kb
+        if version and (kb is None or kb.version != version):
+            kb = cls._loaded.get(version)
+            if kb is None:
+                try:
+                    kb = await asyncio.to_thread(cls._load, version)
+                except (OSError, ValueError):
+                    kb = cls._kb
+        cls._pinned.set(kb)
+        return kb
+
+    @classmethod
+    async def _watch(cls) -> None:
+        """轮询 CURRENT, 其他进程 (CLI / 管理员接口) 切换版本后本 worker 跟随"""
+        while True:
+            await asyncio.sleep(KNOWLEDGE_WATCH_INTERVAL)
+            try:
+                active = cls.activeVersion()
+                if active is not None and (cls._kb is None or cls._kb.version != active):
+                    await asyncio.to_thread(cls.reload)
+                await ReferenceSnapshot.refresh()
+            except Exception as e:
+                logger.error(f"[knowledge] reload failed: {repr(e)}")
+
+    # ================== not I/O, not need async ==================
+    @classmethod
+    def start(cls) -> None:
+        """
+        启动本 worker 的 CURRENT 监视 (幂等, 需在事件循环中调用)
+        worker 启动时调用: web 应用的 startup 事件 / loaderMiddleware, 后台任务 worker 的 run
+        """
+        if cls._watcher is None or cls._watcher.done():
+            cls._watcher = asyncio.get_running_loop().create_task(cls._watch())
+
+    @classmethod
+    def current(cls) -> Optional[KnowledgeBase]:
+        """本次请求使用的知识库 (use 固定的版本, 否则为当前版本), 未加载返回 None (调用方回退到数据库查询)"""
+        return cls._pinned.get() or cls._kb
+
+    @classmethod
+    def begin(cls) -> contextvars.Token:
+        """开始新的作用域 (后台任务 / 回放的一次问诊), 返回 token 供 end 撤销其中 use 固定的版本"""
+        return cls._pinned.set(None)
+
+    @classmethod
+    def end(cls, token: contextvars.Token) -> None:
+        cls._pinned.reset(token)
+
+    @classmethod
+    def version(cls) -> str:
+        kb = cls.current()
+        return "" if kb is None else kb.version
+
+    @classmethod
+    def open(cls) -> Optional[KnowledgeBase]:
+        """同步按 CURRENT 映射当前版本 (gunicorn master 中调用), 尚无版本返回 None"""
+        cls.reload()
+        return cls._kb
+
+    @classmethod
+    def reload(cls) -> Optional[str]:
+        """按 CURRENT 切换当前版本 (替换引用, 进行中的请求继续使用旧对象), 返回当前版本号"""
+        active = cls.activeVersion()
+        if active is None:
+            return None
+        if cls._kb is None or cls._kb.version != active:
+            kb = cls._loaded.get(active) or cls._load(active)
+            cls._kb = kb
+            logger.info(f"[knowledge] pid={os.getpid()} switched to {active}: {kb.header['counts']}")
+        return active
+
+    @classmethod
+    def activate(cls, version: str) -> str:
+        """切换当前版本: 原子替换 CURRENT, 本进程立即切换, 其他 worker 由监视跟随"""
+        path = cls.path(version)
+        if os.path.basename(version) != version or not os.path.exists(path):
+            raise ValueError(f"知识库版本不存在: {version}")
+        cls._load(version)  # 校验通过才切换
+        tmp = os.path.join(KNOWLEDGE_DIR, f"{CURRENT_FILE}.{os.getpid()}.tmp")
+        with open(tmp, "w") as f:
+            f.write(version)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, os.path.join(KNOWLEDGE_DIR, CURRENT_FILE))
+        return cls.reload()
+
+    @classmethod
+    def activeVersion(cls) -> Optional[str]:
+        try:
+            with open(os.path.join(KNOWLEDGE_DIR, CURRENT_FILE)) as f:
+                return f.read().strip() or None
+        except OSError:
+            return None
+
+    @classmethod
+    def versions(cls) -> List[Dict]:
+        """已编译的版本, 新的在前 [{'version': ..., 'active': True, 'size': ...}, ...]"""
+        active = cls.activeVersion()
+        result = []
+        if not os.path.isdir(KNOWLEDGE_DIR):
+            return result
+        for name in os.listdir(KNOWLEDGE_DIR):
+            if name.endswith(SUFFIX):
+                version = name[:-len(SUFFIX)]
+                stat = os.stat(os.path.join(KNOWLEDGE_DIR, name))
+                result.append({
+                    "version": version,
+                    "active": version == active,
+                    "size": stat.st_size,
+                    "mtime": stat.st_mtime,
+                })
+        return sorted(result, key=lambda item: item["mtime"], reverse=True)
+
+    @classmethod
+    def prune(cls, keep: int) -> List[str]:
+        """删除旧版本, 保留最近 keep 个与当前版本, 返回删除的版本号"""
+        removed = []
+        for item in cls.versions()[keep:]:
+            if not item["active"]:
+                os.remove(cls.path(item["version"]))
+                removed.append(item["version"])
+        return removed
+
+    @classmethod
+    def path(cls, version: str) -> str:
+        return os.path.join(KNOWLEDGE_DIR, f"{version}{SUFFIX}")
+
+    @classmethod
+    def checksum(cls, data) -> str:
+        return hashlib.sha256(data).hexdigest()
+
+    @classmethod
+    def build(cls, disease_rows, symptom_rows, knowledge_rows, relation_rows, activate: bool = True, content_rows=()) -> Dict:
+        """
+        由查询结果生成版本文件, 阻塞, 应在线程中调用
+        content_rows: MedicalKnowledge 的名称 + 提示词片段列, 不写入文件, 只参与版本号
+        """
+        arrays, counts = cls._arrays(disease_rows, symptom_rows, knowledge_rows, relation_rows)
+        data, offsets = cls._layout(arrays)
+        checksum = cls.checksum(data)
+        content_checksum = cls.checksum(json.dumps([list(row) for row in content_rows], ensure_ascii=False, default=str).encode("utf-8"))
+        digest = cls.checksum(f"{checksum}{content_checksum}".encode("ascii"))
+
+        active = cls.activeVersion()
+        if active is not None and active.endswith(digest[:8]) and os.path.exists(cls.path(active)):
+            return {"version": active, "changed": False, "counts": counts}
+
+        version = f"{datetime.now().strftime('%Y%m%d%H%M%S')}-{digest[:8]}"
+        cls._write(cls.path(version), data, offsets, {
+            "version": version,
+            "checksum": checksum,
+            "content_checksum": content_checksum,
+            "created_at": datetime.now().isoformat(),
+            "counts": counts,
+        })
+        if activate:
+            cls.activate(version)
+        return {"version": version, "changed": True, "counts": counts}
+
+    @classmethod
+    def _load(cls, version: str) -> KnowledgeBase:
+        kb = KnowledgeBase(cls.path(version))
+        cls._loaded[version] = kb
+        while len(cls._loaded) > KNOWLEDGE_KEEP_LOADED:
+            cls._loaded.popitem(last=False)  # 仍被引用的对象 (当前版本 / 进行中的请求) 不受影响
+        return kb
+
+    @classmethod
+    def _arrays(cls, disease_rows, symptom_rows, knowledge_rows, relation_rows) -> Tuple[Dict[str, np.ndarray], Dict[str, int]]:
+        # 重名记录以最后一条为准, 与按 id 读取后转字典一致
+        disease_prob = dict(disease_rows)
+        symptom_prob = dict(symptom_rows)
+        knowledge = {name: symptoms or [] for name, symptoms in knowledge_rows}
+        relation = {name: symptoms or [] for name, symptoms in relation_rows}
+
+        diseases = list(dict.fromkeys([*disease_prob, *knowledge, *relation]))
+        symptoms = list(dict.fromkeys([
+            *symptom_prob,
+            *(s for ss in knowledge.values() for s in ss),
+            *(s for ss in relation.values() for s in ss),
+        ]))
+        symptom_index = {s: i for i, s in enumerate(symptoms)}
+
+        indptr, indices = cls._csr(diseases, knowledge, symptom_index)
+        rel_indptr, rel_indices = cls._csr(diseases, relation, symptom_index)
+
+        # CSC: 按症状分组的疾病 (稳定排序保持疾病顺序)
+        order = np.argsort(indices, kind="stable")
+        rows = np.repeat(np.arange(len(diseases), dtype="<i4"), np.diff(indptr))
+        sym_indices = rows[order].astype("<i4")
+        sym_indptr = np.zeros(len(symptoms) + 1, dtype="<i4")
+        np.cumsum(np.bincount(indices, minlength=len(symptoms)), out=sym_indptr[1:])
+
+        disease_p = np.array([disease_prob.get(d, np.nan) for d in diseases], dtype="<f8")
+        symptom_p = np.array([symptom_prob.get(s, np.nan) for s in symptoms], dtype="<f8")
+        disease_offsets, disease_names = cls._encode(diseases)
+        symptom_offsets, symptom_names = cls._encode(symptoms)
+        arrays = {
+            "disease_prob": disease_p,
+            "disease_prob_norm": cls._normalize(disease_p),
+            "symptom_prob": symptom_p,
+            "symptom_prob_norm": cls._normalize(symptom_p),
+            "has_knowledge": np.array([d in knowledge for d in diseases], dtype="u1"),
+            "indptr": indptr,
+            "indices": indices,
+            "sym_indptr": sym_indptr,
+            "sym_indices": sym_indices,
+            "has_relation": np.array([d in relation for d in diseases], dtype="u1"),
+            "rel_indptr": rel_indptr,
+            "rel_indices": rel_indices,
+            "disease_offsets": disease_offsets,
+            "disease_names": disease_names,
+            "symptom_offsets": symptom_offsets,
+            "symptom_names": symptom_names,
+        }
+        counts = {
+            "diseases": len(diseases),
+            "symptoms": len(symptoms),
+            "disease_prob": len(disease_prob),
+            "symptom_prob": len(symptom_prob),
+            "knowledge": len(knowledge),
+            "relations": len(indices),
+            "relation_table": len(relation),
+        }
+        return arrays, counts
+
+    @classmethod
+    def _csr(cls, diseases: List[str], relation: Dict[str, List[str]], symptom_index: Dict[str, int]) -> Tuple[np.ndarray, np.ndarray]:
+        indptr = np.zeros(len(diseases) + 1, dtype="<i4")
+        indices = []
+        for i, d in enumerate(diseases):
+            indices.extend(symptom_index[s] for s in relation.get(d, []))
+            indptr[i + 1] = len(indices)
+        return indptr, np.array(indices, dtype="<i4")
+
+    @classmethod
+    def _normalize(cls, p: np.ndarray) -> np.ndarray:
+        p = np.nan_to_num(p, nan=0.0)
+        total = p.sum()
+        return p / total if total > 0 else p
+
+    @classmethod
+    def _encode(cls, names: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+        encoded = [name.encode("utf-8") for name in names]
+        offsets = np.zeros(len(encoded) + 1, dtype="<i8")
+        np.cumsum([len(b) for b in encoded], out=offsets[1:])
+        return offsets, np.frombuffer(b"".join(encoded), dtype="u1")
+
+    @classmethod
+    def _layout(cls, arrays: Dict[str, np.ndarray]) -> Tuple[bytes, Dict[str, list]]:
+        """数组区 (相对偏移, 各数组对齐) 与 {name: [相对偏移, dtype, length]}"""
+        chunks = []
+        offsets = {}
+        offset = 0
+        for name, dtype in ARRAYS:
+            data = np.ascontiguousarray(arrays[name], dtype=dtype).tobytes()
+            offsets[name] = [offset, dtype, len(arrays[name])]
+            padding = cls._align(offset + len(data)) - offset - len(data)
+            chunks.append(data + b"\0" * padding)
+            offset += len(data) + padding
+        return b"".join(chunks), offsets
+
+    @classmethod
+    def _write(cls, path: str, data: bytes, offsets: Dict[str, list], header: Dict) -> None:
+        """写入临时文件后原子替换; 头部长度影响数组起始位置, 迭代至稳定"""
+        header_len = 0
+        while True:
+            data_offset = cls._align(len(MAGIC) + 8 + header_len)
+            arrays = {name: [data_offset + off, dtype, length] for name, (off, dtype, length) in offsets.items()}
+            encoded = json.dumps({**header, "data_offset": data_offset, "arrays": arrays}).encode("utf-8")
+            if len(encoded) == header_len:
+                break
+            header_len = len(encoded)
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            prefix = MAGIC + struct.pack("<Q", header_len) + encoded
+            f.write(prefix + b"\0" * (data_offset - len(prefix)))
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+
+    @classmethod
+    def _align(cls, n: int) -> int:
+        return (n + ALIGN - 1) // ALIGN * ALIGN
@@ -1,7 +1,10 @@
 import numpy as np
 from typing import Dict, List, Tuple, Any, Union, Optional
 
-from models import DiseaseProb, MedicalKnowledge
+from middlewares.logger_middleware import logger
+from middlewares.trace_middleware import traced
+from .knowledge_loader import KnowledgeLoader
+from .knowledge_store import KnowledgeStore
 
 DELTA_IEG_CONVERGENCE = 2  # 收敛次数
 
@@ -11,35 +14,46 @@ class PIMService:
 
     # ================== I/O, need async ==================
     @classmethod
+    @traced("knowledge")
+    async def warmup(cls) -> None:
+        """
+        预热知识索引: 映射已编译的只读知识库 (不存在则编译), 每个 worker 只加载一次
+        失败 (目录不可写 / 编译时数据库异常 / 校验失败) 只记录日志, KnowledgeLoader 回退到数据库查询, 不影响问诊
+        """
+        try:
+            await KnowledgeStore.warmup()
+        except Exception as e:
+            logger.error(f"[knowledge] warmup failed, falling back to database: {repr(e)}")
+
+    @classmethod
+    @traced("knowledge")
     async def precise_search(cls, disease_name_list: List[str]) -> Dict[str, float]:
         """
         精确搜索疾病, 获得初始疾病概率分布
         :param disease_name_list: AI 预测的疾病列表
         :return: 符合数据库的疾病概率表 {'D1': 0.3, 'D2':0.4, ...}
         """
-        qs = await DiseaseProb.filter(disease__in=disease_name_list).values_list('disease', 'probability')
-
-        matched_disease = dict(qs)
+        matched_disease = await KnowledgeLoader.diseaseProb(disease_name_list)
         prob_sum = sum(matched_disease.values())
         matched_disease = {d_name: prob / prob_sum for d_name, prob in matched_disease.items()}
         matched_disease = {k: v for k, v in matched_disease.items() if v >= 1e-8}  # drop prob = 0
         return cls._temperature_scaling(matched_disease)  # 平滑放缩
 
     @classmethod
+    @traced("knowledge")
     async def knowledge_query(cls, disease_name_list: List[str]) -> List[Dict]:
         """
         根据疾病名查找知识库
         :param disease_name_list: 疾病名列表
         :return: 数据库专业医学知识作为补充 [{'name': 'D1', 'desc': '...'}, ...]
         """
-        query_set = await MedicalKnowledge.filter(name__in=disease_name_list).values()
-        return query_set
+        return await KnowledgeLoader.knowledge(disease_name_list)
 
     @classmethod
+    @traced("knowledge")
     async def tableStr(cls, disease_name_list: List[str], symptoms: Dict[str, float]) -> str:
         """转换表格"""
-        qs = await MedicalKnowledge.filter(name__in=disease_name_list).values_list("name", "symptom")
-        disease_symptom_relation = dict(qs)
+        disease_symptom_relation = await KnowledgeLoader.symptomsOf(disease_name_list)
 
         # 表格
         table_str = ["|疾病|已发生的症状|未发生的症状|其他未体现的症状|\n|-|-|-|-|"]
@@ -0,0 +1,110 @@
+import asyncio
+import os
+import sqlite3
+from typing import Dict, List, Optional
+
+from tortoise import connections
+from tortoise.exceptions import ConfigurationError
+
+from models import DiseaseProb, SymptomProb, MedicalKnowledge
+from settings import DB_READ, DB_SNAPSHOT_PATH
+from middlewares.logger_middleware import logger
+from utils import ReadRouter
+
+
+class ReferenceSnapshot:
+    """
+    只读知识表的本地 SQLite 快照 (DB_READ = "snapshot"): 从主库全量导出, 原子替换文件
+    各 worker 发现文件变化后打开新文件, 已排队的查询继续读旧快照 (替换后旧文件 inode 仍可读)
+    """
+    MODELS = (DiseaseProb, SymptomProb, MedicalKnowledge)
+
+    _mtime: Optional[float] = None  # 当前打开的快照文件修改时间
+
+    # ================== I/O, need async ==================
+    @classmethod
+    async def build(cls, path: str = DB_SNAPSHOT_PATH) -> Dict[str, int]:
+        """
+        从主库 (default 连接, 不经路由) 导出知识表并写入快照
+        :param path: 快照文件
+        :return: {'disease_prob': 8000, ...}
+        """
+        default = connections.get("default")
+        tables = []
+        for model in cls.MODELS:
+            rows = await model.all().using_db(default).order_by("id").values_list(*model._meta.fields_db_projection.keys())
+            tables.append((model, rows))
+        await asyncio.to_thread(cls._write, path, tables)
+        counts = {model._meta.db_table: len(rows) for model, rows in tables}
+        logger.info(f"[snapshot] {path}: {counts}")
+        return counts
+
+    @classmethod
+    async def refresh(cls) -> bool:
+        """
+        检查快照文件, 变化后本 worker 的 "read" 连接改为打开新文件 (随 KnowledgeStore 的 CURRENT 监视调用)
+        :return: 快照是否可用
+        """
+        if DB_READ != "snapshot":
+            return False
+        try:
+            mtime = os.stat(DB_SNAPSHOT_PATH).st_mtime
+        except OSError:
+            ReadRouter.snapshot_ready = False  # 尚未生成: 知识表仍读主库
+            return False
+        if mtime != cls._mtime:
+            cls._mtime = mtime
+            await cls._reopen()
+        ReadRouter.snapshot_ready = True
+        return True
+
+    @classmethod
+    async def _reopen(cls) -> None:
+        """
+        之后创建的查询打开新文件; 已创建的查询 (持有旧连接, 已在连接锁上排队) 完成后关闭旧连接
+        Tortoise 的 SQLite 连接包装在创建时取得连接对象并立即排队加锁, 先置空再加锁即可保证顺序
+        """
+        try:
+            client = connections.get("read")
+        except ConfigurationError:
+            return
+        old = client._connection
+        if old is None:
+            return
+        client._connection = None
+        async with client._lock:
+            await old.close()
+
+    # ================== not I/O, not need async ==================
+    @classmethod
+    def _write(cls, path: str, tables: List) -> None:
+        """建表 (列类型取自模型的 SQLite 方言) + 写入 + 索引, 写临时文件后原子替换"""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"  # 各 worker 可能同时刷新快照, 临时文件不能共用
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        db = sqlite3.connect(tmp)
+        try:
+            for model, rows in tables:
+                meta = model._meta
+                columns, indexes = [], []
+                for field_name, column in meta.fields_db_projection.items():
+                    field = meta.fields_map[field_name]
+                    sql_type = "INTEGER PRIMARY KEY" if field.pk else field.get_for_dialect("sqlite", "SQL_TYPE")
+                    columns.append(f'"{column}" {sql_type}')
+                    if field.index and not field.pk:
+                        indexes.append(column)
+                db.execute(f'CREATE TABLE "{meta.db_table}" ({", ".join(columns)})')
+
+                fields = [meta.fields_map[f] for f in meta.fields_db_projection]
+                placeholders = ", ".join("?" * len(fields))
+                db.executemany(
+                    f'INSERT INTO "{meta.db_table}" VALUES ({placeholders})',
+                    ([field.to_db_value(value, model) for field, value in zip(fields, row)] for row in rows)
+                )
+                for column in indexes:
+                    db.execute(f'CREATE INDEX "idx_{meta.db_table}_{column}" ON "{meta.db_table}" ("{column}")')
+            db.commit()
+        finally:
+            db.close()
+        os.replace(tmp, path)
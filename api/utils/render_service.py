@@ -0,0 +1,101 @@
+import hashlib
+from collections import OrderedDict
+from typing import Optional, Tuple, Type
+
+import markdown
+from tortoise.models import Model
+
+from middlewares.trace_middleware import traced
+from settings import OFFLOAD_MIN_CHARS
+from utils import Executor
+from .archive_service import ArchiveService
+
+RENDER_CACHE_SIZE = 256  # 进程内 LRU 缓存条数
+
+
+class RenderService:
+    """markdown -> HTML: 以内容哈希为键, 数据库保存渲染结果, 进程内 LRU 在前"""
+    EXTENSIONS = ['extra', 'markdown.extensions.tables']  # 'extra' 已包含 tables
+
+    _cache: "OrderedDict[str, str]" = OrderedDict()  # {content_hash: html}
+
+    # ================== I/O, need async ==================
+    @classmethod
+    async def html(cls, model: Type[Model], uid: str, field: str) -> Optional[str]:
+        """
+        读取 uid 记录中 field 的 HTML, 缓存命中时不解析 markdown
+        :param model: PSG | CDG
+        :param uid: 唯一标识符
+        :param field: "report" | "soap" | "initial"
+        :return: HTML, 记录不存在返回 None
+        """
+        result = await cls.htmlWithHash(model, uid, field)
+        return None if result is None else result[1]
+
+    @classmethod
+    async def htmlWithHash(cls, model: Type[Model], uid: str, field: str) -> Optional[Tuple[str, str]]:
+        """同 html, 返回 (内容哈希, HTML), 记录不存在返回 None"""
+        content_hash = await cls.storedHash(model, uid, field)
+        if content_hash is None:
+            return None
+        if content_hash and content_hash in cls._cache:
+            cls._cache.move_to_end(content_hash)
+            return content_hash, cls._cache[content_hash]
+
+        row = await model.filter(uid=uid).first().values(field, f"{field}_html", f"{field}_hash")
+        archived = row is None
+        if archived:
+            row = await ArchiveService.row(model, uid)
+            if row is None:
+                return None
+        if row[f"{field}_hash"] and row[f"{field}_hash"] == cls.contentHash(row[field]):
+            cls._put(row[f"{field}_hash"], row[f"{field}_html"])
+            return row[f"{field}_hash"], row[f"{field}_html"]
+
+        # 旧数据 (未保存 HTML) 或内容已变: 渲染并回写 (归档数据只渲染)
+        content_hash, html = await cls.render(row[field])
+        if not archived:
+            await model.filter(uid=uid).update(**{f"{field}_html": html, f"{field}_hash": content_hash})
+        return content_hash, html
+
+    @classmethod
+    async def storedHash(cls, model: Type[Model], uid: str, field: str) -> Optional[str]:
+        """只查询内容哈希列, 记录不存在返回 None, 旧数据返回空字符串 (已归档时从归档读取)"""
+        row = await model.filter(uid=uid).first().values(f"{field}_hash")
+        if row is None:
+            row = await ArchiveService.row(model, uid)
+        return None if row is None else row.get(f"{field}_hash", "")
+
+    @classmethod
+    async def assign(cls, obj: Model, field: str, text: str) -> str:
+        """写入 field 的同时写入 HTML 与哈希 (重新生成即失效旧缓存), 需调用方 save"""
+        content_hash, html = await cls.render(text)
+        setattr(obj, field, text)
+        setattr(obj, f"{field}_html", html)
+        setattr(obj, f"{field}_hash", content_hash)
+        return html
+
+    @classmethod
+    @traced("markdown")
+    async def render(cls, text: str) -> Tuple[str, str]:
+        """渲染 markdown, 返回 (内容哈希, HTML); 长文本 (纯 Python 解析, 不释放 GIL) 在进程池渲染"""
+        content_hash = cls.contentHash(text)
+        if content_hash in cls._cache:
+            cls._cache.move_to_end(content_hash)
+            return content_hash, cls._cache[content_hash]
+        html = await Executor.offload(markdown.markdown, text, extensions=cls.EXTENSIONS,
+                                      size=len(text), threshold=OFFLOAD_MIN_CHARS, pool="process")
+        cls._put(content_hash, html)
+        return content_hash, html
+
+    # ================== not I/O, not need async ==================
+    @classmethod
+    def contentHash(cls, text: str) -> str:
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    @classmethod
+    def _put(cls, content_hash: str, html: str) -> None:
+        cls._cache[content_hash] = html
+        cls._cache.move_to_end(content_hash)
+        while len(cls._cache) > RENDER_CACHE_SIZE:
+            cls._cache.popitem(last=False)
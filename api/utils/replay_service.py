@@ -0,0 +1,213 @@
+import json
+import os
+import time
+from typing import Dict, List, Optional
+
+from models import PIM
+from settings import REPLAY_SESSIONS, REPLAY_BASELINE_PATH, REPLAY_P95_REGRESSION, REPLAY_POSTERIOR_TOL
+from utils import DBPool
+from .entropy_calculator import EntropyCalculator
+from .knowledge_loader import KnowledgeLoader
+from .knowledge_store import KnowledgeStore
+from .session_repository import SessionRepository
+
+ROUND_DIGITS = 6  # 基线中疾病概率保留的小数位
+
+
+class ReplayService:
+    """
+    回放历史问诊: 用 PIM 记录的回答代替 LLM 阶段 (PIM03 判断症状 / PIM02 PLUS 跳过症状),
+    按 sendChat 的顺序重新执行贝叶斯更新与 IEG 计算, 统计每轮计算与数据库耗时, 与基线比较
+    - 第 0 轮: 初始 IEG (diseases[0] 为 PIM01 + 精确搜索的记录结果)
+    - 之后每轮: updateDiseaseProbV2 + calculateIEG, 以及该轮之后被跳过症状的 IEG 重算
+    symptoms 中值为 None 的症状: 对应一轮回答 (疾病概率不变) 或 PIM02 PLUS 跳过, 以 diseases 是否新增一轮区分
+    询问顺序不取 symptoms 的键顺序 (MySQL JSON 对象按键排序), 由 ieg 历史还原, 无法还原的问诊不回放并在报告中列出
+    """
+
+    # ================== I/O, need async ==================
+    @classmethod
+    async def run(cls, limit: int = REPLAY_SESSIONS, uids: Optional[List[str]] = None, use_kb: bool = True) -> Dict:
+        """
+        回放问诊 (依次执行, 结果可复现)
+        :param limit: 回放最近的问诊数
+        :param uids: 只回放指定问诊
+        :param use_kb: True 使用问诊记录的知识库版本 (与线上一致), False 直接查询数据库
+        :return: {'sessions': {uid: [[疾病概率, ...] 每轮]}, 'turns': 1200, 'turn_ms': {...}, 'compute_ms': {...}, 'db_ms': {...},
+                  'unordered': [无法还原询问顺序的 uid], ...}
+        """
+        query = PIM.all()
+        if uids:
+            query = query.filter(uid__in=uids)
+        rows = await query.order_by("-id").limit(limit).values(*SessionRepository.PROJECTIONS["replay"])
+        rows = [row for row in reversed(rows) if len(row["diseases"] or []) > 1]
+
+        if use_kb:
+            await KnowledgeStore.warmup()
+        sessions, turn_ms, compute_ms, db_ms, unordered = {}, [], [], [], []
+        drift = 0.0
+        for row in rows:
+            order = cls.turnOrder(row)
+            if order is None:
+                unordered.append(row["uid"])
+                continue
+            row = {**row, "symptoms": {s: row["symptoms"][s] for s in order}}
+            token = KnowledgeLoader.begin()  # 每次问诊独立的知识查询缓存, 与线上请求一致
+            pin = KnowledgeStore.begin()
+            try:
+                if use_kb:
+                    await KnowledgeStore.use(row["knowledge_version"])
+                result = await cls.replay(row)
+            finally:
+                KnowledgeStore.end(pin)
+                KnowledgeLoader.end(token)
+            sessions[row["uid"]] = result["posteriors"]
+            for turn in result["turns"]:
+                turn_ms.append(turn["ms"])
+                db_ms.append(turn["db_ms"])
+                compute_ms.append(turn["ms"] - turn["db_ms"])
+            drift = max(drift, result["drift"])
+
+        return {
+            "sessions": sessions,
+            "turns": len(turn_ms),
+            "turn_ms": cls.quantiles(turn_ms),
+            "compute_ms": cls.quantiles(compute_ms),
+            "db_ms": cls.quantiles(db_ms),
+            "recorded_drift": drift,
+            "unordered": unordered,
+            "knowledge": "kb" if use_kb else "db",
+        }
+
+    @classmethod
+    async def replay(cls, row: Dict) -> Dict:
+        """
+        回放一次问诊
+        :param row: PIM {'uid', 'diseases', 'symptoms', 'knowledge_version'}, symptoms 须已按询问顺序排列 (见 turnOrder)
+        :return: {'turns': [{'ms': 3.1, 'db_ms': 0.4}, ...], 'posteriors': [{'D1': 0.4, ...}, ...], 'drift': 与记录的最大差}
+        """
+        recorded = row["diseases"]
+        disease_prob_dict = recorded[0]
+        symptom_dict = {}
+        turns = []
+        posteriors = []
+        drift = 0.0
+
+        turn = cls._start()
+        await EntropyCalculator.calculateIEG(disease_prob_dict)
+        turns.append(cls._stop(turn))
+
+        t = 1  # 下一轮对应的 recorded 下标
+        for symptom_name, symptom_TFN in row["symptoms"].items():
+            answered = symptom_TFN is not None or (t < len(recorded) and recorded[t] == recorded[t - 1])
+            if answered:
+                turn = cls._start()
+                disease_prob_dict = await EntropyCalculator.updateDiseaseProbV2(disease_prob_dict, {symptom_name: symptom_TFN}, symptom_dict)
+                symptom_dict[symptom_name] = symptom_TFN
+                await EntropyCalculator.calculateIEG(disease_prob_dict, symptom_dict)
+                turns.append(cls._stop(turn))
+                posteriors.append({k: round(float(v), ROUND_DIGITS) for k, v in disease_prob_dict.items()})
+                if t < len(recorded):
+                    drift = max(drift, cls.divergence(disease_prob_dict, recorded[t]))
+                t += 1
+            else:  # PIM02 PLUS 跳过: 计入上一轮
+                turn = cls._start(turns.pop())
+                symptom_dict[symptom_name] = None
+                await EntropyCalculator.calculateIEG(disease_prob_dict, symptom_dict)
+                turns.append(cls._stop(turn))
+
+        return {"turns": turns, "posteriors": posteriors, "drift": drift}
+
+    # ================== not I/O, not need async ==================
+    @classmethod
+    def turnOrder(cls, row: Dict) -> Optional[List[str]]:
+        """
+        还原症状的询问 (或跳过) 顺序: ieg 为有序列表, 第 k 项的最大值即第 k 个被选中的症状
+        并列最大时取 symptoms 中尚未使用的第一个; 某项的最大值症状不在 symptoms 中 (记录不完整) 返回 None
+        :param row: PIM {'symptoms', 'ieg', ...}
+        :return: ['S1', 'S2', ...]
+        """
+        remaining = dict.fromkeys(row["symptoms"])
+        order = []
+        for symptom_IEG in row["ieg"] or []:
+            if not remaining:
+                break
+            if not symptom_IEG:
+                return None
+            top = max(symptom_IEG.values())
+            candidates = [s for s in remaining if symptom_IEG.get(s) == top]
+            if not candidates:
+                return None
+            order.append(candidates[0])
+            del remaining[candidates[0]]
+        return None if remaining else order
+
+    @classmethod
+    def compare(cls, report: Dict, baseline: Dict, regression: float = REPLAY_P95_REGRESSION, tol: float = REPLAY_POSTERIOR_TOL) -> List[str]:
+        """
+        与基线比较
+        :return: 失败原因列表, 空表示通过
+        """
+        failures = []
+        base_p95 = baseline.get("turn_ms", {}).get("p95")
+        p95 = report["turn_ms"].get("p95")
+        if base_p95 and p95 is not None and p95 > base_p95 * (1 + regression):
+            failures.append(f"turn p95 {p95:.2f}ms > baseline {base_p95:.2f}ms x {1 + regression:.2f}")
+
+        diverged = []
+        for uid, posteriors in report["sessions"].items():
+            expected = baseline.get("sessions", {}).get(uid)
+            if expected is None:
+                continue
+            if len(expected) != len(posteriors) or any(cls.divergence(a, b) > tol for a, b in zip(posteriors, expected)):
+                diverged.append(uid)
+        if diverged:
+            failures.append(f"posteriors diverged from baseline (tol={tol}) in {len(diverged)} sessions: {', '.join(diverged[:10])}")
+        return failures
+
+    @classmethod
+    def loadBaseline(cls, path: str = REPLAY_BASELINE_PATH) -> Optional[Dict]:
+        if not os.path.exists(path):
+            return None
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+
+    @classmethod
+    def saveBaseline(cls, report: Dict, path: str = REPLAY_BASELINE_PATH) -> None:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp, path)
+
+    @classmethod
+    def divergence(cls, a: Dict[str, float], b: Dict[str, float]) -> float:
+        """两组疾病概率的最大绝对差, 疾病集合不同视为 1"""
+        if a.keys() != b.keys():
+            return 1.0
+        return max((abs(a[k] - b[k]) for k in a), default=0.0)
+
+    @classmethod
+    def quantiles(cls, samples: List[float]) -> Dict[str, float]:
+        if not samples:
+            return {}
+        ordered = sorted(samples)
+        n = len(ordered)
+        return {
+            "p50": round(ordered[n // 2], 3),
+            "p95": round(ordered[min(n - 1, int(n * 0.95))], 3),
+            "max": round(ordered[-1], 3),
+        }
+
+    @classmethod
+    def _start(cls, turn: Optional[Dict] = None) -> Dict:
+        """开始 (或继续) 计时一轮"""
+        turn = turn or {"ms": 0.0, "db_ms": 0.0}
+        turn["_start"] = (time.perf_counter(), DBPool.queryTime())
+        return turn
+
+    @classmethod
+    def _stop(cls, turn: Dict) -> Dict:
+        start, db_start = turn.pop("_start")
+        turn["ms"] += (time.perf_counter() - start) * 1000
+        turn["db_ms"] += DBPool.queryTime() - db_start
+        return turn
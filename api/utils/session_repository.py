@@ -0,0 +1,125 @@
+import contextvars
+import functools
+import traceback
+from typing import Any, Dict, List, Optional
+
+from models import PIM
+from settings import SESSION_LOAD_GUARD
+from middlewares.logger_middleware import logger
+
+OWNED_MAX = 20  # 浏览器会话 (request.session, 存于 cookie) 中记录的最近创建问诊数
+
+
+class SessionRepository:
+    """
+    问诊 (PIM) 的按用途投影读取: 只取所需列, 不反序列化 ieg / delta_ieg 等大 JSON 列
+    需要修改并保存整行的路径 (问答 sendChat) 仍使用 PIM.get
+    """
+    # {用途: 列}
+    PROJECTIONS = {
+        "header": ("id", "created_at"),  # 存在性 / 外键 / 统计
+        "dialogue": ("qa_messages",),  # 问诊界面
+        "posterior": ("diseases",),  # 最新疾病概率
+        "initial": ("id", "created_at", "diseases", "qa_messages", "symptoms", "addition", "knowledge_version"),  # 初步诊断
+        "report": ("qa_messages", "symptoms", "addition", "knowledge_version"),  # 患者报告
+        "soap": ("diseases", "qa_messages", "symptoms", "addition", "knowledge_version"),  # SOAP 病历
+        "replay": ("uid", "diseases", "symptoms", "ieg", "knowledge_version"),  # 性能回放 (ieg 用于还原询问顺序)
+    }
+
+    _guarded: contextvars.ContextVar[bool] = contextvars.ContextVar("session_guarded", default=False)
+    _installed = False
+
+    # ================== I/O, need async ==================
+    @classmethod
+    async def project(cls, uid: str, projection: str) -> Optional[Dict[str, Any]]:
+        """
+        按用途读取问诊的部分列
+        :param uid: 唯一标识符
+        :param projection: PROJECTIONS 中的用途
+        :return: {列: 值}, 问诊不存在返回 None
+        """
+        return await PIM.filter(uid=uid).first().values(*cls.PROJECTIONS[projection])
+
+    @classmethod
+    async def exists(cls, uid: str) -> bool:
+        return await PIM.filter(uid=uid).exists()
+
+    @classmethod
+    async def header(cls, uid: str) -> Optional[Dict[str, Any]]:
+        """{'id': 1, 'created_at': datetime}, 不存在返回 None"""
+        return await cls.project(uid, "header")
+
+    @classmethod
+    async def dialogue(cls, uid: str) -> Optional[List[Dict]]:
+        """问诊对话 [{"role": ..., "content": ...}, ...], 不存在返回 None"""
+        row = await cls.project(uid, "dialogue")
+        return None if row is None else row["qa_messages"]
+
+    @classmethod
+    async def posterior(cls, uid: str) -> Optional[Dict[str, float]]:
+        """最新一轮疾病概率 {'D1': 0.4, ...}, 不存在返回 None"""
+        row = await cls.project(uid, "posterior")
+        if row is None:
+            return None
+        return row["diseases"][-1] if row["diseases"] else {}
+
+    @classmethod
+    async def setAddition(cls, uid: str, addition: str) -> bool:
+        """只更新 addition 列, 返回问诊是否存在"""
+        return await PIM.filter(uid=uid).update(addition=addition) > 0
+
+    # ================== not I/O, not need async ==================
+    @classmethod
+    def own(cls, session: Dict, uid: str) -> None:
+        """记录问诊由当前浏览器会话创建"""
+        owned = [u for u in session.get("uids", []) if u != uid]
+        session["uids"] = (owned + [uid])[-OWNED_MAX:]
+
+    @classmethod
+    def owns(cls, session: Dict, uid: str) -> bool:
+        """当前浏览器会话是否可操作该问诊 (创建者或管理员)"""
+        return "admin" in session or uid in session.get("uids", [])
+
+    @classmethod
+    def projected(cls, func):
+        """
+        标记只应通过投影读取问诊的路由 / 方法; SESSION_LOAD_GUARD 开启时, 其中整行加载 PIM 会被记录或拒绝
+        用法: 置于路由装饰器或 @classmethod 之下
+        """
+        if not SESSION_LOAD_GUARD:
+            return func
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            cls._install()
+            token = cls._guarded.set(True)
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                cls._guarded.reset(token)
+
+        return wrapper
+
+    @classmethod
+    def _install(cls) -> None:
+        """包装 PIM._init_from_db (幂等): 整行结果 (非 .only() 的部分实例) 在受保护作用域内触发检查"""
+        if cls._installed:
+            return
+        init_from_db = PIM._init_from_db.__func__
+
+        def _init_from_db(model, **kwargs):
+            instance = init_from_db(model, **kwargs)
+            if not instance._partial and cls._guarded.get():
+                cls._flag(instance)
+            return instance
+
+        PIM._init_from_db = classmethod(_init_from_db)
+        cls._installed = True
+
+    @classmethod
+    def _flag(cls, instance: PIM) -> None:
+        message = f"[session] full PIM row loaded in projected path: uid={instance.uid}"
+        if SESSION_LOAD_GUARD == "raise":
+            raise RuntimeError(message)
+        caller = "".join(traceback.format_stack(limit=6)[:-3])
+        logger.warning(f"{message}\n{caller}")
@@ -0,0 +1,33 @@
+import argparse
+import asyncio
+
+from tortoise import Tortoise
+
+from settings import TORTOISE_ORM, ARCHIVE_AFTER_DAYS, ARCHIVE_BATCH_SIZE
+from api.utils import ArchiveService
+
+
+async def run(days: int, batch_size: int, dry_run: bool, stats: bool):
+    await Tortoise.init(config=TORTOISE_ORM)
+    await Tortoise.generate_schemas()
+
+    if not stats:
+        result = await ArchiveService.archive(days, batch_size, dry_run)
+        ratio = result["raw_size"] / result["stored_size"] if result["stored_size"] else 0
+        print(f"{'(dry run) ' if dry_run else ''}归档 {result['sessions']} 次问诊: "
+              f"{result['raw_size'] / 1024:.1f} KB -> {result['stored_size'] / 1024:.1f} KB ({ratio:.1f}x)")
+
+    total = await ArchiveService.stats()
+    print(f"冷存储共 {total['sessions']} 次问诊, 节省 {total['saved_size'] / 1024 / 1024:.2f} MB ({total['ratio'] or 0}x)")
+
+    await Tortoise.close_connections()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="归档超过保留期的问诊 (压缩写入 archive 表并从 pim / psg / cdg / eval 删除), 建议每日定时执行")
+    parser.add_argument("-d", "--days", type=int, default=ARCHIVE_AFTER_DAYS, help="归档创建超过该天数的问诊")
+    parser.add_argument("-b", "--batch-size", type=int, default=ARCHIVE_BATCH_SIZE, help="每个事务归档的问诊数")
+    parser.add_argument("-n", "--dry-run", action="store_true", help="只统计压缩效果, 不写入")
+    parser.add_argument("-s", "--stats", action="store_true", help="只显示冷存储统计")
+    args = parser.parse_args()
+    asyncio.run(run(args.days, args.batch_size, args.dry_run, args.stats))
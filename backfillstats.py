@@ -0,0 +1,20 @@
+import asyncio
+
+from tortoise import Tortoise
+
+from settings import TORTOISE_ORM
+from api.utils import AnalyticsService
+
+
+async def run():
+    await Tortoise.init(config=TORTOISE_ORM)
+    await Tortoise.generate_schemas()
+
+    n = await AnalyticsService.backfill()
+    print(f"统计汇总表重建完成, 共 {n} 次问诊")
+
+    await Tortoise.close_connections()
+
+
+if __name__ == "__main__":
+    asyncio.run(run())
@@ -0,0 +1,197 @@
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+from tortoise import Tortoise
+
+from models import DiseaseProb, SymptomProb, MedicalKnowledge
+from api.utils import EntropyCalculator, PIMService
+
+BATCH = 2000  # bulk_create 每批条数
+SYMPTOMS_PER_DISEASE = (3, 40)  # 每个疾病的症状数范围 (对数正态, 中位数约 12)
+
+
+async def generate(diseases: int, symptoms: int, alpha: float, seed: int) -> dict:
+    """
+    写入合成知识库: 症状被疾病共享的程度服从幂律 (第 r 常见症状的权重 1 / r^alpha, 少数症状如 "发热" 被大量疾病共享)
+    疾病先验同样为幂律; 症状概率取其在疾病中的出现频率
+    :return: {'relations': 关系数, 'top_share': 最常见症状被多少疾病共享, 'median_share': ...}
+    """
+    rng = np.random.default_rng(seed)
+    disease_names = [f"疾病{i}" for i in range(diseases)]
+    symptom_names = [f"症状{i}" for i in range(symptoms)]
+
+    weights = 1.0 / np.arange(1, symptoms + 1) ** alpha
+    weights /= weights.sum()
+    low, high = SYMPTOMS_PER_DISEASE
+    counts = np.clip(rng.lognormal(np.log(12), 0.5, diseases).astype(int), low, min(high, symptoms))
+
+    relation = []
+    share = np.zeros(symptoms, dtype=int)
+    for k in counts:
+        picked = []
+        seen = set()
+        while len(picked) < k:  # 有放回抽样后去重, 比按权重无放回抽样快得多
+            for i in rng.choice(symptoms, size=2 * k, p=weights):
+                if i not in seen:
+                    seen.add(i)
+                    picked.append(i)
+                    if len(picked) == k:
+                        break
+        share[picked] += 1
+        relation.append([symptom_names[i] for i in picked])
+
+    prior = 1.0 / np.arange(1, diseases + 1) ** alpha
+    rng.shuffle(prior)
+    await DiseaseProb.bulk_create([DiseaseProb(disease=d, probability=float(p)) for d, p in zip(disease_names, prior)], batch_size=BATCH)
+    await SymptomProb.bulk_create([
+        SymptomProb(symptom=s, probability=float(max(n, 1) / diseases)) for s, n in zip(symptom_names, share)
+    ], batch_size=BATCH)
+    await MedicalKnowledge.bulk_create([MedicalKnowledge(name=d, symptom=r) for d, r in zip(disease_names, relation)], batch_size=BATCH)
+    return {"relations": int(counts.sum()), "top_share": int(share.max()), "median_share": int(np.median(share[share > 0]))}
+
+
+def cases(size: int, diseases: int, seed: int) -> dict:
+    """候选疾病集合 (size 个) 及其概率, 与一次问诊中的候选一致"""
+    rng = np.random.default_rng(seed + size)
+    names = [f"疾病{i}" for i in rng.choice(diseases, size=size, replace=False)]
+    p = rng.random(size)
+    return dict(zip(names, (p / p.sum()).tolist()))
+
+
+async def measure(call, repeat: int) -> dict:
+    """{'ms': 中位数, 'min_ms': 最小值, 'peak_kb': 单次调用峰值内存 (tracemalloc, 含 NumPy)}"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await call()
+        timings.append((time.perf_counter() - start) * 1000)
+
+    tracemalloc.start()  # 单独一次, 避免 tracemalloc 开销计入耗时
+    try:
+        await call()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {"ms": round(statistics.median(timings), 3), "min_ms": round(min(timings), 3), "peak_kb": peak // 1024}
+
+
+async def bench(size: int, args) -> dict:
+    """{函数: 结果}; 不加载编译知识库, 知识均经 KnowledgeLoader 查询 SQLite (每次调用无请求作用域, 即冷缓存)"""
+    disease_prob_dict = cases(size, args.diseases, args.seed)
+    disease_name_list = list(disease_prob_dict)
+    _, symptom_prob_dict, sd_relation = await EntropyCalculator.SDInfo(disease_prob_dict)
+    symptom_name_list = list(symptom_prob_dict)
+    ieg = await EntropyCalculator.calculateIEG(disease_prob_dict)
+    symptom_name, _ = EntropyCalculator.max_ieg(ieg)
+    known = {s: bool(i % 2) for i, s in enumerate(sorted(ieg, key=ieg.get, reverse=True)[1:6])}  # 已问过 5 个症状
+
+    async def sdMatrix():
+        EntropyCalculator.SDMatrix(disease_name_list, symptom_name_list, sd_relation)
+
+    calls = {
+        "precise_search": lambda: PIMService.precise_search(disease_name_list),
+        "SDMatrix": sdMatrix,
+        "calculateIEG": lambda: EntropyCalculator.calculateIEG(disease_prob_dict, known),
+        "updateDiseaseProbV2": lambda: EntropyCalculator.updateDiseaseProbV2(disease_prob_dict, {symptom_name: True}, known),
+    }
+    repeat = args.repeat if size <= 2000 else max(1, args.repeat // 3)
+    result = {"symptoms": len(symptom_name_list)}
+    for name, call in calls.items():
+        result[name] = await measure(call, repeat)
+    return result
+
+
+def revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def previous(path: str, params: dict) -> dict | None:
+    """结果文件中参数相同的最近一次运行"""
+    if not os.path.exists(path):
+        return None
+    last = None
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            entry = json.loads(line)
+            if entry["params"] == params:
+                last = entry
+    return last
+
+
+async def run(args) -> None:
+    db_path = args.db_url[len("sqlite://"):]
+    fresh = not os.path.exists(db_path) or not args.reuse
+    if fresh and os.path.exists(db_path):
+        os.remove(db_path)
+    await Tortoise.init(db_url=args.db_url, modules={"models": ["models"]})
+    await Tortoise.generate_schemas(safe=True)
+
+    params = {"diseases": args.diseases, "symptoms": args.symptoms, "alpha": args.alpha, "seed": args.seed}
+    try:
+        if fresh:
+            start = time.perf_counter()
+            shape = await generate(args.diseases, args.symptoms, args.alpha, args.seed)
+            print(f"生成知识库: {args.diseases} 疾病, {args.symptoms} 症状, {shape['relations']} 条关系 "
+                  f"(最常见症状被 {shape['top_share']} 个疾病共享, 中位数 {shape['median_share']}), 耗时 {time.perf_counter() - start:.1f}s")
+
+        results = {}
+        for size in args.sizes:
+            results[str(size)] = await bench(size, args)
+    finally:
+        await Tortoise.close_connections()
+
+    last = previous(args.output, params)
+    names = ("precise_search", "SDMatrix", "calculateIEG", "updateDiseaseProbV2")
+    print(f"\n{'diseases':>8} {'symptoms':>8} " + " ".join(f"{n:>26}" for n in names))
+    print(f"{'':>8} {'':>8} " + " ".join(f"{'ms / peak KB / vs last':>26}" for _ in names))
+    for size, result in results.items():
+        cells = []
+        for name in names:
+            r = result[name]
+            diff = ""
+            if last is not None and size in last["results"]:
+                base = last["results"][size][name]["ms"]
+                diff = f"{(r['ms'] - base) / base * 100:+.0f}%" if base else ""
+            cells.append(f"{r['ms']:>9.2f} {r['peak_kb']:>8} {diff:>6}")
+        print(f"{size:>8} {result['symptoms']:>8} " + " ".join(f"{c:>26}" for c in cells))
+
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "a", encoding="utf-8") as f:
+        f.write(json.dumps({
+            "time": datetime.now().isoformat(timespec="seconds"),
+            "revision": revision(),
+            "params": params,
+            "results": results,
+        }, ensure_ascii=False) + "\n")
+    print(f"\n结果已追加到 {args.output}" + (f", 对比 {last['time']} ({last['revision']})" if last else ""))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="生成合成知识库 (幂律症状共享), 测量熵计算各步骤随候选疾病数增长的耗时与峰值内存")
+    parser.add_argument("--db-url", default="sqlite://data/bench_entropy.sqlite3", help="本地 SQLite 测试库, 勿指向线上库")
+    parser.add_argument("--reuse", action="store_true", help="复用已生成的测试库 (参数须与生成时一致)")
+    parser.add_argument("--diseases", type=int, default=20000, help="知识库疾病总数")
+    parser.add_argument("--symptoms", type=int, default=15000, help="知识库症状总数")
+    parser.add_argument("--alpha", type=float, default=0.8, help="幂律指数, 越大常见症状越集中")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--sizes", type=lambda s: [int(x) for x in s.split(",")], default=[5, 50, 500, 2000, 10000],
+                        help="候选疾病数, 逗号分隔")
+    parser.add_argument("-r", "--repeat", type=int, default=9, help="每个调用执行次数, 取中位数 (超过 2000 个疾病时为 1/3)")
+    parser.add_argument("-o", "--output", default="data/bench/entropy.jsonl", help="结果追加写入, 同参数的上次运行作为对比")
+    args = parser.parse_args()
+
+    if not args.db_url.startswith("sqlite://"):
+        parser.error("--db-url 须为 sqlite://")
+    os.makedirs("data", exist_ok=True)
+    asyncio.run(run(args))
@@ -0,0 +1,137 @@
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import time
+from datetime import datetime, timedelta
+
+from tortoise import Tortoise
+from tortoise.expressions import Q
+
+from models import PIM, CDG, Job, DiseaseProb, SymptomProb, MedicalKnowledge
+
+BATCH = 2000  # bulk_create 每批条数
+
+
+def secondaryIndexes() -> list:
+    """模型上声明的非唯一索引 [(索引名, 表名, [列名])], 与 generate_schemas / aerich 生成的名称一致"""
+    conn = Tortoise.get_connection("default")
+    generator = conn.schema_generator(conn)
+    result = []
+    for model in Tortoise.apps["models"].values():
+        meta = model._meta
+        groups = [[field] for field, obj in meta.fields_map.items() if obj.index and not obj.unique and not obj.pk]
+        groups += [list(group) for group in meta.indexes]
+        for group in groups:
+            columns = [meta.fields_db_projection[f] for f in group]
+            result.append((generator._get_index_name("idx", model, columns), meta.db_table, columns))
+    return result
+
+
+async def seed(diseases: int, symptoms: int, sessions: int) -> None:
+    """写入与线上量级相近的数据: 知识表 + 问诊 / 病历 / 任务"""
+    rng = random.Random(0)
+    disease_names = [f"疾病{i}" for i in range(diseases)]
+    symptom_names = [f"症状{i}" for i in range(symptoms)]
+
+    await DiseaseProb.bulk_create([DiseaseProb(disease=d, probability=rng.random()) for d in disease_names], batch_size=BATCH)
+    await SymptomProb.bulk_create([SymptomProb(symptom=s, probability=rng.random()) for s in symptom_names], batch_size=BATCH)
+    await MedicalKnowledge.bulk_create([
+        MedicalKnowledge(name=d, symptom=rng.sample(symptom_names, 12), check=["血常规"], cure_way=["药物治疗"], prevent="注意休息" * 20)
+        for d in disease_names
+    ], batch_size=BATCH)
+
+    start = datetime.now() - timedelta(days=365)
+    for offset in range(0, sessions, BATCH):
+        n = min(BATCH, sessions - offset)
+        await PIM.bulk_create([
+            PIM(uid=f"{offset + i:06x}", created_at=start + timedelta(seconds=rng.randrange(365 * 86400)))
+            for i in range(n)
+        ])
+        pims = await PIM.filter(id__gt=offset, id__lte=offset + n).values_list("id", "uid")
+        await CDG.bulk_create([CDG(uid=uid, pim_id=pid, disease_opt=rng.choice(disease_names[:500])) for pid, uid in pims])
+        await Job.bulk_create([
+            Job(uid=uid, kind="soap", status="success" if rng.random() < 0.99 else "pending", run_at=start + timedelta(seconds=pid))
+            for pid, uid in pims
+        ])
+
+
+def queries(diseases: int, symptoms: int) -> dict:
+    """线上热点查询 {名称: 返回 queryset 的函数}"""
+    rng = random.Random(1)
+    now = datetime.now()
+    return {
+        "disease_prob IN": lambda: DiseaseProb.filter(disease__in=[f"疾病{rng.randrange(diseases)}" for _ in range(30)]).values_list("disease", "probability"),
+        "symptom_prob IN": lambda: SymptomProb.filter(symptom__in=[f"症状{rng.randrange(symptoms)}" for _ in range(50)]).values_list("symptom", "probability"),
+        "medical_knowledge IN": lambda: MedicalKnowledge.filter(name__in=[f"疾病{rng.randrange(diseases)}" for _ in range(5)]).values(),
+        "history first page": lambda: PIM.all().order_by("-created_at", "-id").limit(21).values("id", "uid", "created_at"),
+        "history by disease": lambda: PIM.filter(cdg__disease_opt=f"疾病{rng.randrange(500)}").order_by("-created_at", "-id").limit(21).values("id", "uid"),
+        "job claim": lambda: Job.filter(Q(status="pending", run_at__lte=now) | Q(status="running", locked_at__lt=now)).order_by("run_at").limit(10).values_list("id", flat=True),
+    }
+
+
+async def measure(name_to_query: dict, repeat: int) -> dict:
+    """{名称: (中位数 ms, 查询计划)}"""
+    conn = Tortoise.get_connection("default")
+    explain = "EXPLAIN QUERY PLAN" if conn.capabilities.dialect == "sqlite" else "EXPLAIN"
+    result = {}
+    for name, query in name_to_query.items():
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            await query()
+            timings.append((time.perf_counter() - start) * 1000)
+        _, rows = await conn.execute_query(f"{explain} {query().sql(params_inline=True)}")
+        plan = "; ".join(str(row[-1] if conn.capabilities.dialect == "sqlite" else dict(row)) for row in rows)
+        result[name] = (statistics.median(timings), plan)
+    return result
+
+
+async def run(args) -> None:
+    if args.db_url.startswith("sqlite://") and os.path.exists(args.db_url[len("sqlite://"):]):
+        os.remove(args.db_url[len("sqlite://"):])
+    await Tortoise.init(db_url=args.db_url, modules={"models": ["models"]})
+    await Tortoise.generate_schemas()
+    conn = Tortoise.get_connection("default")
+    sqlite = conn.capabilities.dialect == "sqlite"
+
+    try:
+        start = time.perf_counter()
+        await seed(args.diseases, args.symptoms, args.sessions)
+        print(f"写入完成: {args.diseases} 疾病, {args.symptoms} 症状, {args.sessions} 次问诊, 耗时 {time.perf_counter() - start:.1f}s")
+
+        indexes = secondaryIndexes()
+        for name, table, _ in indexes:
+            await conn.execute_script(f"DROP INDEX {name}" if sqlite else f"DROP INDEX {name} ON {table}")
+        before = await measure(queries(args.diseases, args.symptoms), args.repeat)
+
+        for name, table, columns in indexes:
+            await conn.execute_script(f"CREATE INDEX {name} ON {table} ({', '.join(columns)})")
+        if sqlite:
+            await conn.execute_script("ANALYZE")
+        after = await measure(queries(args.diseases, args.symptoms), args.repeat)
+
+        print(f"\n{'query':<22} {'before ms':>10} {'after ms':>10} {'speedup':>8}")
+        for name in before:
+            b, a = before[name][0], after[name][0]
+            print(f"{name:<22} {b:>10.2f} {a:>10.2f} {b / a if a else 0:>7.1f}x")
+        print()
+        for name in before:
+            print(f"[{name}]\n  before: {before[name][1]}\n  after:  {after[name][1]}")
+
+    finally:
+        await Tortoise.close_connections()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="写入模拟数据, 对比有无二级索引时热点查询的耗时与查询计划")
+    parser.add_argument("--db-url", default="sqlite://data/bench_indexes.sqlite3", help="本地测试库 (会删除重建 SQLite 文件), 勿指向线上库")
+    parser.add_argument("--diseases", type=int, default=8000)
+    parser.add_argument("--symptoms", type=int, default=6000)
+    parser.add_argument("--sessions", type=int, default=50000)
+    parser.add_argument("-r", "--repeat", type=int, default=20, help="每个查询执行次数, 取中位数")
+    args = parser.parse_args()
+
+    os.makedirs("data", exist_ok=True)
+    asyncio.run(run(args))
@@ -0,0 +1,54 @@
+import argparse
+import gzip
+import hashlib
+import json
+import shutil
+
+from utils.static_assets import STATIC_DIR, DIST_DIR, MANIFEST_PATH
+
+try:
+    import brotli
+except ImportError:  # 可选依赖, 未安装则只生成 .gz
+    brotli = None
+
+ASSET_DIRS = ["css", "js", "img"]
+COMPRESSIBLE = {".css", ".js", ".svg", ".json", ".txt", ".html"}  # 图片已压缩, 不再压缩
+
+
+def build(clean: bool = True):
+    if clean and DIST_DIR.exists():
+        shutil.rmtree(DIST_DIR)
+    DIST_DIR.mkdir(parents=True, exist_ok=True)
+
+    manifest = {}
+    for asset_dir in ASSET_DIRS:
+        for src in sorted((STATIC_DIR / asset_dir).rglob("*")):
+            if not src.is_file():
+                continue
+            data = src.read_bytes()
+            digest = hashlib.sha256(data).hexdigest()[:10]
+
+            rel = src.relative_to(STATIC_DIR)  # css/base.css
+            hashed_rel = rel.with_name(f"{src.stem}.{digest}{src.suffix}")  # css/base.3f2a1c9d0e.css
+            dst = DIST_DIR / hashed_rel
+            dst.parent.mkdir(parents=True, exist_ok=True)
+            dst.write_bytes(data)
+
+            if src.suffix in COMPRESSIBLE:
+                dst.with_name(dst.name + ".gz").write_bytes(gzip.compress(data, compresslevel=9, mtime=0))
+                if brotli is not None:
+                    dst.with_name(dst.name + ".br").write_bytes(brotli.compress(data, quality=11))
+
+            manifest[rel.as_posix()] = hashed_rel.as_posix()
+            print(f"{rel.as_posix()} -> {hashed_rel.as_posix()}")
+
+    with open(MANIFEST_PATH, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+    print(f"共 {len(manifest)} 个文件, manifest: {MANIFEST_PATH}" + ("" if brotli else " (未安装 brotli, 跳过 .br)"))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="构建带内容哈希的静态文件, 并生成 .gz / .br 预压缩版本")
+    parser.add_argument("--no-clean", action="store_true", help="保留 static/dist 中的旧文件 (滚动发布时旧页面仍可访问)")
+    args = parser.parse_args()
+    build(clean=not args.no_clean)
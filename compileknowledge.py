@@ -0,0 +1,44 @@
+import argparse
+import asyncio
+
+from tortoise import Tortoise
+
+from settings import TORTOISE_ORM
+from api.utils import KnowledgeStore
+
+
+async def compileKnowledge(activate: bool, keep: int):
+    await Tortoise.init(config=TORTOISE_ORM)
+    result = await KnowledgeStore.compile(activate=activate)
+    await Tortoise.close_connections()
+
+    if result["changed"]:
+        print(f"已生成知识库版本: {result['version']}" + (" (已切换)" if activate else ""))
+    else:
+        print(f"知识库未变化, 当前版本: {result['version']}")
+    print(" ".join(f"{k}={v}" for k, v in result["counts"].items()))
+    if keep > 0:
+        removed = KnowledgeStore.prune(keep)
+        if removed:
+            print(f"已删除旧版本: {', '.join(removed)}")
+
+
+def showVersions():
+    for item in KnowledgeStore.versions():
+        print(f"{'*' if item['active'] else ' '} {item['version']}  {item['size'] / 1024:.1f} KB")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="编译只读知识表为带版本的知识库文件, 运行中的 worker 自动切换")
+    parser.add_argument("--no-activate", action="store_true", help="只生成, 不切换为当前版本")
+    parser.add_argument("--keep", type=int, default=0, help="保留最近 N 个版本, 删除更旧的 (当前版本不删除)")
+    parser.add_argument("--list", action="store_true", help="列出已有版本")
+    parser.add_argument("--activate", default="", metavar="VERSION", help="切换到已有版本")
+    args = parser.parse_args()
+
+    if args.list:
+        showVersions()
+    elif args.activate:
+        print(f"已切换知识库版本: {KnowledgeStore.activate(args.activate)}")
+    else:
+        asyncio.run(compileKnowledge(not args.no_activate, args.keep))
@@ -5,19 +5,9 @@ from tortoise import Tortoise
 
 from settings import TORTOISE_ORM
 
-credentials = TORTOISE_ORM['connections']['default']['credentials']
-user = credentials['user']
-pwd = credentials['password']
-database = credentials['database']
-port = credentials['port']
-host = credentials['host']
-
 
 async def run():
-    await Tortoise.init(
-        db_url=f'mysql://{user}:{pwd}@{host}:{port}/{database}',
-        modules={'models': ['models']}
-    )
+    await Tortoise.init(config=TORTOISE_ORM)
     await Tortoise.generate_schemas()
 
     name = input("请输入管理员用户名: ")
@@ -0,0 +1,31 @@
+import argparse
+import asyncio
+
+from tortoise import Tortoise
+
+from settings import TORTOISE_ORM
+from api.utils import ExportService
+
+
+async def run(table: str, fmt: str, gzip: bool, output: str):
+    await Tortoise.init(config=TORTOISE_ORM)
+
+    output = output or ExportService.filename(table, fmt, gzip)
+    size = 0
+    with open(output, "wb") as f:
+        async for chunk in ExportService.stream(table, fmt, gzip):
+            f.write(chunk)
+            size += len(chunk)
+    print(f"导出完成: {output} ({size / 1024:.1f} KB)")
+
+    await Tortoise.close_connections()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="流式导出问诊数据")
+    parser.add_argument("table", choices=list(ExportService.TABLES.keys()), help="表名")
+    parser.add_argument("-f", "--format", choices=list(ExportService.FORMATS.keys()), default="ndjson", help="导出格式")
+    parser.add_argument("-z", "--gzip", action="store_true", help="gzip 压缩")
+    parser.add_argument("-o", "--output", default="", help="输出文件, 默认 <table>_<日期>.<format>")
+    args = parser.parse_args()
+    asyncio.run(run(args.table, args.format, args.gzip, args.output))
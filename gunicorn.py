@@ -1,3 +1,4 @@
+import gc
 import os
 from multiprocessing import cpu_count
 
@@ -17,6 +18,7 @@ chdir = '.'
 workers = cpu_count()  # 异步, 若同步则使用 2 * CPU + 1
 worker_class = "uvicorn.workers.UvicornWorker"  # 使用 uvicorn 异步
 threads = 2  # 指定每个工作者的线程数
+preload_app = True  # master 导入应用 (pandas / NumPy / dashscope) 后再 fork, worker 共享只读页
 
 # Logging Options
 loglevel = 'debug'  # 错误日志的日志级别
@@ -30,3 +32,28 @@ accesslog = "./logs/gunicorn_access.log"
 errorlog = "./logs/gunicorn_error.log"
 
 timeout = 240  # 等待 4 分钟
+
+
+# Server Hooks
+def when_ready(server):
+    """master 预先映射已编译的知识库, fork 后 worker 共享映射与词表; 连接池打点补丁随 fork 继承"""
+    from api.utils import KnowledgeStore
+    from utils import DBPool
+    KnowledgeStore.open()
+    DBPool.instrument()
+
+
+def pre_fork(server, worker):
+    """
+    冻结 master 中已有对象, worker 的 GC 不再扫描 (写入引用计数之外不触发写时复制)
+    分配存活 worker 未占用的最小槽位, 重启的 worker 复用退出 worker 的日志文件
+    """
+    gc.freeze()
+    used = {getattr(w, "slot", None) for w in server.WORKERS.values()}
+    worker.slot = next(i for i in range(len(used) + 1) if i not in used)
+
+
+def post_fork(server, worker):
+    """worker 日志写入 logs/<name>.w<slot>.log (见 ProcessQueueHandler)"""
+    from middlewares.logger_middleware import WORKER_SLOT_ENV
+    os.environ[WORKER_SLOT_ENV] = str(worker.slot)
@@ -0,0 +1,66 @@
+import argparse
+import json
+import os
+
+from utils.memory import memory_usage
+
+COLUMNS = ("Rss", "Pss", "Shared_Clean", "Shared_Dirty", "Private_Clean", "Private_Dirty")
+
+
+def children(pid: int) -> list:
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            return [int(p) for p in f.read().split()]
+    except OSError:
+        return []
+
+
+def measure(master: int) -> dict:
+    """{pid: {'role': 'master' | 'worker', 'Rss': ..., ...}}"""
+    result = {master: {"role": "master", **memory_usage(master)}}
+    for pid in children(master):
+        result[pid] = {"role": "worker", **memory_usage(pid)}
+    return result
+
+
+def show(result: dict, baseline: dict = None) -> None:
+    print(f"{'pid':>8} {'role':>7} " + " ".join(f"{c:>14}" for c in COLUMNS))
+    for pid, usage in result.items():
+        print(f"{pid:>8} {usage['role']:>7} " + " ".join(f"{usage.get(c, 0):>14}" for c in COLUMNS))
+
+    workers = [u for u in result.values() if u["role"] == "worker"]
+    total = {c: sum(u.get(c, 0) for u in result.values()) for c in COLUMNS}
+    print(f"{'total':>16} " + " ".join(f"{total[c]:>14}" for c in COLUMNS))
+    if workers:
+        avg = {c: sum(u.get(c, 0) for u in workers) // len(workers) for c in COLUMNS}
+        print(f"{'worker avg':>16} " + " ".join(f"{avg[c]:>14}" for c in COLUMNS))
+    if baseline is not None:
+        base_workers = [u for u in baseline.values() if u["role"] == "worker"]
+        base_total = {c: sum(u.get(c, 0) for u in baseline.values()) for c in COLUMNS}
+        print(f"{'total diff':>16} " + " ".join(f"{total[c] - base_total[c]:>+14}" for c in COLUMNS))
+        if workers and base_workers:
+            base_avg = {c: sum(u.get(c, 0) for u in base_workers) // len(base_workers) for c in COLUMNS}
+            print(f"{'avg diff':>16} " + " ".join(f"{avg[c] - base_avg[c]:>+14}" for c in COLUMNS))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="统计 gunicorn master / worker 内存 (KB), Pss 求和即实际总占用")
+    parser.add_argument("-p", "--pidfile", default="gunicorn.pid", help="gunicorn pid 文件")
+    parser.add_argument("-o", "--output", default="", help="保存结果 JSON, 供之后对比")
+    parser.add_argument("-c", "--compare", default="", help="与之前保存的结果对比")
+    args = parser.parse_args()
+
+    with open(args.pidfile) as f:
+        master_pid = int(f.read().strip())
+    usage = measure(master_pid)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = {int(k): v for k, v in json.load(f).items()}
+    show(usage, baseline)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(usage, f, indent=2)
+        print(f"已保存: {os.path.abspath(args.output)}")
@@ -0,0 +1,122 @@
+import asyncio
+import gzip
+from typing import Set
+
+from fastapi import Request
+from starlette.responses import Response
+
+from settings import COMPRESS_MIN_SIZE, COMPRESS_GZIP_LEVEL, COMPRESS_BROTLI_QUALITY, COMPRESS_THREAD_MIN_SIZE
+
+try:
+    import brotli
+except ImportError:  # 可选依赖, 未安装则只使用 gzip
+    brotli = None
+
+COMPRESSIBLE_TYPES = ("text/html", "text/plain", "text/css", "application/json", "application/javascript", "text/javascript")
+
+
+# 中间件函数, 与 logMiddleware 一起注册: app.middleware("http")(compressMiddleware)
+async def compressMiddleware(request: Request, call_next):
+    response = await call_next(request)
+
+    encoding = _negotiate(request.headers.get("accept-encoding", ""))
+    if encoding is None:
+        return response
+    if response.status_code == 304:
+        _revalidated(request, response, encoding)
+        return response
+    if not _compressible(request, response):
+        return response
+
+    body = b"".join([chunk async for chunk in response.body_iterator])
+    if len(body) < COMPRESS_MIN_SIZE:
+        return _rebuild(response, body)
+
+    if len(body) >= COMPRESS_THREAD_MIN_SIZE:  # 大响应体在线程中压缩
+        compressed = await asyncio.to_thread(_compress, body, encoding)
+    else:
+        compressed = _compress(body, encoding)
+
+    new_response = _rebuild(response, compressed)
+    new_response.headers["Content-Encoding"] = encoding
+    etag = new_response.headers.get("etag")
+    if etag is not None:
+        new_response.headers["ETag"] = _encodedETag(etag, encoding)
+    vary = new_response.headers.get("Vary")
+    new_response.headers["Vary"] = f"{vary}, Accept-Encoding" if vary else "Accept-Encoding"
+    return new_response
+
+
+def _negotiate(accept_encoding: str):
+    """根据 Accept-Encoding 选择 br / gzip, 忽略 q=0"""
+    accepted = accepted_encodings(accept_encoding)
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted:
+        return "gzip"
+    return None
+
+
+def accepted_encodings(accept_encoding: str) -> Set[str]:
+    """解析 Accept-Encoding, 返回 q > 0 的编码 {"br", "gzip", ...} (也用于预压缩静态文件)"""
+    accepted = set()
+    for item in accept_encoding.lower().split(","):
+        parts = [p.strip() for p in item.split(";")]
+        if not parts[0]:
+            continue
+        q = 1.0
+        for p in parts[1:]:
+            if p.startswith("q="):
+                try:
+                    q = float(p[2:])
+                except ValueError:
+                    q = 0.0
+        if q > 0:
+            accepted.add(parts[0])
+    return accepted
+
+
+def _compressible(request: Request, response) -> bool:
+    """只压缩已知长度的文本响应, 跳过流式 / SSE / 已压缩 / 空响应"""
+    if request.method == "HEAD" or response.status_code < 200 or response.status_code in (204, 304):
+        return False
+    headers = response.headers
+    if "content-encoding" in headers or "content-length" not in headers:  # 无长度即为流式响应
+        return False
+    if int(headers["content-length"]) < COMPRESS_MIN_SIZE:
+        return False
+    content_type = headers.get("content-type", "")
+    if content_type.startswith("text/event-stream"):
+        return False
+    return content_type.startswith(COMPRESSIBLE_TYPES)
+
+
+def _encodedETag(etag: str, encoding: str) -> str:
+    """压缩后的表示与原始响应体不同, 强 ETag 追加编码后缀: '"abc"' -> '"abc-gzip"' (HTTPCache.notModified 比较前去掉)"""
+    if etag.startswith("W/") or not etag.endswith('"'):
+        return etag
+    return f'{etag[:-1]}-{encoding}"'
+
+
+def _revalidated(request: Request, response, encoding: str) -> None:
+    """304 返回客户端所持有的 (压缩) 表示的 ETag"""
+    etag = response.headers.get("etag")
+    if etag is None:
+        return
+    encoded = _encodedETag(etag, encoding)
+    if encoded in (tag.strip() for tag in request.headers.get("if-none-match", "").split(",")):
+        response.headers["ETag"] = encoded
+
+
+def _compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=COMPRESS_BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=COMPRESS_GZIP_LEVEL)
+
+
+def _rebuild(response, body: bytes) -> Response:
+    """用已读取的响应体重建响应, 保留原始头部 (含多个 Set-Cookie), 重新计算 Content-Length"""
+    new_response = Response(content=body, status_code=response.status_code)
+    new_response.raw_headers = [(k, v) for k, v in response.raw_headers if k.lower() != b"content-length"]
+    new_response.raw_headers.append((b"content-length", str(len(body)).encode("latin-1")))
+    return new_response
@@ -0,0 +1,15 @@
+from fastapi import Request
+
+from api.utils.knowledge_loader import KnowledgeLoader
+from api.utils.knowledge_store import KnowledgeStore
+
+
+# 中间件函数, 与 logMiddleware 一起注册: app.middleware("http")(loaderMiddleware)
+async def loaderMiddleware(request: Request, call_next):
+    """每个请求一个 KnowledgeLoader 作用域: 请求内的知识查询合并并缓存, 请求结束即丢弃"""
+    KnowledgeStore.start()  # 任意请求 (非仅问诊) 都确保本 worker 已跟随 CURRENT
+    token = KnowledgeLoader.begin()
+    try:
+        return await call_next(request)
+    finally:
+        KnowledgeLoader.end(token)
@@ -1,43 +1,179 @@
 import os
+import re
+import json
+import time
+import queue
+import atexit
 import logging
+import threading
 from datetime import datetime
 from fastapi import Request
 from fastapi.responses import JSONResponse
 from starlette.middleware import Middleware
 from starlette.middleware.base import BaseHTTPMiddleware
-from logging.handlers import RotatingFileHandler
+from logging.handlers import QueueHandler, QueueListener, TimedRotatingFileHandler
 import pytz
 import sys
 
+from settings import TIMEZONE
+
+LOG_DIR = "logs"
+LOG_MAX_BYTES = 10 * 1024 * 1024  # 单文件最大 10 MB
+LOG_BACKUP_COUNT = 14  # 保留备份数
+LOG_ROTATE_WHEN = "midnight"  # 每天零点轮转
+WORKER_SLOT_ENV = "AIMGD_WORKER_SLOT"  # gunicorn post_fork 写入的 worker 槽位, 重启后复用同一日志文件
+
+LOG_EXTRA_FIELDS = ("uid", "route", "method", "path", "status", "latency_ms", "trace_id", "spans")  # 结构化字段
+
 # 确保 logs 目录存在
-os.makedirs("logs", exist_ok=True)
+os.makedirs(LOG_DIR, exist_ok=True)
 
-# 设置 logger
-logger = logging.getLogger("aimgd")
-logger.setLevel(logging.INFO)
+# 设置时区
+tz = pytz.timezone(TIMEZONE)
 
-formatter = logging.Formatter('%(asctime)s [%(levelname)s] %(message)s', '%Y-%m-%d %H:%M:%S')
 
-# 文件 handler
-file_handler = RotatingFileHandler("logs/aimgd.log", maxBytes=1 * 1024 * 1024, backupCount=5, encoding="utf-8")
-file_handler.setFormatter(formatter)
-logger.addHandler(file_handler)
+class JsonFormatter(logging.Formatter):
+    """JSON Lines: 每条日志一行 JSON, 附带 uid / route / latency_ms / status 等字段"""
 
-# 控制台 handler
-console_handler = logging.StreamHandler(sys.stdout)
-console_handler.setFormatter(formatter)
-logger.addHandler(console_handler)
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created, tz).strftime('%Y-%m-%d %H:%M:%S.%f')[:-3],
+            "level": record.levelname,
+            "pid": record.process,
+            "msg": record.getMessage(),
+        }
+        for field in LOG_EXTRA_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
 
-# 设置时区
-tz = pytz.timezone("Asia/Shanghai")
+
+class SizedTimedRotatingFileHandler(TimedRotatingFileHandler):
+    """按时间 + 大小轮转; 每个 worker 写自己的文件, 轮转只在本进程内发生, 多进程安全"""
+
+    def __init__(self, filename: str, max_bytes: int, **kwargs):
+        super().__init__(filename, **kwargs)
+        self.maxBytes = max_bytes
+
+    def shouldRollover(self, record: logging.LogRecord) -> int:
+        if super().shouldRollover(record):
+            return 1
+        if self.stream is None:
+            self.stream = self._open()
+        if self.maxBytes > 0 and self.stream.tell() + len(self.format(record)) + 1 >= self.maxBytes:
+            return 1
+        return 0
+
+
+class ProcessQueueHandler(QueueHandler):
+    """
+    事件循环只把日志放入队列, 由后台线程 (QueueListener) 写文件, 不阻塞请求
+    gunicorn fork 后线程不会被继承, 按 pid 懒启动本进程的 listener
+    gunicorn worker 写入 logs/<name>.w<slot>.log (槽位固定, 文件数有上限), 其他进程 (master / 后台 worker / 脚本) 写入 logs/<name>.<pid>.log
+    """
+
+    def __init__(self, name: str = "aimgd", formatter: logging.Formatter = None, console: bool = True):
+        super().__init__(queue.SimpleQueue())
+        self._name = name
+        self._formatter = formatter or JsonFormatter()
+        self._console = console
+        self._pid = None
+        self._listener = None
+        self._lock = threading.Lock()
+
+    def emit(self, record: logging.LogRecord) -> None:
+        if self._pid != os.getpid():
+            self._start()
+        super().emit(record)
+
+    def _start(self) -> None:
+        with self._lock:
+            pid = os.getpid()
+            if self._pid == pid:
+                return
+            self.queue = queue.SimpleQueue()  # fork 继承的队列可能处于加锁状态, 重新创建
+            self._prune()
+
+            # 文件 handler (JSON Lines)
+            slot = os.environ.get(WORKER_SLOT_ENV)
+            file_handler = SizedTimedRotatingFileHandler(
+                os.path.join(LOG_DIR, f"{self._name}.{'w' + slot if slot else pid}.log"), LOG_MAX_BYTES,
+                when=LOG_ROTATE_WHEN, backupCount=LOG_BACKUP_COUNT, encoding="utf-8"
+            )
+            file_handler.setFormatter(self._formatter)
+            handlers = [file_handler]
+
+            # 控制台 handler
+            if self._console:
+                console_handler = logging.StreamHandler(sys.stdout)
+                console_handler.setFormatter(logging.Formatter('%(asctime)s [%(levelname)s] %(message)s', '%Y-%m-%d %H:%M:%S'))
+                handlers.append(console_handler)
+
+            self._listener = QueueListener(self.queue, *handlers, respect_handler_level=True)
+            self._listener.start()
+            atexit.register(self._listener.stop)
+            self._pid = pid
+
+    def _prune(self) -> None:
+        """删除已退出进程的 <name>.<pid>.log* (最后写入超过保留天数), 避免按 pid 命名的文件随重启无限增长"""
+        pattern = re.compile(rf"{re.escape(self._name)}\.(\d+)\.log")
+        expire = time.time() - LOG_BACKUP_COUNT * 86400
+        for filename in os.listdir(LOG_DIR):
+            match = pattern.match(filename)
+            if match is None or _alive(int(match.group(1))):
+                continue
+            path = os.path.join(LOG_DIR, filename)
+            try:
+                if os.path.getmtime(path) < expire:
+                    os.remove(path)
+            except OSError:
+                pass  # 其他进程同时清理
+
+
+def _alive(pid: int) -> bool:
+    """信号 0 只检查进程是否存在 (属于其他用户时抛 PermissionError, 仍视为存活)"""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+# 设置 logger
+logger = logging.getLogger("aimgd")
+logger.setLevel(logging.INFO)
+logger.addHandler(ProcessQueueHandler())
+logger.propagate = False
 
 
 # 中间件函数
 async def logMiddleware(request: Request, call_next):
+    start = time.perf_counter()
     try:
         response = await call_next(request)
-        return response
     except Exception as e:
-        now = datetime.now(tz).strftime('%Y-%m-%d %H:%M:%S')
-        logger.error(f"{request.url.path}: {repr(e)}")
+        logger.error(f"{request.url.path}: {repr(e)}", extra=_extra(request, 500, start))
         return JSONResponse(status_code=500, content={"detail": "Internal Server Error"})
+
+    logger.info(f"{request.method} {request.url.path} {response.status_code}", extra=_extra(request, response.status_code, start))
+    return response
+
+
+def _extra(request: Request, status: int, start: float) -> dict:
+    """结构化字段: 路由模板 / uid / 状态码 / 耗时"""
+    route = request.scope.get("route")
+    return {
+        "uid": request.path_params.get("uid"),
+        "route": getattr(route, "path", None),
+        "method": request.method,
+        "path": request.url.path,
+        "status": status,
+        "latency_ms": round((time.perf_counter() - start) * 1000, 1),
+        "trace_id": getattr(request.state, "trace_id", None),  # 由 traceMiddleware 写入
+        "spans": getattr(request.state, "spans", None),
+    }
@@ -0,0 +1,196 @@
+import os
+import json
+import inspect
+import time
+import random
+import logging
+import functools
+import contextvars
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+from fastapi import Request
+
+from settings import TRACE_SAMPLE_RATE, TRACE_SLOW_MS
+from .logger_middleware import ProcessQueueHandler, logger
+
+SERVICE_NAME = "aimgd"
+
+# 采样的 trace 以 OTLP JSON 格式 (ExportTraceServiceRequest) 逐行写入 logs/traces.w<slot>.log (非 gunicorn worker 为 traces.<pid>.log)
+trace_logger = logging.getLogger("aimgd.trace")
+trace_logger.setLevel(logging.INFO)
+trace_logger.addHandler(ProcessQueueHandler("traces", logging.Formatter("%(message)s"), console=False))
+trace_logger.propagate = False
+
+
+class Span:
+    __slots__ = ("name", "span_id", "parent_id", "start_ns", "end_ns", "attributes")
+
+    def __init__(self, name: str, parent_id: Optional[str], attributes: Dict):
+        self.name = name
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.attributes = attributes
+
+    @property
+    def duration_ms(self) -> float:
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e6
+
+
+class Trace:
+    """一次请求内的全部 span"""
+
+    def __init__(self, name: str):
+        self.trace_id = os.urandom(16).hex()
+        self.root = Span(name, None, {})
+        self.spans: List[Span] = []
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """按 span 名聚合: {'db': {'dur': 12.3, 'count': 4}, ...}"""
+        result = {}
+        for s in self.spans:
+            item = result.setdefault(s.name, {"dur": 0.0, "count": 0})
+            item["dur"] += s.duration_ms
+            item["count"] += 1
+        return {k: {"dur": round(v["dur"], 1), "count": v["count"]} for k, v in result.items()}
+
+    def serverTiming(self) -> str:
+        """Server-Timing 头: db;dur=12.3;desc="4", ..., total;dur=..."""
+        items = [f'{name};dur={v["dur"]};desc="{v["count"]}"' for name, v in self.summary().items()]
+        items.append(f"total;dur={round(self.root.duration_ms, 1)}")
+        return ", ".join(items)
+
+    def otlp(self) -> Dict:
+        """OTLP JSON (ExportTraceServiceRequest)"""
+        def toOtlp(s: Span) -> Dict:
+            span = {
+                "traceId": self.trace_id,
+                "spanId": s.span_id,
+                "name": s.name,
+                "kind": 2 if s is self.root else 1,  # SERVER / INTERNAL
+                "startTimeUnixNano": str(s.start_ns),
+                "endTimeUnixNano": str(s.end_ns or time.time_ns()),
+                "attributes": [{"key": k, "value": {"stringValue": str(v)}} for k, v in s.attributes.items()],
+            }
+            if s.parent_id:
+                span["parentSpanId"] = s.parent_id
+            return span
+
+        return {
+            "resourceSpans": [{
+                "resource": {"attributes": [
+                    {"key": "service.name", "value": {"stringValue": SERVICE_NAME}},
+                    {"key": "process.pid", "value": {"intValue": str(os.getpid())}},
+                ]},
+                "scopeSpans": [{
+                    "scope": {"name": SERVICE_NAME},
+                    "spans": [toOtlp(self.root)] + [toOtlp(s) for s in self.spans],
+                }]
+            }]
+        }
+
+
+_trace: contextvars.ContextVar[Optional[Trace]] = contextvars.ContextVar("trace", default=None)
+_parent: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("trace_parent", default=None)
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """记录一段耗时, 不在请求中 (如后台任务) 时不记录"""
+    trace = _trace.get()
+    if trace is None:
+        yield None
+        return
+    s = Span(name, _parent.get() or trace.root.span_id, attributes)
+    token = _parent.set(s.span_id)
+    try:
+        yield s
+    finally:
+        s.end_ns = time.time_ns()
+        _parent.reset(token)
+        trace.spans.append(s)
+
+
+def traced(name: str):
+    """装饰器: 为同步 / 异步函数记录 span"""
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with span(name):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+_instrumented = set()
+_instrument_failed = False  # 打点失败只记录一次日志
+_in_db: contextvars.ContextVar[bool] = contextvars.ContextVar("trace_in_db", default=False)
+
+
+def _dbSpan(func):
+    """查询方法的 db span; 嵌套调用 (如 MySQL 的 execute_query_dict 内部调用 execute_query, 事务子类继承已包装的方法) 不重复记录"""
+    @functools.wraps(func)
+    async def wrapper(self, *args, **kwargs):
+        if _in_db.get():
+            return await func(self, *args, **kwargs)
+        token = _in_db.set(True)
+        try:
+            with span("db"):
+                return await func(self, *args, **kwargs)
+        finally:
+            _in_db.reset(token)
+    return wrapper
+
+
+def instrumentConnections() -> None:
+    """为 Tortoise 连接的查询方法加 db span (首次请求时执行, 幂等)"""
+    from tortoise import connections
+
+    for conn in connections.all():
+        cls = type(conn)
+        if cls in _instrumented:
+            continue
+        for method in ("execute_query", "execute_query_dict", "execute_insert", "execute_many", "execute_script"):
+            if hasattr(cls, method):
+                setattr(cls, method, _dbSpan(getattr(cls, method)))
+        _instrumented.add(cls)
+
+
+# 中间件函数, 注册在 logMiddleware 内层 (后注册先执行外层), 以便访问日志带上 spans
+async def traceMiddleware(request: Request, call_next):
+    global _instrument_failed
+    try:
+        instrumentConnections()
+    except Exception as e:
+        if not _instrument_failed:
+            _instrument_failed = True
+            logger.error(f"[trace] instrument connections failed, db spans disabled: {repr(e)}")
+
+    trace = Trace(f"{request.method} {request.url.path}")
+    token = _trace.set(trace)
+    try:
+        response = await call_next(request)
+    finally:
+        _trace.reset(token)
+        trace.root.end_ns = time.time_ns()
+
+    route = request.scope.get("route")
+    trace.root.name = f"{request.method} {getattr(route, 'path', request.url.path)}"
+    trace.root.attributes.update({"http.status_code": response.status_code, "http.target": request.url.path})
+
+    response.headers["Server-Timing"] = trace.serverTiming()
+    request.state.trace_id = trace.trace_id
+    request.state.spans = trace.summary()
+
+    if trace.root.duration_ms >= TRACE_SLOW_MS or random.random() < TRACE_SAMPLE_RATE:
+        trace_logger.info(json.dumps(trace.otlp(), ensure_ascii=False))
+    return response
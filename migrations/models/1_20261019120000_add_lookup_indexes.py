@@ -0,0 +1,19 @@
+from tortoise import BaseDBAsyncClient
+
+
+async def upgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        ALTER TABLE `disease_prob` ADD INDEX `idx_disease_pro_disease_cd9200` (`disease`);
+        ALTER TABLE `symptom_prob` ADD INDEX `idx_symptom_pro_symptom_55c3b7` (`symptom`);
+        ALTER TABLE `medical_knowledge` ADD INDEX `idx_medical_kno_name_0e88d0` (`name`);
+        ALTER TABLE `pim` ADD INDEX `idx_pim_created_7ddbb9` (`created_at`, `id`);
+        ALTER TABLE `cdg` ADD INDEX `idx_cdg_disease_694b3b` (`disease_opt`);"""
+
+
+async def downgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        ALTER TABLE `cdg` DROP INDEX `idx_cdg_disease_694b3b`;
+        ALTER TABLE `pim` DROP INDEX `idx_pim_created_7ddbb9`;
+        ALTER TABLE `medical_knowledge` DROP INDEX `idx_medical_kno_name_0e88d0`;
+        ALTER TABLE `symptom_prob` DROP INDEX `idx_symptom_pro_symptom_55c3b7`;
+        ALTER TABLE `disease_prob` DROP INDEX `idx_disease_pro_disease_cd9200`;"""
@@ -0,0 +1,22 @@
+from tortoise import BaseDBAsyncClient
+
+
+async def upgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        CREATE TABLE IF NOT EXISTS `archive` (
+    `id` INT NOT NULL PRIMARY KEY AUTO_INCREMENT,
+    `uid` VARCHAR(6) NOT NULL UNIQUE,
+    `disease_opt` VARCHAR(32) NOT NULL DEFAULT '',
+    `codec` VARCHAR(8) NOT NULL,
+    `payload` LONGBLOB NOT NULL,
+    `raw_size` INT NOT NULL DEFAULT 0,
+    `stored_size` INT NOT NULL DEFAULT 0,
+    `created_at` DATETIME(6) NOT NULL,
+    `archived_at` DATETIME(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6),
+    KEY `idx_archive_created_78886f` (`created_at`)
+) CHARACTER SET utf8mb4 COMMENT='已归档的问诊: PIM / PSG / CDG / EVAL 整行序列化为 JSON 后压缩为一个 blob, 原表中删除';"""
+
+
+async def downgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        DROP TABLE IF EXISTS `archive`;"""
@@ -0,0 +1,25 @@
+from tortoise import BaseDBAsyncClient
+
+
+async def upgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        CREATE TABLE IF NOT EXISTS `job` (
+    `id` INT NOT NULL PRIMARY KEY AUTO_INCREMENT,
+    `uid` VARCHAR(6) NOT NULL,
+    `kind` VARCHAR(16) NOT NULL,
+    `status` VARCHAR(16) NOT NULL DEFAULT 'pending',
+    `attempts` INT NOT NULL DEFAULT 0,
+    `max_attempts` INT NOT NULL DEFAULT 3,
+    `error` LONGTEXT NOT NULL,
+    `run_at` DATETIME(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6),
+    `locked_at` DATETIME(6),
+    `created_at` DATETIME(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6),
+    `updated_at` DATETIME(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6),
+    UNIQUE KEY `uid_job_uid_e7b008` (`uid`, `kind`),
+    KEY `idx_job_status_920a13` (`status`, `run_at`)
+) CHARACTER SET utf8mb4 COMMENT='后台生成任务 (初步诊断 / 患者报告 / SOAP 病历)';"""
+
+
+async def downgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        DROP TABLE IF EXISTS `job`;"""
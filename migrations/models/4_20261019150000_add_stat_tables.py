@@ -0,0 +1,46 @@
+from tortoise import BaseDBAsyncClient
+
+
+async def upgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        CREATE TABLE IF NOT EXISTS `stat_daily` (
+    `id` INT NOT NULL PRIMARY KEY AUTO_INCREMENT,
+    `date` DATE NOT NULL UNIQUE,
+    `sessions` INT NOT NULL DEFAULT 0,
+    `finished` INT NOT NULL DEFAULT 0,
+    `rounds_sum` INT NOT NULL DEFAULT 0,
+    `answers` INT NOT NULL DEFAULT 0,
+    `unrelated` INT NOT NULL DEFAULT 0,
+    `patient_eval_sum` DOUBLE NOT NULL DEFAULT 0,
+    `patient_eval_count` INT NOT NULL DEFAULT 0,
+    `doctor_eval_sum` DOUBLE NOT NULL DEFAULT 0,
+    `doctor_eval_count` INT NOT NULL DEFAULT 0
+) CHARACTER SET utf8mb4 COMMENT='统计: 每日汇总';
+        CREATE TABLE IF NOT EXISTS `stat_disease` (
+    `id` INT NOT NULL PRIMARY KEY AUTO_INCREMENT,
+    `disease` VARCHAR(32) NOT NULL UNIQUE,
+    `count` INT NOT NULL DEFAULT 0
+) CHARACTER SET utf8mb4 COMMENT='统计: 最可能疾病 (CDG.disease_opt) 分布';
+        CREATE TABLE IF NOT EXISTS `stat_rounds` (
+    `id` INT NOT NULL PRIMARY KEY AUTO_INCREMENT,
+    `rounds` INT NOT NULL UNIQUE,
+    `count` INT NOT NULL DEFAULT 0
+) CHARACTER SET utf8mb4 COMMENT='统计: 收敛所需对话轮次分布';
+        CREATE TABLE IF NOT EXISTS `stat_session` (
+    `id` INT NOT NULL PRIMARY KEY AUTO_INCREMENT,
+    `uid` VARCHAR(6) NOT NULL UNIQUE,
+    `date` DATE NOT NULL,
+    `finished` BOOL NOT NULL DEFAULT 0,
+    `rounds` INT NOT NULL DEFAULT 0,
+    `disease_opt` VARCHAR(32) NOT NULL DEFAULT '',
+    `patient_score` DOUBLE,
+    `doctor_score` DOUBLE
+) CHARACTER SET utf8mb4 COMMENT='统计: 单次问诊已计入汇总表的贡献, 重新生成/重新评分时用于扣除旧值';"""
+
+
+async def downgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        DROP TABLE IF EXISTS `stat_session`;
+        DROP TABLE IF EXISTS `stat_rounds`;
+        DROP TABLE IF EXISTS `stat_disease`;
+        DROP TABLE IF EXISTS `stat_daily`;"""
@@ -0,0 +1,21 @@
+from tortoise import BaseDBAsyncClient
+
+
+async def upgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        ALTER TABLE `psg` ADD `report_html` LONGTEXT NOT NULL;
+        ALTER TABLE `psg` ADD `report_hash` VARCHAR(64) NOT NULL DEFAULT '';
+        ALTER TABLE `cdg` ADD `initial_html` LONGTEXT NOT NULL;
+        ALTER TABLE `cdg` ADD `initial_hash` VARCHAR(64) NOT NULL DEFAULT '';
+        ALTER TABLE `cdg` ADD `soap_html` LONGTEXT NOT NULL;
+        ALTER TABLE `cdg` ADD `soap_hash` VARCHAR(64) NOT NULL DEFAULT '';"""
+
+
+async def downgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        ALTER TABLE `cdg` DROP COLUMN `soap_hash`;
+        ALTER TABLE `cdg` DROP COLUMN `soap_html`;
+        ALTER TABLE `cdg` DROP COLUMN `initial_hash`;
+        ALTER TABLE `cdg` DROP COLUMN `initial_html`;
+        ALTER TABLE `psg` DROP COLUMN `report_hash`;
+        ALTER TABLE `psg` DROP COLUMN `report_html`;"""
@@ -26,10 +26,13 @@ class PIM(Model):
     is_related = fields.BooleanField(default=True)  # 辅助：患者当前轮次的回答是否与问题相关
     unrelated_count = fields.IntField(default=0)  # 辅助：患者不相关回答的次数
 
+    knowledge_version = fields.CharField(max_length=32, default="")  # 问诊使用的知识库版本, 空为实时查询数据库
+
     created_at = fields.DatetimeField(auto_now_add=True)
 
     class Meta:
         table = "pim"
+        indexes = (("created_at", "id"),)  # 历史记录按 (-created_at, -id) 游标分页
 
 
 class PSG(Model):
@@ -41,6 +44,8 @@ class PSG(Model):
 
     disease_opt = fields.CharField(max_length=32, default="")  # 最可能疾病名
     report = fields.TextField(default="")  # 患者报告记录（较长），markdown 语法，含表情
+    report_html = fields.TextField(default="")  # 渲染后的 HTML 缓存
+    report_hash = fields.CharField(max_length=64, default="")  # report 内容哈希, 与 report_html 对应
 
     created_at = fields.DatetimeField(auto_now_add=True)
 
@@ -56,8 +61,12 @@ class CDG(Model):
     pim = fields.ForeignKeyField("models.PIM", related_name="cdg", on_delete=fields.CASCADE)
 
     initial = fields.TextField(default="")  # 初步诊断
-    disease_opt = fields.CharField(max_length=32, default="")  # 最可能疾病名
+    initial_html = fields.TextField(default="")  # 渲染后的 HTML 缓存
+    initial_hash = fields.CharField(max_length=64, default="")  # initial 内容哈希, 与 initial_html 对应
+    disease_opt = fields.CharField(max_length=32, default="", db_index=True)  # 最可能疾病名 (历史记录按疾病筛选)
     soap = fields.TextField(default="")  # 病历记录（较长），markdown 语法
+    soap_html = fields.TextField(default="")  # 渲染后的 HTML 缓存
+    soap_hash = fields.CharField(max_length=64, default="")  # soap 内容哈希, 与 soap_html 对应
 
     disease_opt_dict = fields.JSONField(default=dict)  # 最可能疾病字典 {'D1': 0.3, ...}
 
@@ -84,6 +93,107 @@ class EVAL(Model):
         table = "eval"
 
 
+# 后台任务队列
+class Job(Model):
+    """后台生成任务 (初步诊断 / 患者报告 / SOAP 病历)"""
+    id = fields.IntField(pk=True)
+    uid = fields.CharField(max_length=6)  # 患者 uid
+    kind = fields.CharField(max_length=16)  # 任务类型 "initial" | "report" | "soap"
+
+    status = fields.CharField(max_length=16, default="pending")  # "pending" | "running" | "success" | "failed"
+    attempts = fields.IntField(default=0)  # 已尝试次数
+    max_attempts = fields.IntField(default=3)  # 最多尝试次数
+    error = fields.TextField(default="")  # 最近一次失败原因
+
+    run_at = fields.DatetimeField(auto_now_add=True)  # 最早可执行时间 (重试退避)
+    locked_at = fields.DatetimeField(null=True, default=None)  # worker 领取时间 (超时视为 worker 崩溃)
+
+    created_at = fields.DatetimeField(auto_now_add=True)
+    updated_at = fields.DatetimeField(auto_now=True)
+
+    class Meta:
+        table = "job"
+        unique_together = (("uid", "kind"),)  # 每个 uid 每类任务只保留一条, 用于去重
+        indexes = (("status", "run_at"),)  # worker 领取: status + run_at 过滤并按 run_at 排序
+
+
+# 冷存储
+class Archive(Model):
+    """已归档的问诊: PIM / PSG / CDG / EVAL 整行序列化为 JSON 后压缩为一个 blob, 原表中删除"""
+    id = fields.IntField(pk=True)
+    uid = fields.CharField(max_length=6, unique=True)
+
+    disease_opt = fields.CharField(max_length=32, default="")  # 最可能疾病名 (不解压即可筛选)
+    codec = fields.CharField(max_length=8)  # 压缩算法 "zstd" | "gzip"
+    payload = fields.BinaryField()  # 压缩后的 {"pim": {...}, "psg": {...} | null, "cdg": {...} | null, "eval": {...} | null}
+    raw_size = fields.IntField(default=0)  # 压缩前字节数
+    stored_size = fields.IntField(default=0)  # 压缩后字节数
+
+    created_at = fields.DatetimeField(db_index=True)  # 问诊创建时间 (PIM.created_at)
+    archived_at = fields.DatetimeField(auto_now_add=True)
+
+    class Meta:
+        table = "archive"
+
+
+# 下面的表为统计汇总表, 增量维护
+class StatDaily(Model):
+    """统计: 每日汇总"""
+    id = fields.IntField(pk=True)
+    date = fields.DateField(unique=True)
+
+    sessions = fields.IntField(default=0)  # 新建问诊数
+    finished = fields.IntField(default=0)  # 完成问诊数 (已生成初步诊断)
+    rounds_sum = fields.IntField(default=0)  # 完成问诊的对话轮次之和
+    answers = fields.IntField(default=0)  # 患者回答次数
+    unrelated = fields.IntField(default=0)  # 不相关回答次数
+
+    patient_eval_sum = fields.FloatField(default=0)  # 患者评分 (每份问卷平均分) 之和
+    patient_eval_count = fields.IntField(default=0)
+    doctor_eval_sum = fields.FloatField(default=0)  # 医生评分 (每份问卷平均分) 之和
+    doctor_eval_count = fields.IntField(default=0)
+
+    class Meta:
+        table = "stat_daily"
+
+
+class StatDisease(Model):
+    """统计: 最可能疾病 (CDG.disease_opt) 分布"""
+    id = fields.IntField(pk=True)
+    disease = fields.CharField(max_length=32, unique=True)
+    count = fields.IntField(default=0)
+
+    class Meta:
+        table = "stat_disease"
+
+
+class StatRounds(Model):
+    """统计: 收敛所需对话轮次分布"""
+    id = fields.IntField(pk=True)
+    rounds = fields.IntField(unique=True)
+    count = fields.IntField(default=0)
+
+    class Meta:
+        table = "stat_rounds"
+
+
+class StatSession(Model):
+    """统计: 单次问诊已计入汇总表的贡献, 重新生成/重新评分时用于扣除旧值"""
+    id = fields.IntField(pk=True)
+    uid = fields.CharField(max_length=6, unique=True)
+    date = fields.DateField()
+
+    finished = fields.BooleanField(default=False)
+    rounds = fields.IntField(default=0)
+    disease_opt = fields.CharField(max_length=32, default="")
+
+    patient_score = fields.FloatField(null=True, default=None)
+    doctor_score = fields.FloatField(null=True, default=None)
+
+    class Meta:
+        table = "stat_session"
+
+
 # 管理员用户
 class Admin(Model):
     """管理员用户"""
@@ -100,7 +210,7 @@ class DiseaseProb(Model):
     """查询疾病概率，只读"""
     id = fields.IntField(pk=True)
 
-    disease = fields.CharField(max_length=32)
+    disease = fields.CharField(max_length=32, db_index=True)  # 每轮 IN 查询
     probability = fields.FloatField()
 
     class Meta:
@@ -111,7 +221,7 @@ class SymptomProb(Model):
     """查询症状概率，只读"""
     id = fields.IntField(pk=True)
 
-    symptom = fields.CharField(max_length=32)
+    symptom = fields.CharField(max_length=32, db_index=True)  # 每轮 IN 查询
     probability = fields.FloatField()
 
     class Meta:
@@ -133,7 +243,7 @@ class RelationDiseaseSymptom(Model):
 # medical 知识库
 class MedicalKnowledge(Model):
     """医学百科"""
-    name = fields.CharField(max_length=32)  # 疾病名称
+    name = fields.CharField(max_length=32, db_index=True)  # 疾病名称
 
     check = fields.JSONField(default=list)  # 检测项目
     category = fields.JSONField(default=list)  # 所属科室
@@ -0,0 +1,54 @@
+import argparse
+import asyncio
+import sys
+
+from tortoise import Tortoise
+
+from settings import TORTOISE_ORM, REPLAY_SESSIONS, REPLAY_BASELINE_PATH, REPLAY_P95_REGRESSION, REPLAY_POSTERIOR_TOL
+from api.utils import ReplayService
+from utils import DBPool
+
+
+async def run(limit: int, uids: list | None, use_kb: bool) -> dict:
+    DBPool.instrument()  # 统计每轮数据库耗时
+    await Tortoise.init(config=TORTOISE_ORM)
+    try:
+        return await ReplayService.run(limit, uids, use_kb)
+    finally:
+        await Tortoise.close_connections()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="回放历史问诊 (LLM 回答取自记录), 统计每轮耗时并与基线比较, 回归时以状态码 1 退出")
+    parser.add_argument("-n", "--limit", type=int, default=REPLAY_SESSIONS, help="回放最近的问诊数")
+    parser.add_argument("-u", "--uid", action="append", default=None, help="只回放指定问诊, 可重复")
+    parser.add_argument("--db", action="store_true", help="直接查询数据库, 不使用编译知识库")
+    parser.add_argument("-b", "--baseline", default=REPLAY_BASELINE_PATH, help="基线文件")
+    parser.add_argument("--update-baseline", action="store_true", help="以本次结果作为新基线")
+    parser.add_argument("--regression", type=float, default=REPLAY_P95_REGRESSION, help="允许的 p95 增长比例")
+    parser.add_argument("--tol", type=float, default=REPLAY_POSTERIOR_TOL, help="允许的疾病概率最大绝对差")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args.limit, args.uid, not args.db))
+    print(f"回放 {len(report['sessions'])} 次问诊, {report['turns']} 轮 (知识来源: {report['knowledge']})")
+    for name in ("turn_ms", "compute_ms", "db_ms"):
+        q = report[name]
+        print(f"  {name:<10} p50={q.get('p50', 0):.2f} p95={q.get('p95', 0):.2f} max={q.get('max', 0):.2f}")
+    print(f"  与记录的最大概率差: {report['recorded_drift']:.6f}")
+    if report["unordered"]:
+        print(f"  WARN {len(report['unordered'])} 次问诊无法由 ieg 还原询问顺序, 未回放: {', '.join(report['unordered'][:10])}")
+
+    if args.update_baseline:
+        ReplayService.saveBaseline(report, args.baseline)
+        print(f"基线已更新: {args.baseline}")
+        sys.exit(0)
+
+    baseline = ReplayService.loadBaseline(args.baseline)
+    if baseline is None:
+        print(f"无基线 {args.baseline}, 使用 --update-baseline 生成")
+        sys.exit(0)
+    failures = ReplayService.compare(report, baseline, args.regression, args.tol)
+    print(f"基线 turn_ms p95={baseline['turn_ms'].get('p95', 0):.2f}")
+    for failure in failures:
+        print(f"FAIL {failure}")
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,37 @@
+import argparse
+import asyncio
+
+from tortoise import Tortoise
+
+from settings import TORTOISE_ORM, EXPERIMENT_CONCURRENCY, EXPERIMENT_RATE, EXPERIMENT_FLUSH_SIZE
+from api.utils import ExperimentService
+
+
+async def run(mode: str, concurrency: int, rate: float, flush_size: int, limit: int | None, uids: list | None):
+    await Tortoise.init(config=TORTOISE_ORM)
+    await Tortoise.generate_schemas()
+
+    try:
+        stats = await ExperimentService.run(mode, concurrency, rate, flush_size, limit, uids)
+    finally:
+        await Tortoise.close_connections()
+
+    per_case = stats["seconds"] / stats["done"] if stats["done"] else 0
+    print(f"[{mode}] 完成 {stats['done']} 例, 失败 {stats['failed']} 例, 跳过已完成 {stats['skipped']} 例, "
+          f"补写检查点 {stats['recovered']} 例")
+    print(f"耗时 {stats['seconds']:.0f}s ({per_case:.1f}s/例, 并发 {concurrency}), LLM 请求 {stats['llm_calls']} 次")
+    if stats["failed"]:
+        print("有失败病例, 重新运行本命令即可只重试未完成的病例")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="离线模拟问诊评测: 对 ExperimentData 的病例运行虚拟患者问诊, 可中断后继续")
+    parser.add_argument("-m", "--mode", choices=["pim", "ai"], default="pim",
+                        help="pim: IEG 问诊流程 -> ExperimentPIM; ai: 只用 LLM 排序疾病 -> ExperimentOnlyAI")
+    parser.add_argument("-c", "--concurrency", type=int, default=EXPERIMENT_CONCURRENCY, help="同时进行的病例数")
+    parser.add_argument("-r", "--rate", type=float, default=EXPERIMENT_RATE, help="每秒最多 LLM 请求数, 0 不限制")
+    parser.add_argument("-f", "--flush-size", type=int, default=EXPERIMENT_FLUSH_SIZE, help="结果批量写入条数")
+    parser.add_argument("-n", "--limit", type=int, default=None, help="最多运行的病例数")
+    parser.add_argument("-u", "--uid", action="append", default=None, help="只运行指定病例, 可重复")
+    args = parser.parse_args()
+    asyncio.run(run(args.mode, args.concurrency, args.rate, args.flush_size, args.limit, args.uid))
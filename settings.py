@@ -16,11 +16,139 @@ EXPERIMENT_02_APP_ID = '<EXPERIMENT_02_APP_ID>'
 EXPERIMENT_03_APP_ID = '<EXPERIMENT_03_APP_ID>'
 PIM_02_APP_ID_PLUS = '<PIM_02_APP_ID_PLUS>'
 
+# Time zone (日志时间 / 看板统计按日分桶均使用本地时区)
+TIMEZONE = "Asia/Shanghai"
 
 # Database
-TORTOISE_ORM = {}
+DB_HOST = '<DB_HOST>'
+DB_PORT = 3306
+DB_USER = '<DB_USER>'
+DB_PASSWORD = '<DB_PASSWORD>'
+DB_NAME = '<DB_NAME>'
+TORTOISE_ORM = {}  # 为空时按上面的 DB_* 生成; local_settings 中给出完整配置时, 仅补充未设置的连接池参数
+
+# Database pool (每个 worker 一个连接池, 总连接数约为 DB_POOL_MAX x workers, 需小于 MySQL max_connections)
+DB_POOL_MIN = 1  # 每个 worker 保持的最少连接数
+DB_POOL_MAX = 10  # 每个 worker 的最大连接数, 超出时请求排队等待
+DB_CONNECT_TIMEOUT = 5  # 建立连接超时 (秒)
+DB_READ_TIMEOUT = 30  # 单条 SELECT 最长执行时间 (秒), 通过 MySQL max_execution_time 限制, 0 为不限制
+DB_POOL_RECYCLE = 3600  # 连接最长复用时间 (秒), 需小于 MySQL wait_timeout
+DB_PING_IDLE = 60  # 取出的连接空闲超过该秒数时先 ping, 失效则重连
+DB_SLOW_QUERY_MS = 500  # 慢查询阈值 (毫秒), 计入统计
+
+# Read routing (只读知识表 / 看板汇总表的读查询走独立连接 "read", 主库只承担问诊读写)
+DB_READ = ""  # "" 不启用 | "replica" MySQL 从库 | "snapshot" 本地 SQLite 快照 (仅知识表)
+DB_REPLICA_HOST = ''  # 为空时与主库相同
+DB_REPLICA_PORT = 0
+DB_REPLICA_USER = ''
+DB_REPLICA_PASSWORD = ''
+DB_SNAPSHOT_PATH = "data/reference.sqlite3"  # 编译知识库时同时生成, 各 worker 随 CURRENT 监视重新打开
+DB_READ_ANALYTICS = True  # replica 模式下看板汇总表也读从库 (允许复制延迟)
+
+# Compression (响应压缩中间件)
+COMPRESS_MIN_SIZE = 1024  # 小于该字节数不压缩
+COMPRESS_GZIP_LEVEL = 6  # gzip 压缩等级 1-9
+COMPRESS_BROTLI_QUALITY = 5  # brotli 压缩质量 0-11 (需安装 brotli)
+COMPRESS_THREAD_MIN_SIZE = 64 * 1024  # 大于该字节数在线程中压缩, 不阻塞事件循环
+
+# Tracing (阶段耗时追踪)
+TRACE_SAMPLE_RATE = 0.01  # 导出 OTLP JSON 的采样率
+TRACE_SLOW_MS = 3000  # 超过该耗时的请求总是导出
+
+# Event loop monitor (事件循环阻塞检测)
+LOOP_LAG_INTERVAL = 0.05  # 心跳间隔 (秒)
+LOOP_LAG_THRESHOLD_MS = 200  # 单次阻塞超过该毫秒数记录调用栈
+PROFILE_MAX_SECONDS = 60  # 采样分析最长时间 (秒)
+PROFILE_MAX_HZ = 1000  # 最大采样频率
+
+# Knowledge (只读知识库编译产物, 各 worker 内存映射共享)
+KNOWLEDGE_DIR = "data/knowledge"  # <version>.kb 与指向当前版本的 CURRENT
+KNOWLEDGE_WATCH_INTERVAL = 5  # 各 worker 检查 CURRENT 的间隔 (秒)
+KNOWLEDGE_KEEP_LOADED = 3  # 每个 worker 保留在内存中的版本数 (进行中的问诊固定使用创建时的版本)
+
+# Knowledge snippet (提示词中的疾病知识, 按用途投影字段, 顺序即优先级)
+SNIPPET_FIELDS = {
+    "report": ("symptom", "accompany", "cure_department", "check", "cure_way", "prevent", "do_eat", "not_eat", "common_drug"),
+    "soap": ("symptom", "accompany", "check", "cure_way", "common_drug", "cure_department"),
+}
+SNIPPET_MAX_CHARS = 600  # 每个疾病片段的最大字符数
+SNIPPET_MAX_ITEMS = 8  # 列表字段最多保留的条目数
+
+# Archive (冷存储: 超过保留期的问诊压缩归档)
+ARCHIVE_AFTER_DAYS = 180  # 创建超过该天数的问诊归档
+ARCHIVE_BATCH_SIZE = 200  # 每个事务归档的问诊数
+ARCHIVE_CODEC = "zstd"  # "zstd" (需安装 zstandard, 未安装时使用 gzip) | "gzip"
+ARCHIVE_ZSTD_LEVEL = 10
+ARCHIVE_GZIP_LEVEL = 9
+
+# Session (问诊读取按用途投影列, 不加载整行 JSON)
+SESSION_LOAD_GUARD = ""  # 投影读取路径中出现整行加载 PIM 时: "" 不检查 | "warn" 记录日志 | "raise" 抛出异常 (开发调试用)
+
+# Experiment (离线模拟问诊评测, runexperiment.py)
+EXPERIMENT_CONCURRENCY = 16  # 同时进行的模拟问诊数 (LLM 请求在默认线程池中执行, 其大小为 min(32, cpu_count() + 4))
+EXPERIMENT_RATE = 8  # 每秒最多发起的 LLM 请求数 (令牌桶), 0 不限制
+EXPERIMENT_FLUSH_SIZE = 50  # 结果批量写入的条数
+EXPERIMENT_PREFETCH = 5  # 虚拟患者一次回答 IEG 最高的前 n 个症状, 减少 LLM 请求
+EXPERIMENT_ROUND_MAX = 12  # 与 api/chat.py 的 ROUND_MAX 一致
+EXPERIMENT_ROUND_MIN = 6  # 与 api/chat.py 的 ROUND_MIN 一致
+EXPERIMENT_CHECKPOINT_DIR = "data/experiment"  # 每完成一例追加写入 <mode>.jsonl, 崩溃后重启先补写入库
+
+# Replay (回放历史问诊, 性能回归基准, replaysessions.py)
+REPLAY_SESSIONS = 500  # 默认回放最近的问诊数
+REPLAY_BASELINE_PATH = "data/replay/baseline.json"
+REPLAY_P95_REGRESSION = 0.2  # 每轮耗时 p95 超过基线的比例, 超过则失败
+REPLAY_POSTERIOR_TOL = 1e-4  # 疾病概率与基线的最大绝对差, 超过则视为结果不一致
+
+# Executor (CPU 密集任务卸载)
+EXECUTOR_THREADS = 4  # 线程池大小: 释放 GIL 的 NumPy / bcrypt
+EXECUTOR_PROCESSES = 2  # 进程池大小: 纯 Python 计算 (markdown 渲染), 0 则退回线程池
+OFFLOAD_MIN_CELLS = 20000  # 疾病数 x 症状数 超过该值时熵计算移出事件循环
+OFFLOAD_MIN_CHARS = 4096  # markdown 超过该字符数时在进程池渲染
 
 try:
     from local_settings import *
 except ImportError:
     pass
+
+# 连接池参数在 local_settings 之后合并, 使其中对 DB_* 的覆盖生效
+if not TORTOISE_ORM:
+    TORTOISE_ORM = {
+        "connections": {
+            "default": {
+                "engine": "tortoise.backends.mysql",
+                "credentials": {"host": DB_HOST, "port": DB_PORT, "user": DB_USER, "password": DB_PASSWORD, "database": DB_NAME},
+            },
+        },
+        "apps": {
+            "models": {"models": ["models", "aerich.models"], "default_connection": "default"},
+        },
+    }
+if DB_READ and "read" not in TORTOISE_ORM["connections"]:
+    if DB_READ == "replica":
+        _default = TORTOISE_ORM["connections"]["default"]
+        _primary = _default.get("credentials", {}) if isinstance(_default, dict) else {}
+        TORTOISE_ORM["connections"]["read"] = {
+            "engine": "tortoise.backends.mysql",
+            "credentials": {
+                **_primary,
+                "host": DB_REPLICA_HOST or _primary.get("host"),
+                "port": DB_REPLICA_PORT or _primary.get("port"),
+                "user": DB_REPLICA_USER or _primary.get("user"),
+                "password": DB_REPLICA_PASSWORD or _primary.get("password"),
+            },
+        }
+    elif DB_READ == "snapshot":
+        TORTOISE_ORM["connections"]["read"] = {
+            "engine": "tortoise.backends.sqlite",
+            "credentials": {"file_path": DB_SNAPSHOT_PATH, "journal_mode": "OFF", "query_only": "ON", "foreign_keys": "OFF"},
+        }
+    TORTOISE_ORM.setdefault("routers", []).append("utils.db_router.ReadRouter")
+for _connection in TORTOISE_ORM["connections"].values():
+    if isinstance(_connection, dict) and _connection.get("engine") == "tortoise.backends.mysql":
+        _credentials = _connection.setdefault("credentials", {})
+        _credentials.setdefault("minsize", DB_POOL_MIN)
+        _credentials.setdefault("maxsize", DB_POOL_MAX)
+        _credentials.setdefault("connect_timeout", DB_CONNECT_TIMEOUT)
+        _credentials.setdefault("pool_recycle", DB_POOL_RECYCLE)
+        if DB_READ_TIMEOUT:
+            _credentials.setdefault("init_command", f"SET SESSION max_execution_time={int(DB_READ_TIMEOUT * 1000)}")
@@ -12,13 +12,20 @@ document.addEventListener("DOMContentLoaded", function () {
     // 获取已生成报告
     async function fetchNote() {
         try {
-            const res = await fetch(`/note/${uid}`, {method: "PUT"});
+            const res = await fetch(`/note/${uid}/content`);  // 浏览器自动携带 If-None-Match
             const data = await res.json();
 
             if (data.status === "redirect") {
                 window.location.href = data.redirect_url;
             }
 
+            // 后台生成中, 轮询任务状态
+            if (data.status === "pending") {
+                showLoading();
+                await waitForJob();
+                return fetchNote();
+            }
+
             if (data.note && data.note.trim() !== "") {
                 renderNote(data.note);
             } else {
@@ -26,6 +33,9 @@ document.addEventListener("DOMContentLoaded", function () {
             }
         } catch (err) {
             console.error("获取病历失败:", err);
+            loadingSpinner.style.display = "none";
+            generateBtn.style.display = "inline-block";
+            noteStatus.style.display = "block";
         }
     }
 
@@ -44,29 +54,61 @@ document.addEventListener("DOMContentLoaded", function () {
         evaluateBtn.style.display = "inline-block";
     }
 
-    // 生成病历
-    async function generateNote() {
+    // 显示加载状态
+    function showLoading() {
         noteStatus.style.display = "none";
         noteContainer.style.display = "none";
         regenerateBtn.style.display = "none";
         evaluateBtn.style.display = "none";
+        generateBtn.style.display = "none";
         loadingSpinner.style.display = "block";
+    }
 
-        try {
-            const res = await fetch(`/note/${uid}`, {method: "POST"});
+    // 轮询后台任务, 直到完成或失败
+    async function waitForJob() {
+        let missing = 0;
+        while (true) {
+            await new Promise(resolve => setTimeout(resolve, 2000));
+            const res = await fetch(`/job/${uid}/soap`);
+            if (res.status === 404) {
+                // 任务尚未创建 (初步诊断生成中), 超过 2 分钟视为失败
+                if (++missing > 60) {
+                    throw new Error("任务不存在");
+                }
+                continue;
+            }
             const data = await res.json();
+            if (data.state === "success") {
+                return;
+            }
+            if (data.state === "failed") {
+                throw new Error(data.error || "生成失败");
+            }
+        }
+    }
 
-            if (data.status === "redirect") {
-                window.location.href = data.redirect_url;
+    // 生成病历 (后台任务)
+    async function generateNote() {
+        showLoading();
+
+        try {
+            const res = await fetch(`/job/${uid}/soap?force=1`, {method: "POST"});
+            const data = await res.json();
+            if (data.status !== "success") {
+                throw new Error(data.message || "任务提交失败");
             }
+            await waitForJob();
 
-            if (data.status === "success" && data.note && data.note.trim() !== "") {
-                renderNote(data.note);
+            const result = await fetch(`/job/${uid}/soap/result`);
+            const resultData = await result.json();
+            if (resultData.status === "success" && resultData.result && resultData.result.trim() !== "") {
+                renderNote(resultData.result);
             } else {
                 throw new Error("病历为空");
             }
         } catch (err) {
             loadingSpinner.style.display = "none";
+            generateBtn.style.display = "inline-block";
             noteStatus.style.display = "block";
             noteStatus.classList.add("medical-alert-danger");
             noteStatus.innerText = "病历生成失败，请稍后重试。";
@@ -12,13 +12,20 @@ document.addEventListener("DOMContentLoaded", function () {
     // 获取已生成报告
     async function fetchReport() {
         try {
-            const res = await fetch(`/report/${uid}`, {method: "PUT"});
+            const res = await fetch(`/report/${uid}/content`);  // 浏览器自动携带 If-None-Match
             const data = await res.json();
 
             if (data.status === "redirect") {
                 window.location.href = data.redirect_url;
             }
 
+            // 后台生成中, 轮询任务状态
+            if (data.status === "pending") {
+                showLoading();
+                await waitForJob();
+                return fetchReport();
+            }
+
             if (data.report && data.report.trim() !== "") {
                 renderReport(data.report);
             } else {
@@ -26,6 +33,9 @@ document.addEventListener("DOMContentLoaded", function () {
             }
         } catch (err) {
             console.error("获取报告失败:", err);
+            loadingSpinner.style.display = "none";
+            generateBtn.style.display = "inline-block";
+            reportStatus.style.display = "block";
         }
     }
 
@@ -44,29 +54,61 @@ document.addEventListener("DOMContentLoaded", function () {
         evaluateBtn.style.display = "inline-block";
     }
 
-    // 生成报告
-    async function generateReport() {
+    // 显示加载状态
+    function showLoading() {
         reportStatus.style.display = "none";
         reportContainer.style.display = "none";
         regenerateBtn.style.display = "none";
         evaluateBtn.style.display = "none";
+        generateBtn.style.display = "none";
         loadingSpinner.style.display = "block";
+    }
 
-        try {
-            const res = await fetch(`/report/${uid}`, {method: "POST"});
+    // 轮询后台任务, 直到完成或失败
+    async function waitForJob() {
+        let missing = 0;
+        while (true) {
+            await new Promise(resolve => setTimeout(resolve, 2000));
+            const res = await fetch(`/job/${uid}/report`);
+            if (res.status === 404) {
+                // 任务尚未创建 (初步诊断生成中), 超过 2 分钟视为失败
+                if (++missing > 60) {
+                    throw new Error("任务不存在");
+                }
+                continue;
+            }
             const data = await res.json();
+            if (data.state === "success") {
+                return;
+            }
+            if (data.state === "failed") {
+                throw new Error(data.error || "生成失败");
+            }
+        }
+    }
 
-            if (data.status === "redirect") {
-                window.location.href = data.redirect_url;
+    // 生成报告 (后台任务)
+    async function generateReport() {
+        showLoading();
+
+        try {
+            const res = await fetch(`/job/${uid}/report?force=1`, {method: "POST"});
+            const data = await res.json();
+            if (data.status !== "success") {
+                throw new Error(data.message || "任务提交失败");
             }
+            await waitForJob();
 
-            if (data.status === "success" && data.report && data.report.trim() !== "") {
-                renderReport(data.report);
+            const result = await fetch(`/job/${uid}/report/result`);
+            const resultData = await result.json();
+            if (resultData.status === "success" && resultData.result && resultData.result.trim() !== "") {
+                renderReport(resultData.result);
             } else {
                 throw new Error("报告为空");
             }
         } catch (err) {
             loadingSpinner.style.display = "none";
+            generateBtn.style.display = "inline-block";
             reportStatus.style.display = "block";
             reportStatus.classList.add("medical-alert-danger");
             reportStatus.innerText = "报告生成失败，请稍后重试。";
@@ -1 +1,8 @@
-from .random_uid import short_uuid
\ No newline at end of file
+from .random_uid import short_uuid
+from .static_assets import static_url, PrecompressedStaticFiles
+from .loop_monitor import LoopMonitor
+from .sampling_profiler import SamplingProfiler
+from .executor import Executor
+from .memory import memory_usage
+from .db_pool import DBPool
+from .db_router import ReadRouter
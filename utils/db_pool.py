@@ -0,0 +1,216 @@
+import asyncio
+import contextvars
+import functools
+import importlib
+import time
+from collections import deque
+from multiprocessing import cpu_count
+from typing import Dict
+
+from settings import TORTOISE_ORM, DB_POOL_MAX, DB_PING_IDLE, DB_SLOW_QUERY_MS
+
+SAMPLE_SIZE = 1024  # 每项保留最近的样本数, 用于分位数
+
+
+class _Metrics:
+    """单个连接 (connection_name) 的统计"""
+
+    def __init__(self):
+        self.acquired = 0  # 取出次数
+        self.in_use = 0  # 当前已取出的连接数
+        self.peak_in_use = 0
+        self.waiting = 0  # 当前等待取连接的协程数
+        self.peak_waiting = 0
+        self.pings = 0  # 空闲连接取出时的 ping 次数
+        self.reconnects = 0  # ping 失败后重连次数
+        self.queries = 0
+        self.slow_queries = 0
+        self.errors = 0
+        self.wait_ms = deque(maxlen=SAMPLE_SIZE)  # 取连接等待耗时
+        self.hold_ms = deque(maxlen=SAMPLE_SIZE)  # 连接占用时长
+        self.query_ms = deque(maxlen=SAMPLE_SIZE)  # 查询耗时 (含取连接等待)
+        self.query_total_ms = 0.0  # 累计查询耗时
+
+
+class DBPool:
+    """
+    数据库连接池统计与取出时健康检查: 为 Tortoise 的连接池包装器与查询方法打点 (类级别补丁, 幂等)
+    统计按进程, 用于对照 workers = cpu_count() 调整 DB_POOL_MIN / DB_POOL_MAX
+    """
+    _metrics: Dict[str, _Metrics] = {}
+    _held: Dict[int, float] = {}  # {id(PoolConnectionWrapper): 取出时间}
+    _querying: contextvars.ContextVar[bool] = contextvars.ContextVar("db_pool_querying", default=False)
+    _instrumented = False
+
+    # ================== I/O, need async ==================
+    @classmethod
+    async def _healthCheck(cls, metrics: _Metrics, connection) -> None:
+        """取出的连接空闲超过 DB_PING_IDLE 时先 ping (reconnect=True: 服务端已断开则重连)"""
+        last_usage = getattr(connection, "last_usage", None)  # aiomysql.Connection
+        if last_usage is None or not hasattr(connection, "ping"):
+            return
+        if asyncio.get_running_loop().time() - last_usage < DB_PING_IDLE:
+            return
+        metrics.pings += 1
+        thread_id = connection.server_thread_id
+        await connection.ping(reconnect=True)
+        if connection.server_thread_id != thread_id:
+            metrics.reconnects += 1
+
+    # ================== not I/O, not need async ==================
+    @classmethod
+    def instrument(cls) -> None:
+        """gunicorn master (preload) / 独立 worker 启动时调用一次, fork 后补丁随之继承"""
+        if cls._instrumented:
+            return
+        from tortoise.backends.base.client import PoolConnectionWrapper
+
+        enter, exit_ = PoolConnectionWrapper.__aenter__, PoolConnectionWrapper.__aexit__
+
+        @functools.wraps(enter)
+        async def __aenter__(self):
+            metrics = cls._get(self.client.connection_name)
+            metrics.waiting += 1
+            metrics.peak_waiting = max(metrics.peak_waiting, metrics.waiting)
+            start = time.perf_counter()
+            try:
+                connection = await enter(self)
+            finally:
+                metrics.waiting -= 1
+            metrics.wait_ms.append((time.perf_counter() - start) * 1000)
+            metrics.acquired += 1
+            metrics.in_use += 1
+            metrics.peak_in_use = max(metrics.peak_in_use, metrics.in_use)
+            try:
+                await cls._healthCheck(metrics, connection)
+            except BaseException:
+                metrics.in_use -= 1
+                await exit_(self, None, None, None)
+                raise
+            cls._held[id(self)] = time.perf_counter()
+            return connection
+
+        @functools.wraps(exit_)
+        async def __aexit__(self, exc_type, exc_val, exc_tb):
+            metrics = cls._get(self.client.connection_name)
+            start = cls._held.pop(id(self), None)
+            if start is not None:
+                metrics.hold_ms.append((time.perf_counter() - start) * 1000)
+                metrics.in_use -= 1
+            return await exit_(self, exc_type, exc_val, exc_tb)
+
+        PoolConnectionWrapper.__aenter__ = __aenter__
+        PoolConnectionWrapper.__aexit__ = __aexit__
+
+        for client_class in cls._clientClasses():
+            for method in ("execute_query", "execute_query_dict", "execute_insert", "execute_many", "execute_script"):
+                if hasattr(client_class, method):
+                    setattr(client_class, method, cls._timed(getattr(client_class, method)))
+        cls._instrumented = True
+
+    @classmethod
+    def stats(cls) -> Dict:
+        """{'default': {'size': 4, 'free': 2, 'in_use': 2, 'wait_ms': {'p50': .., 'p95': .., 'max': ..}, ...}, 'budget': {...}}"""
+        from tortoise import connections
+
+        result = {}
+        for name, metrics in cls._metrics.items():
+            entry = {}
+            try:
+                pool = getattr(connections.get(name), "_pool", None)
+            except Exception:
+                pool = None
+            if pool is not None and hasattr(pool, "maxsize"):  # aiomysql.Pool
+                entry.update({"min": pool.minsize, "max": pool.maxsize, "size": pool.size, "free": pool.freesize})
+            entry.update({
+                "in_use": metrics.in_use,
+                "peak_in_use": metrics.peak_in_use,
+                "waiting": metrics.waiting,
+                "peak_waiting": metrics.peak_waiting,
+                "acquired": metrics.acquired,
+                "pings": metrics.pings,
+                "reconnects": metrics.reconnects,
+                "queries": metrics.queries,
+                "slow_queries": metrics.slow_queries,
+                "errors": metrics.errors,
+                "wait_ms": cls._quantiles(metrics.wait_ms),
+                "hold_ms": cls._quantiles(metrics.hold_ms),
+                "query_ms": cls._quantiles(metrics.query_ms),
+            })
+            result[name] = entry
+        # gunicorn 默认 workers = cpu_count(), 各 worker 独立连接池
+        result["budget"] = {"workers": cpu_count(), "pool_max": DB_POOL_MAX, "max_connections": cpu_count() * DB_POOL_MAX}
+        return result
+
+    @classmethod
+    def queryTime(cls) -> float:
+        """本进程全部连接的累计查询耗时 (ms), 取差值得到一段代码的数据库耗时 (需先 instrument)"""
+        return sum(metrics.query_total_ms for metrics in cls._metrics.values())
+
+    @classmethod
+    def reset(cls) -> None:
+        cls._metrics = {}
+
+    @classmethod
+    def _get(cls, name: str) -> _Metrics:
+        metrics = cls._metrics.get(name)
+        if metrics is None:
+            metrics = cls._metrics[name] = _Metrics()
+        return metrics
+
+    @classmethod
+    def _timed(cls, func):
+        """
+        查询计数与计时; 嵌套调用只计最外层一次
+        (MySQL 的 execute_query_dict 内部调用 execute_query, 事务客户端子类继承的也是已包装的方法)
+        """
+        @functools.wraps(func)
+        async def wrapper(self, *args, **kwargs):
+            if cls._querying.get():
+                return await func(self, *args, **kwargs)
+            metrics = cls._get(self.connection_name)
+            token = cls._querying.set(True)
+            start = time.perf_counter()
+            try:
+                return await func(self, *args, **kwargs)
+            except Exception:
+                metrics.errors += 1
+                raise
+            finally:
+                cls._querying.reset(token)
+                elapsed = (time.perf_counter() - start) * 1000
+                metrics.queries += 1
+                metrics.query_ms.append(elapsed)
+                metrics.query_total_ms += elapsed
+                if elapsed >= DB_SLOW_QUERY_MS:
+                    metrics.slow_queries += 1
+
+        return wrapper
+
+    @classmethod
+    def _clientClasses(cls) -> list:
+        """TORTOISE_ORM 中配置的数据库后端的客户端类 (驱动未安装的跳过)"""
+        result = []
+        for connection in TORTOISE_ORM.get("connections", {}).values():
+            engine = connection.get("engine") if isinstance(connection, dict) else None
+            if engine is None:
+                continue
+            try:
+                client_class = importlib.import_module(engine).client_class
+            except ImportError:
+                continue
+            if client_class not in result:
+                result.append(client_class)
+        return result
+
+    @classmethod
+    def _quantiles(cls, samples: deque) -> Dict[str, float]:
+        if not samples:
+            return {}
+        ordered = sorted(samples)
+        n = len(ordered)
+        return {
+            "p50": round(ordered[n // 2], 2),
+            "p95": round(ordered[min(n - 1, int(n * 0.95))], 2),
+            "max": round(ordered[-1], 2),
+        }
@@ -0,0 +1,25 @@
+from settings import DB_READ, DB_READ_ANALYTICS
+
+REFERENCE_TABLES = {"disease_prob", "symptom_prob", "medical_knowledge"}  # 只读知识表
+ANALYTICS_TABLES = {"stat_daily", "stat_disease", "stat_rounds"}  # 看板汇总表 (写入仍走主库)
+
+
+class ReadRouter:
+    """
+    Tortoise 路由: 只读知识表 (及 replica 模式下的看板汇总表) 的读查询走 "read" 连接, 其余读写走 default
+    按表名判断, 不导入 models (models 依赖 utils)
+    """
+    snapshot_ready = False  # snapshot 模式下快照文件已就绪, 由 ReferenceSnapshot 维护; 未就绪时读主库
+
+    def db_for_read(self, model) -> str | None:
+        table = model._meta.db_table
+        if table in REFERENCE_TABLES:
+            if DB_READ == "replica" or (DB_READ == "snapshot" and ReadRouter.snapshot_ready):
+                return "read"
+        elif table in ANALYTICS_TABLES:
+            if DB_READ == "replica" and DB_READ_ANALYTICS:
+                return "read"
+        return None
+
+    def db_for_write(self, model) -> str | None:
+        return None
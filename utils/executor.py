@@ -0,0 +1,114 @@
+import asyncio
+import contextvars
+import functools
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import Executor as _Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+
+from settings import EXECUTOR_THREADS, EXECUTOR_PROCESSES
+
+THREAD = "thread"
+PROCESS = "process"
+
+
+class Executor:
+    """
+    CPU 密集任务卸载: 线程池运行释放 GIL 的 NumPy / bcrypt, 进程池运行纯 Python 计算
+    小任务直接在事件循环中执行 (卸载开销更大), 超过阈值才提交到池
+    池按 pid 懒创建 (gunicorn fork 后各 worker 独立), 统计排队深度供管理员查看
+    """
+    _pools: Dict[str, _Executor] = {}
+    _pid: Optional[int] = None
+    _lock = threading.Lock()
+    _stats: Dict[str, Dict[str, float]] = {
+        pool: {"submitted": 0, "inline": 0, "inflight": 0, "peak_queued": 0, "total_ms": 0.0}
+        for pool in (THREAD, PROCESS)
+    }
+
+    # ================== I/O, need async ==================
+    @classmethod
+    async def thread(cls, func: Callable, *args, **kwargs):
+        """在线程池中执行, 保留 contextvars (追踪 span 等)"""
+        ctx = contextvars.copy_context()
+        return await cls._submit(THREAD, functools.partial(ctx.run, func, *args, **kwargs))
+
+    @classmethod
+    async def process(cls, func: Callable, *args, **kwargs):
+        """在进程池中执行, func 与参数需可 pickle (模块级函数); 未启用进程池时退回线程池"""
+        if EXECUTOR_PROCESSES <= 0:
+            return await cls.thread(func, *args, **kwargs)
+        return await cls._submit(PROCESS, functools.partial(func, *args, **kwargs))
+
+    @classmethod
+    async def offload(cls, func: Callable, *args, size: int, threshold: int, pool: str = THREAD, **kwargs):
+        """
+        size 达到 threshold 时提交到池, 否则直接执行
+        :param func: 同步函数
+        :param size: 任务规模 (矩阵元素数 / 字符数等)
+        :param threshold: 卸载阈值
+        :param pool: "thread" | "process"
+        """
+        if size < threshold:
+            cls._stats[pool]["inline"] += 1
+            return func(*args, **kwargs)
+        if pool == PROCESS:
+            return await cls.process(func, *args, **kwargs)
+        return await cls.thread(func, *args, **kwargs)
+
+    @classmethod
+    async def _submit(cls, pool: str, call: Callable):
+        stats = cls._stats[pool]
+        workers = EXECUTOR_THREADS if pool == THREAD else EXECUTOR_PROCESSES
+        stats["submitted"] += 1
+        stats["inflight"] += 1
+        stats["peak_queued"] = max(stats["peak_queued"], stats["inflight"] - workers)
+        start = time.perf_counter()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(cls._pool(pool), call)
+        finally:
+            stats["inflight"] -= 1
+            stats["total_ms"] += (time.perf_counter() - start) * 1000
+
+    # ================== not I/O, not need async ==================
+    @classmethod
+    def stats(cls) -> Dict[str, Dict[str, float]]:
+        """{'thread': {'workers': 4, 'queued': 0, 'inflight': 1, ...}, 'process': {...}}"""
+        result = {}
+        for pool, stats in cls._stats.items():
+            workers = EXECUTOR_THREADS if pool == THREAD else EXECUTOR_PROCESSES
+            result[pool] = {
+                "workers": workers,
+                "queued": max(stats["inflight"] - workers, 0),
+                "inflight": stats["inflight"],
+                "peak_queued": stats["peak_queued"],
+                "submitted": stats["submitted"],
+                "inline": stats["inline"],
+                "avg_ms": round(stats["total_ms"] / stats["submitted"], 1) if stats["submitted"] else None,
+            }
+        return result
+
+    @classmethod
+    def shutdown(cls) -> None:
+        with cls._lock:
+            for executor in cls._pools.values():
+                executor.shutdown(wait=False, cancel_futures=True)
+            cls._pools = {}
+
+    @classmethod
+    def _pool(cls, pool: str) -> _Executor:
+        with cls._lock:
+            if cls._pid != os.getpid():  # fork 继承的池不可用
+                cls._pools = {}
+                cls._pid = os.getpid()
+            executor = cls._pools.get(pool)
+            if executor is None:
+                if pool == THREAD:
+                    executor = ThreadPoolExecutor(EXECUTOR_THREADS, thread_name_prefix="offload")
+                else:
+                    # spawn: 不继承事件循环 / 日志线程等状态
+                    executor = ProcessPoolExecutor(EXECUTOR_PROCESSES, mp_context=multiprocessing.get_context("spawn"))
+                cls._pools[pool] = executor
+            return executor
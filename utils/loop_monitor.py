@@ -0,0 +1,85 @@
+import asyncio
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from typing import Deque, Dict, List, Optional
+
+from middlewares.logger_middleware import logger
+from settings import LOOP_LAG_INTERVAL, LOOP_LAG_THRESHOLD_MS
+
+LOOP_STALL_HISTORY = 100  # 保留最近阻塞记录数
+
+
+class LoopMonitor:
+    """
+    事件循环阻塞检测: 循环内的心跳协程定时刷新时间戳, 后台线程发现心跳超时即抓取事件循环线程的调用栈
+    心跳恢复后以实际延迟为准记录一次阻塞 (延迟 + 调用栈), 写日志并保留最近若干条供管理员查看
+    """
+    stalls: Deque[Dict] = deque(maxlen=LOOP_STALL_HISTORY)
+
+    _beat: float = 0.0
+    _loop_thread_id: Optional[int] = None
+    _pending_stack: Optional[List[str]] = None  # 监视线程抓到的阻塞调用栈
+    _task: Optional[asyncio.Task] = None
+    _stop: Optional[threading.Event] = None
+
+    @classmethod
+    def start(cls, threshold_ms: float = LOOP_LAG_THRESHOLD_MS, interval: float = LOOP_LAG_INTERVAL) -> None:
+        """在事件循环中调用 (如 startup 事件), 每个 worker 一次"""
+        if cls._task is not None:
+            return
+        cls._loop_thread_id = threading.get_ident()
+        cls._beat = time.monotonic()
+        cls._stop = threading.Event()
+        cls._task = asyncio.get_running_loop().create_task(cls._heartbeat(threshold_ms / 1000, interval))
+        threading.Thread(target=cls._watch, args=(cls._stop, threshold_ms / 1000, interval),
+                         name="loop-monitor", daemon=True).start()
+
+    @classmethod
+    def stop(cls) -> None:
+        if cls._task is None:
+            return
+        cls._stop.set()
+        cls._task.cancel()
+        cls._task = None
+
+    @classmethod
+    def recent(cls, limit: int = LOOP_STALL_HISTORY) -> List[Dict]:
+        """最近的阻塞记录, 新的在前"""
+        return list(cls.stalls)[::-1][:limit]
+
+    @classmethod
+    async def _heartbeat(cls, threshold: float, interval: float) -> None:
+        while True:
+            expected = time.monotonic() + interval
+            await asyncio.sleep(interval)
+            now = time.monotonic()
+            cls._beat = now
+            lag = now - expected
+            if lag >= threshold:
+                cls._record(lag)
+
+    @classmethod
+    def _watch(cls, stop: threading.Event, threshold: float, interval: float) -> None:
+        """后台线程: 心跳超时即抓取事件循环线程当前的调用栈 (即正在阻塞的回调)"""
+        while not stop.wait(interval):
+            if cls._pending_stack is not None:
+                continue
+            if time.monotonic() - cls._beat - interval < threshold:
+                continue
+            frame = sys._current_frames().get(cls._loop_thread_id)
+            if frame is not None:
+                cls._pending_stack = traceback.format_stack(frame)
+
+    @classmethod
+    def _record(cls, lag: float) -> None:
+        stack, cls._pending_stack = cls._pending_stack, None
+        stall = {
+            "time": time.time(),
+            "lag_ms": round(lag * 1000, 1),
+            "stack": stack or [],
+        }
+        cls.stalls.append(stall)
+        logger.warning(f"[loop] event loop blocked {stall['lag_ms']}ms\n" + "".join(stall["stack"][-12:]))
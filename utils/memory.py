@@ -0,0 +1,29 @@
+import os
+from typing import Dict, Optional
+
+SMAPS_FIELDS = ("Rss", "Pss", "Shared_Clean", "Shared_Dirty", "Private_Clean", "Private_Dirty", "Anonymous", "Swap")
+
+
+def memory_usage(pid: Optional[int] = None) -> Dict[str, int]:
+    """
+    进程内存 (KB), 读取 /proc/<pid>/smaps_rollup; Pss 按共享进程数分摊, 可直接求和得到总占用
+    :param pid: 进程号, 默认当前进程
+    :return: {'Rss': 120000, 'Pss': 60000, 'Shared_Clean': ..., ...}
+    """
+    pid = pid or os.getpid()
+    result = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                if key in SMAPS_FIELDS:
+                    result[key] = int(value.split()[0])
+    except OSError:  # 旧内核无 smaps_rollup, 只取 RSS
+        try:
+            with open(f"/proc/{pid}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        result["Rss"] = int(line.split()[1])
+        except OSError:
+            pass
+    return result
@@ -0,0 +1,84 @@
+import os
+import pathlib
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, Optional, Set
+
+from settings import PROFILE_MAX_SECONDS, PROFILE_MAX_HZ
+
+
+class SamplingProfiler:
+    """
+    采样分析: 后台线程按频率读取各线程调用栈 (sys._current_frames), 统计为 collapsed stack 格式
+    输出每行 "线程;帧1;帧2;... 次数", 可直接用于 flamegraph.pl / speedscope
+    同一 worker 同时只运行一个
+    """
+    _lock = threading.Lock()
+    _paths: Dict[str, str] = {}  # {co_filename: 短路径}
+
+    @classmethod
+    def busy(cls) -> bool:
+        return cls._lock.locked()
+
+    @classmethod
+    def run(cls, seconds: float, hz: int = 100, thread_ids: Optional[Set[int]] = None) -> Optional[str]:
+        """
+        阻塞采样, 应在线程中调用 (asyncio.to_thread), 以便事件循环继续运行并被采样
+        :param seconds: 采样时长
+        :param hz: 采样频率
+        :param thread_ids: 只采样这些线程, None 为全部线程
+        :return: collapsed stack 文本; 已有采样在运行时返回 None
+        """
+        if not cls._lock.acquire(blocking=False):
+            return None
+        try:
+            counts = cls._sample(min(seconds, PROFILE_MAX_SECONDS), min(max(hz, 1), PROFILE_MAX_HZ), thread_ids)
+        finally:
+            cls._lock.release()
+        return "".join(f"{stack} {n}\n" for stack, n in counts.most_common())
+
+    @classmethod
+    def _sample(cls, seconds: float, hz: int, thread_ids: Optional[Set[int]]) -> Counter:
+        counts = Counter()
+        me = threading.get_ident()
+        interval = 1 / hz
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for tid, frame in sys._current_frames().items():
+                if tid == me or (thread_ids is not None and tid not in thread_ids):
+                    continue
+                counts[cls._collapse(frame, names.get(tid, str(tid)))] += 1
+            time.sleep(interval)
+        return counts
+
+    @classmethod
+    def _collapse(cls, frame, thread_name: str) -> str:
+        """frame -> "thread;root_func (file);...;leaf_func (file)" """
+        frames = []
+        while frame is not None:
+            code = frame.f_code
+            frames.append(f"{code.co_name} ({cls._shortPath(code.co_filename)})")
+            frame = frame.f_back
+        frames.append(thread_name)
+        return ";".join(reversed(frames))
+
+    @classmethod
+    def _shortPath(cls, filename: str) -> str:
+        """项目文件取相对路径, 第三方库从 site-packages 之后截取, 其余取末两级"""
+        short = cls._paths.get(filename)
+        if short is None:
+            if "site-packages" in filename:
+                short = filename.rsplit("site-packages" + os.sep, 1)[-1]
+            else:
+                try:
+                    short = os.path.relpath(filename)
+                except ValueError:
+                    short = filename
+                if short.startswith(".."):  # 标准库等项目外文件取末两级
+                    short = os.path.join(*pathlib.Path(filename).parts[-2:])
+            short = short.replace(";", "_")
+            cls._paths[filename] = short
+        return short
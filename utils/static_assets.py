@@ -0,0 +1,81 @@
+import json
+import mimetypes
+import os
+import pathlib
+from typing import Dict, Optional
+
+from starlette.datastructures import Headers
+from starlette.exceptions import HTTPException
+from starlette.responses import Response
+from starlette.staticfiles import StaticFiles
+from starlette.types import Scope
+
+from middlewares.compress_middleware import accepted_encodings
+
+STATIC_DIR = pathlib.Path(__file__).parent.parent / "static"
+DIST_DIR = STATIC_DIR / "dist"  # buildstatic.py 输出目录
+MANIFEST_PATH = DIST_DIR / "manifest.json"  # {"css/base.css": "css/base.3f2a1c9d.css", ...}
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+PRECOMPRESSED = (("br", ".br"), ("gzip", ".gz"))  # 优先 brotli
+
+_manifest: Dict[str, str] = {}
+_manifest_mtime: Optional[float] = None  # 已加载的 manifest.json 修改时间, 重新构建后重新读取
+
+
+def static_url(path: str) -> str:
+    """
+    Jinja 模板中引用静态文件, 已构建则返回带内容哈希的地址
+    :param path: 相对 static 的路径 "css/base.css"
+    :return: "/static/dist/css/base.3f2a1c9d.css" 或 "/static/css/base.css"
+    """
+    hashed = _loadManifest().get(path)
+    return f"/static/dist/{hashed}" if hashed else f"/static/{path}"
+
+
+def _loadManifest() -> Dict[str, str]:
+    """manifest.json 修改时间变化 (buildstatic.py 重新构建) 后重新读取, 文件不存在则为空"""
+    global _manifest, _manifest_mtime
+    try:
+        mtime = os.stat(MANIFEST_PATH).st_mtime
+    except OSError:
+        mtime = None
+    if mtime != _manifest_mtime:
+        try:
+            with open(MANIFEST_PATH, encoding="utf-8") as f:
+                _manifest = json.load(f)
+        except (OSError, ValueError):
+            _manifest = {}
+        _manifest_mtime = mtime
+    return _manifest
+
+
+class PrecompressedStaticFiles(StaticFiles):
+    """
+    提供带哈希的静态文件: 按 Accept-Encoding 返回预压缩的 .br / .gz 版本, 并设置 immutable 缓存
+    main.py 中挂载在通用 /static 之前: app.mount("/static/dist", PrecompressedStaticFiles(directory="static/dist"))
+    """
+
+    async def get_response(self, path: str, scope: Scope) -> Response:
+        accepted = accepted_encodings(Headers(scope=scope).get("accept-encoding", ""))
+        media_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        for encoding, ext in PRECOMPRESSED:
+            if encoding not in accepted:
+                continue
+            try:
+                response = await super().get_response(path + ext, scope)
+            except HTTPException:
+                continue
+            if response.status_code in (200, 304):
+                response.headers["Content-Encoding"] = encoding
+                response.headers["Content-Type"] = media_type
+                return self._cacheHeaders(response)
+
+        return self._cacheHeaders(await super().get_response(path, scope))
+
+    @staticmethod
+    def _cacheHeaders(response: Response) -> Response:
+        if response.status_code in (200, 304):
+            response.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL
+        response.headers["Vary"] = "Accept-Encoding"
+        return response
@@ -0,0 +1,12 @@
+import pathlib
+
+from fastapi.templating import Jinja2Templates
+
+from .static_assets import static_url
+
+TEMPLATES_DIR = pathlib.Path(__file__).parent.parent / "templates"
+
+# 全部页面共用一个已注册模板全局函数的实例, main.py 首页与各路由都从这里导入: from utils.templates import templates
+# 不在 utils/__init__ 中导出, models / 脚本导入 utils 时不创建模板环境
+templates = Jinja2Templates(directory=TEMPLATES_DIR)
+templates.env.globals["static_url"] = static_url
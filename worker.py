@@ -0,0 +1,32 @@
+import argparse
+import asyncio
+import signal
+
+from tortoise import Tortoise
+
+from settings import TORTOISE_ORM
+from api.utils import JobService, KnowledgeStore
+from utils import DBPool
+
+
+async def run(concurrency: int):
+    DBPool.instrument()
+    await Tortoise.init(config=TORTOISE_ORM)
+    await KnowledgeStore.warmup()
+
+    stop = JobService.start(concurrency)
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    print(f"后台任务 worker 已启动, 并发数: {concurrency}")
+
+    await stop.wait()
+    await JobService.stop(stop)
+    await Tortoise.close_connections()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="后台生成任务 worker (初步诊断 / 患者报告 / SOAP 病历)")
+    parser.add_argument("-c", "--concurrency", type=int, default=4, help="同时执行的任务数")
+    args = parser.parse_args()
+    asyncio.run(run(args.concurrency))